@@ -1,5 +1,7 @@
 from flask import Flask, request
 from .routes import configure_routes
+from .uploads import UploadRequest
+from .utils import Utils
 import os
 from typing import List
 import time
@@ -128,17 +130,28 @@ class DataCleaner:
 
 
 
-def create_app():
+def create_app(upload_folder: str | None = None, config_path: str = r'app/report_config.json'):
     """
     Создаёт и настраивает экземпляр Flask-приложения.
 
     Функция инициализирует приложение, устанавливает параметры конфигурации,
     регистрирует middleware для обработки URL-префиксов, а также настраивает маршруты.
 
+    Папка загрузок и конфиг отчётов хранятся в `app.config` (`UPLOAD_FOLDER`, `REPORT_CONFIG`)
+    и передаются контроллерам явно, окружение процесса не изменяется. Поэтому один
+    воркер gunicorn может строить несколько отчётов одновременно (`gthread`).
+
+    :param upload_folder: Папка для загрузок и отчётов. По умолчанию — переменная
+                          окружения `UPLOAD_FOLDER` или 'uploads'.
+    :type upload_folder: str | None
+    :param config_path: Путь к JSON-файлу с конфигурацией отчётов.
+    :type config_path: str
     :return: Настраиваемое Flask-приложение.
     :rtype: Flask
     """
     app = Flask(__name__)
+    # Загружаемые файлы пишутся сразу в папку загрузок, с подсчётом хеша
+    app.request_class = UploadRequest
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///./database.db"
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
@@ -149,8 +162,12 @@ def create_app():
     if prefix:
         app.wsgi_app = PrefixMiddleware(app.wsgi_app, prefix=prefix)
 
-    # Устанавливаем папку для загрузки файлов
-    os.environ['UPLOAD_FOLDER'] = 'uploads'
+    # Устанавливаем папку для загрузки файлов (абсолютный путь, чтобы не зависеть от рабочей папки)
+    app.config['UPLOAD_FOLDER'] = os.path.abspath(
+        upload_folder or os.environ.get('UPLOAD_FOLDER', 'uploads')
+    )
+    # Конфиг отчётов читается один раз и общий для всех запросов
+    app.config['REPORT_CONFIG'] = Utils.load_config(config_path)
 
     # Регистрируем маршруты
     configure_routes(app)
@@ -0,0 +1,274 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+from typing import Any, BinaryIO, List
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - pyarrow необязателен
+    pa = None
+
+
+class ParseCache:
+    """
+    Кэш разобранных входных файлов, общий для всех воркеров gunicorn.
+
+    Ключ — SHA-256 содержимого файла вместе со списком требуемых колонок.
+    DataFrame хранится в папке кэша в формате Arrow IPC без сжатия, поэтому любой
+    воркер читает его через memory map, и повторная загрузка того же файла не требует разбора xlsx.
+
+    Колонки object, где кроме строк есть числа, даты или логические значения
+    (например, '№ трактора'), хранятся строками с меткой типа каждого значения
+    и восстанавливаются с исходными типами: Arrow привёл бы такую колонку к одному типу
+    (целые с пропусками — к float) или не смог бы её сохранить.
+
+    Размер папки ограничен: при превышении удаляются давно не использованные файлы (LRU
+    по времени изменения, которое обновляется при каждом попадании в кэш).
+
+    :param folder: Папка для файлов кэша.
+    :type folder: str
+    :param max_size: Максимальный суммарный размер файлов кэша в байтах.
+    :type max_size: int
+    """
+
+    FILE_SUFFIX = '.arrow'
+    # Ключ метаданных схемы со списком номеров колонок, сохранённых с метками типов
+    TAGGED_COLUMNS_KEY = b'parse_cache_tagged_columns'
+    # Метки типов значений колонок object и функции восстановления значений
+    VALUE_DECODERS = {
+        's': str,
+        'b': lambda text: text == '1',
+        'i': int,
+        'f': float,
+        't': pd.Timestamp,
+        'd': datetime.datetime.fromisoformat,
+        'D': datetime.date.fromisoformat,
+        'T': datetime.time.fromisoformat,
+        'r': lambda text: datetime.timedelta(microseconds=int(text)),
+    }
+
+    def __init__(self, folder: str, max_size: int):
+        """
+        Инициализирует кэш и создаёт папку, если её нет.
+
+        :param folder: Папка для файлов кэша.
+        :param max_size: Максимальный суммарный размер файлов кэша в байтах.
+        """
+        self.folder = folder
+        self.max_size = max_size
+        os.makedirs(folder, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> 'ParseCache | None':
+        """
+        Создаёт кэш по переменным окружения `PARSE_CACHE_FOLDER` и `PARSE_CACHE_MAX_MB`.
+
+        :return: Экземпляр кэша или None, если кэш не настроен или не установлен pyarrow.
+        :rtype: ParseCache | None
+        """
+        folder = os.environ.get('PARSE_CACHE_FOLDER')
+        max_size = int(os.environ.get('PARSE_CACHE_MAX_MB', 512)) * 1024 * 1024
+        if pa is None or not folder or max_size <= 0:
+            return None
+        return cls(folder=folder, max_size=max_size)
+
+    @staticmethod
+    def file_hash(file_path: str | BinaryIO, chunk_size: int = 1024 * 1024) -> str:
+        """
+        Считает SHA-256 содержимого файла, читая его блоками.
+
+        :param file_path: Путь к файлу или бинарный файловый объект.
+        :return: Шестнадцатеричный хеш.
+        """
+        digest = hashlib.sha256()
+        if not isinstance(file_path, str):
+            file_path.seek(0)
+            for chunk in iter(lambda: file_path.read(chunk_size), b''):
+                digest.update(chunk)
+            return digest.hexdigest()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(content_hash: str, columns: List[str]) -> str:
+        """
+        Формирует ключ кэша из хеша содержимого и списка требуемых колонок.
+
+        :param content_hash: SHA-256 содержимого файла.
+        :param columns: Список требуемых колонок.
+        :return: Ключ кэша.
+        """
+        digest = hashlib.sha256(content_hash.encode())
+        for column in columns:
+            digest.update(b'\0' + str(column).encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, key + self.FILE_SUFFIX)
+
+    @staticmethod
+    def _encode_value(value: Any) -> str | None:
+        """
+        Записывает значение колонки object строкой с меткой типа (см. `VALUE_DECODERS`).
+
+        :param value: Значение ячейки.
+        :return: Строка с меткой типа или None для пустого значения.
+        :raises TypeError: Если тип значения не поддерживается.
+        """
+        if value is None:
+            return None
+        if value is pd.NaT:
+            raise TypeError('Неподдерживаемое значение: NaT')
+        if isinstance(value, str):
+            return 's' + value
+        if isinstance(value, (bool, np.bool_)):
+            return 'b1' if value else 'b0'
+        if isinstance(value, (int, np.integer)):
+            return f'i{int(value)}'
+        if isinstance(value, (float, np.floating)):
+            return 'f' + repr(float(value))
+        if isinstance(value, pd.Timestamp):
+            return 't' + value.isoformat()
+        if isinstance(value, datetime.datetime):
+            return 'd' + value.isoformat()
+        if isinstance(value, datetime.date):
+            return 'D' + value.isoformat()
+        if isinstance(value, datetime.time):
+            return 'T' + value.isoformat()
+        if isinstance(value, datetime.timedelta) and not isinstance(value, pd.Timedelta):
+            return f'r{value // datetime.timedelta(microseconds=1)}'
+        raise TypeError(f'Неподдерживаемый тип значения: {type(value).__name__}')
+
+    @classmethod
+    def _encode_objects(cls, df: pd.DataFrame) -> tuple[pd.DataFrame, List[int]]:
+        """
+        Заменяет колонки object не только из строк на строки с метками типов.
+
+        :param df: DataFrame для сохранения.
+        :return: DataFrame для записи в Arrow и номера заменённых колонок.
+        :raises TypeError: Если в колонке есть значение неподдерживаемого типа.
+        """
+        tagged = []
+        encoded = df
+        for position in range(df.shape[1]):
+            column = df.iloc[:, position]
+            if column.dtype != object:
+                continue
+            values = column.to_numpy()
+            if all(value is None or type(value) is str for value in values):
+                continue
+            if not tagged:
+                encoded = df.copy(deep=False)
+            encoded.isetitem(position, pd.Series(
+                [cls._encode_value(value) for value in values], index=df.index, dtype=object,
+            ))
+            tagged.append(position)
+        return encoded, tagged
+
+    @classmethod
+    def _decode_objects(cls, df: pd.DataFrame, tagged: List[int]) -> pd.DataFrame:
+        """
+        Восстанавливает значения колонок, сохранённых `_encode_objects`.
+
+        :param df: DataFrame, прочитанный из Arrow.
+        :param tagged: Номера колонок с метками типов.
+        :return: DataFrame с исходными значениями.
+        """
+        for position in tagged:
+            values = df.iloc[:, position].to_numpy()
+            decoded = np.empty(len(values), dtype=object)
+            decoded[:] = [
+                None if value is None else cls.VALUE_DECODERS[value[0]](value[1:])
+                for value in values
+            ]
+            df.isetitem(position, pd.Series(decoded, index=df.index, dtype=object))
+        return df
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        """
+        Возвращает DataFrame из кэша или None, если ключа нет.
+
+        Memory map закрывается сразу после чтения: DataFrame не ссылается на файл кэша,
+        и файловый дескриптор не остаётся открытым в воркере.
+
+        :param key: Ключ кэша.
+        :return: DataFrame, прочитанный через memory map, или None.
+        """
+        path = self._path(key)
+        try:
+            with pa.memory_map(path, 'r') as source:
+                table = pa.ipc.open_file(source).read_all()
+                metadata = table.schema.metadata or {}
+                df = table.to_pandas()
+            os.utime(path)
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        return self._decode_objects(df, json.loads(metadata.get(self.TAGGED_COLUMNS_KEY, b'[]')))
+
+    def put(self, key: str, df: pd.DataFrame) -> bool:
+        """
+        Сохраняет DataFrame в кэш и при необходимости вытесняет старые записи.
+
+        Запись идёт во временный файл с последующим атомарным переименованием,
+        чтобы другие воркеры не прочитали недописанный файл. Имя временного файла
+        уникально для процесса и потока: один и тот же файл могут одновременно
+        загрузить в разных потоках воркера. Колонки object со значениями разных типов
+        сохраняются с метками типов (см. `_encode_objects`). Если DataFrame всё же нельзя
+        представить в Arrow (значения неподдерживаемых типов), он не кэшируется.
+
+        :param key: Ключ кэша.
+        :param df: DataFrame для сохранения.
+        :return: True, если DataFrame сохранён.
+        """
+        try:
+            encoded, tagged = self._encode_objects(df)
+            table = pa.Table.from_pandas(encoded)
+            table = table.replace_schema_metadata({
+                **(table.schema.metadata or {}),
+                self.TAGGED_COLUMNS_KEY: json.dumps(tagged).encode(),
+            })
+        except (pa.ArrowException, ValueError, TypeError) as e:
+            print('Не удалось сохранить файл в кэш', e)
+            return False
+
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+        self._evict()
+        return True
+
+    def _evict(self) -> None:
+        """
+        Удаляет давно не использованные файлы, пока размер кэша превышает лимит.
+        """
+        entries = []
+        for filename in os.listdir(self.folder):
+            if not filename.endswith(self.FILE_SUFFIX):
+                continue
+            path = os.path.join(self.folder, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
@@ -1,8 +1,10 @@
-import os
+from itertools import islice
 from .schemas import SuccesSchema
-from .utils import Utils, ExcelUtils
-import json
-from .drawer import MergeDrawer, FormatDrawer
+from .utils import Utils, ExcelUtils, DataFrameUtils
+from .readers import NdjsonReader
+from .drawer import MergeDrawer, ChunkedMergeDrawer, FormatDrawer
+from .snapshots import MergeSnapshotStore
+from .spill import MERGE_CHUNK_ROWS
 
 
 class MergeController:
@@ -12,84 +14,230 @@ class MergeController:
     Обрабатывает загрузку файлов, проверяет структуру данных и передаёт данные в `MergeDrawer` для генерации отчёта.
     """
 
+    # Колонка, с которой в выгрузке веб-системы начинается запись о тракторе
+    WEB_RECORD_COLUMN = '№ трактора'
+
     @staticmethod
-    def merge(web_file, bitrix_file) -> SuccesSchema:
+    def merge(web_files, bitrix_file, config: dict | None = None, upload_folder: str = 'uploads') -> SuccesSchema:
         """
-        Выполняет процесс объединения двух Excel-файлов.
-
-        1. Сохраняет загруженные файлы в указанную папку.
-        2. Проверяет наличие необходимых колонок в каждом файле.
-        3. Передаёт обработанные данные в `MergeDrawer` для формирования результата.
-        4. Возвращает объект `SuccesSchema` с сообщением и ссылкой на скачивание.
-
-        :param web_file: Файл из веб-системы.
+        Выполняет процесс объединения выгрузок веб-системы и Битрикс.
+
+        1. Сохраняет загруженные файлы в указанную папку (небольшие файлы остаются
+           в памяти и читаются без записи на диск, см. `Utils.get_upload_sources`).
+        2. Параллельно разбирает файлы и проверяет наличие необходимых колонок.
+        3. Объединяет выгрузки веб-системы (их может быть несколько, например за разные
+           периоды), отбрасывая повторяющиеся записи.
+        4. Передаёт обработанные данные в `MergeDrawer` для формирования результата.
+           Если задан `MERGE_CHUNK_ROWS` и выгрузка веб-системы одна (CSV или Parquet),
+           она читается частями и объединяется `ChunkedMergeDrawer` (см. `_merge_chunked`).
+        5. Возвращает объект `SuccesSchema` с сообщением и ссылкой на скачивание.
+
+        :param web_files: Файл или список файлов из веб-системы.
         :param bitrix_file: Файл из Битрикс.
+        :param config: Конфиг отчётов. Если не указан — загружается из 'app/report_config.json'.
+        :param upload_folder: Папка для загруженных файлов и отчёта.
         :return: Объект `SuccesSchema`, содержащий результат операции.
         :rtype: SuccesSchema
         :raises ValueError: Если произошла ошибка при чтении или проверке структуры файлов.
         """
         print('начинаем сливать')
+        if not isinstance(web_files, (list, tuple)):
+            web_files = [web_files]
 
-        # Сохранение файлов
-        upload_folder = os.environ.get('UPLOAD_FOLDER')
-        web_path, bitrix_path = Utils.save_uploaded_files(
-            files=[web_file, bitrix_file],
+        # Сохранение файлов (небольшие остаются в памяти)
+        *web_paths, bitrix_path = Utils.get_upload_sources(
+            files=[*web_files, bitrix_file],
             upload_folder=upload_folder
         )
 
         # Проверяем правильность данных
-        with open(r'app/report_config.json', encoding='utf-8') as f:
-            config = json.load(f)
-            web_columns = config["web_columns"]
-            bitrix_columns = config["bitrix_columns"]
-
-        web_df = ExcelUtils.check_excel_structure(
-            file_path=web_path,
-            columns=web_columns
+        if config is None:
+            config = Utils.load_config()
+        web_columns = config["web_columns"]
+        bitrix_columns = config["bitrix_columns"]
+        column_dtypes = config.get("column_dtypes")
+        reader_engine = config.get("reader_engine")
+
+        # Частями читаются только CSV и Parquet: объединённые ячейки xlsx перечислены
+        # в конце листа, поэтому лист всё равно пришлось бы прочитать целиком
+        chunked = MERGE_CHUNK_ROWS and len(web_paths) == 1
+        if chunked and ExcelUtils.get_table_reader(web_paths[0]) is None:
+            print('MERGE_CHUNK_ROWS: выгрузка xlsx читается целиком')
+            chunked = False
+        if chunked:
+            return MergeController._merge_chunked(
+                web_path=web_paths[0],
+                bitrix_path=bitrix_path,
+                bitrix_hash=Utils.get_content_hash(bitrix_file),
+                config=config,
+                upload_folder=upload_folder,
+            )
+
+        # Файлы независимы, поэтому разбираются параллельно.
+        # Типы колонок веб-выгрузок применяются после объединения,
+        # чтобы категории не расходились между файлами
+        frames = ExcelUtils.iter_excel_structures([
+            *(
+                dict(
+                    file_path=web_path,
+                    columns=web_columns,
+                    engine=reader_engine,
+                    content_hash=Utils.get_content_hash(web_file),
+                )
+                for web_path, web_file in zip(web_paths, web_files)
+            ),
+            dict(
+                file_path=bitrix_path,
+                columns=bitrix_columns,
+                dtypes=column_dtypes,
+                engine=reader_engine,
+                content_hash=Utils.get_content_hash(bitrix_file),
+            ),
+        ])
+        web_df = DataFrameUtils.union_unique_rows(
+            islice(frames, len(web_paths)),
+            block_column=MergeController.WEB_RECORD_COLUMN,
+        )
+        web_df = DataFrameUtils.apply_column_dtypes(web_df, column_dtypes)
+        bitrix_df = next(frames)
+
+        # Создаем отчет
+        drawer = MergeDrawer(
+            web_df=web_df,
+            bitrix_df=bitrix_df,
+            config=config,
+            snapshot_store=MergeSnapshotStore.from_env(),
+            upload_folder=upload_folder,
         )
+        return drawer.draw_report()
+
+    @staticmethod
+    def _merge_chunked(web_path, bitrix_path, bitrix_hash, config, upload_folder) -> SuccesSchema:
+        """
+        Формирует отчёт, читая выгрузку веб-системы частями по `MERGE_CHUNK_ROWS` строк.
+
+        Битрикс читается целиком. Части выгрузки приводятся к типам из `column_dtypes`
+        и объединяются `ChunkedMergeDrawer`, временные файлы которого создаются в `upload_folder`.
+
+        :param web_path: Путь к выгрузке веб-системы (CSV или Parquet) или файловый объект.
+        :param bitrix_path: Путь к файлу Битрикс или файловый объект.
+        :param bitrix_hash: SHA-256 содержимого файла Битрикс, если известен.
+        :param config: Конфиг отчёта.
+        :param upload_folder: Папка для временных файлов и отчёта.
+        :return: Объект `SuccesSchema`, содержащий результат операции.
+        :rtype: SuccesSchema
+        :raises ValueError: Если произошла ошибка при чтении или проверке структуры файлов.
+        """
+        web_columns = config["web_columns"]
+        column_dtypes = config.get("column_dtypes")
+        reader_engine = config.get("reader_engine")
+
+        try:
+            ExcelUtils.preflight_excel_structure(web_path, web_columns)
+        except Exception as e:
+            raise ValueError(f"Ошибка при чтении файла: {str(e)}")
         bitrix_df = ExcelUtils.check_excel_structure(
-            file_path=bitrix_path,
-            columns=bitrix_columns
+            bitrix_path,
+            config["bitrix_columns"],
+            dtypes=column_dtypes,
+            engine=reader_engine,
+            content_hash=bitrix_hash,
+        )
+        web_chunks = (
+            DataFrameUtils.apply_column_dtypes(chunk, column_dtypes)
+            for chunk in ExcelUtils.iter_input_chunks(web_path, web_columns, MERGE_CHUNK_ROWS)
+        )
+
+        drawer = ChunkedMergeDrawer(
+            web_chunks=web_chunks,
+            bitrix_df=bitrix_df,
+            config=config,
+            spill_folder=upload_folder,
+            upload_folder=upload_folder,
         )
+        return drawer.draw_report()
+
+    @staticmethod
+    def merge_ndjson(web_stream, bitrix_stream, config: dict | None = None, upload_folder: str = 'uploads') -> SuccesSchema:
+        """
+        Формирует отчёт по строкам веб-системы и Битрикс, переданным в формате NDJSON.
+
+        Промежуточные xlsx не создаются: строки проверяются на наличие колонок
+        из `web_columns`/`bitrix_columns` по мере чтения потоков, приводятся
+        к типам из `column_dtypes` и сразу передаются в `MergeDrawer`.
+
+        :param web_stream: Поток строк NDJSON из веб-системы.
+        :param bitrix_stream: Поток строк NDJSON из Битрикс.
+        :param config: Конфиг отчётов. Если не указан — загружается из 'app/report_config.json'.
+        :param upload_folder: Папка для отчёта.
+        :return: Объект `SuccesSchema`, содержащий результат операции.
+        :rtype: SuccesSchema
+        :raises ValueError: Если строки не являются JSON-объектами или в них не хватает колонок.
+        """
+        print('начинаем сливать NDJSON')
+
+        if config is None:
+            config = Utils.load_config()
+        web_columns = config["web_columns"]
+        bitrix_columns = config["bitrix_columns"]
+        column_dtypes = config.get("column_dtypes")
+
+        try:
+            web_df = NdjsonReader(web_stream).read_frame(web_columns)
+        except ValueError as e:
+            raise ValueError(f"Ошибка в данных веб-системы: {str(e)}")
+        try:
+            bitrix_df = NdjsonReader(bitrix_stream).read_frame(bitrix_columns)
+        except ValueError as e:
+            raise ValueError(f"Ошибка в данных Битрикс: {str(e)}")
 
         # Создаем отчет
         drawer = MergeDrawer(
-            web_df=web_df,
-            bitrix_df=bitrix_df
+            web_df=DataFrameUtils.apply_column_dtypes(web_df, column_dtypes),
+            bitrix_df=DataFrameUtils.apply_column_dtypes(bitrix_df, column_dtypes),
+            config=config,
+            snapshot_store=MergeSnapshotStore.from_env(),
+            upload_folder=upload_folder,
         )
         return drawer.draw_report()
 
 class FormatController():
     
     @staticmethod
-    def format(format_file ) -> SuccesSchema:
+    def format(format_file, config: dict | None = None, upload_folder: str = 'uploads') -> SuccesSchema:
         print('начинаем форматирование')
 
-        # Сохранение файлов
-        upload_folder = os.environ.get('UPLOAD_FOLDER')
-        format_path = Utils.save_uploaded_files(
+        # Сохранение файлов (небольшой файл остаётся в памяти)
+        format_path, = Utils.get_upload_sources(
             files=[format_file],
             upload_folder=upload_folder
         )
         print('путь к файлу ', format_path)
 
         # Проверяем правильность данных
-        with open(r'app/report_config.json', encoding='utf-8') as f:
-            config = json.load(f)
-            format_columns = config["format_columns"]
+        if config is None:
+            config = Utils.load_config()
+        format_columns = config["format_columns"]
+        reader_engine = config.get("reader_engine")
 
         print('Открыли конфиг')
 
+        # Типы колонок (`column_dtypes`) нужны только объединению: отформатированный
+        # файл повторяет значения исходного, даты и числа не переводятся
+
         format_df = ExcelUtils.check_excel_structure(
             file_path=format_path,
-            columns=format_columns
+            columns=format_columns,
+            engine=reader_engine,
+            content_hash=Utils.get_content_hash(format_file),
         )
         print('Проверили структуру')
 
         # Создаем отчет
         drawer = FormatDrawer(
             format_df=format_df,
-            config_path=r'app/report_config.json',
+            config=config,
+            upload_folder=upload_folder,
         )
         print('Создал drawer')
         return drawer.draw_report()
@@ -1,10 +1,14 @@
 from abc import ABC, abstractmethod
 from .schemas import ErrorSchema, SuccesSchema
+import numpy as np
 import pandas as pd
-import json
-from .utils import Utils, DataFrameUtils, ExcelUtils
-import os
-from typing import Dict, List, Any
+from .utils import Utils, DataFrameUtils, ExcelUtils, JoinKeyIndex, MemoryTracker, RowWriter, TrigramIndex, XLSX_CONSTANT_MEMORY
+from .snapshots import MergeSnapshot, MergeSnapshotStore
+from .spill import BureauSpill
+from .polars_engine import DRAWER_ENGINE, DRAWER_ENGINES, PolarsEngine
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
 class Drawer(ABC):
     """
     Абстрактный класс для генерации отчётов.
@@ -25,6 +29,59 @@ class Drawer(ABC):
         """
         pass
 
+
+class MergeResult:
+    """
+    Результат объединения, который шаги построения отчёта передают друг другу.
+
+    Создаётся заново при каждом построении отчёта: drawer хранит только исходные
+    данные и конфиг, а промежуточные данные шагов живут в этом объекте.
+
+    :param result_df: Результат объединения.
+    :type result_df: pd.DataFrame
+    :param bitrix_df: Подготовленные к объединению строки Битрикс.
+    :type bitrix_df: pd.DataFrame
+    :param web_df: Подготовленные к объединению строки веб-системы.
+    :type web_df: pd.DataFrame
+    :param key_index: Индекс ключей объединения. Если не указан, строится по `bitrix_df` и `web_df`.
+    :type key_index: JoinKeyIndex | None
+    :param result_key_codes: Коды найденных опытных узлов в строках результата.
+    :type result_key_codes: np.ndarray | None
+    """
+
+    def __init__(
+        self,
+        result_df: pd.DataFrame,
+        bitrix_df: pd.DataFrame,
+        web_df: pd.DataFrame,
+        key_index: JoinKeyIndex | None = None,
+        result_key_codes: np.ndarray | None = None,
+    ):
+        """
+        Инициализирует результат объединения.
+        """
+        self.result_df = result_df
+        self.bitrix_df = bitrix_df
+        self.web_df = web_df
+        self._key_index = key_index
+        self.result_key_codes = result_key_codes
+        # Пиковая память шагов объединения, заполняется при PROFILE_MEMORY=1
+        self.memory_steps: Dict[str, int] = {}
+        # Инкрементальное объединение: прошлый и новый снимки и счётчики строк и листов
+        self.previous_snapshot: MergeSnapshot | None = None
+        self.snapshot: MergeSnapshot | None = None
+        self.incremental_stats: Dict[str, int] = {}
+
+    @property
+    def key_index(self) -> JoinKeyIndex:
+        """
+        Индекс ключей объединения строк `bitrix_df` и `web_df`.
+        """
+        if self._key_index is None:
+            self._key_index = JoinKeyIndex(self.bitrix_df['Название'], self.web_df['Опытный узел'])
+        return self._key_index
+
+
 class MergeDrawer(Drawer):
     """
     Класс для объединения и форматирования данных из двух Excel-файлов.
@@ -33,14 +90,38 @@ class MergeDrawer(Drawer):
     который объединяет данные из веб-системы и Битрикс, переформатирует их,
     создаёт Excel-отчёт с несколькими листами (отчёты по бюро, статистика),
     добавляет цветовую индикацию для разных програм и сохраняет результат.
+
+    Drawer строит один отчёт: исходные DataFrame и конфиг только читаются, папка
+    результата передаётся явно, а шаги построения получают и возвращают данные
+    (`MergeResult`), не сохраняя их в drawer. Поэтому несколько отчётов можно строить
+    одновременно в потоках одного воркера, в том числе по одним и тем же исходным DataFrame.
     """
 
+    # Служебная колонка с кодом ключа объединения
+    KEY_COLUMN = '_код ключа'
+    # Служебная колонка с номером строки Битрикс при инкрементальном объединении
+    ROW_COLUMN = '_строка битрикс'
+    # Разделители составных значений Битрикс и веб-системы
+    BITRIX_DELIMITERS = {'Теги': ', ', 'Название': r'\s*;\s*'}
+    WEB_DELIMITERS = {'Опытный узел': '; '}
+    # Колонки веб-системы, пустые значения которых берутся из строки выше
+    WEB_FILL_COLUMNS = ['№ трактора', 'Опытный узел']
+    # Колонки листа конфликтов с похожими опытными узлами веб-системы
+    SUGGESTION_COLUMNS = ['Похожий узел в служебном отчете', 'Сходство', 'Другие варианты']
+    # Колонка отчёта с продолжительностью контроля ('3000 м/ч') и число часов в её тексте
+    CONTROL_COLUMN = 'Продолжительность контроля, м/ч'
+    CONTROL_HOURS_PATTERN = r'(\d+)'
+    # Служебная колонка с числом часов контроля, разобранным из примечания Битрикс
+    CONTROL_HOURS_COLUMN = '_часы контроля'
+
     def __init__(
         self,
         web_df: pd.DataFrame,
         bitrix_df: pd.DataFrame,
         config: dict | None = None,
         config_path: str = r'app/report_config.json',
+        snapshot_store: MergeSnapshotStore | None = None,
+        upload_folder: str = 'uploads',
     ):
         """
         Инициализация объекта MergeDrawer.
@@ -49,315 +130,674 @@ class MergeDrawer(Drawer):
         :param bitrix_df: DataFrame с данными из Битрикс.
         :param config: Конфигурационный словарь. Если не указан — загружается из файла.
         :param config_path: Путь к JSON-файлу с конфигурацией (по умолчанию 'app/report_config.json').
+        :param snapshot_store: Хранилище снимков прошлых объединений. Если указано,
+            объединяются только изменившиеся строки, а листы бюро без изменений не готовятся
+            заново; в файл отчёта записываются все листы.
+        :param upload_folder: Папка, в которую сохраняется отчёт.
+        :raises ValueError: Если в конфиге указан неизвестный движок (`drawer_engine`).
+        :raises ImportError: Если выбран движок `polars`, а polars не установлен.
         """
         self.web_df = web_df
         self.bitrix_df = bitrix_df
+        self.upload_folder = upload_folder
+        # Хранилище снимков для инкрементального объединения
+        self.snapshot_store = snapshot_store
+
+        self.config = config if config is not None else Utils.load_config(config_path)
+
+        # Движок вычислений: ключ `drawer_engine` конфига или переменная DRAWER_ENGINE
+        self.engine = self.config.get('drawer_engine') or DRAWER_ENGINE
+        if self.engine not in DRAWER_ENGINES:
+            raise ValueError(f"Неизвестный движок отчёта: {self.engine}")
+        if self.engine == 'polars':
+            PolarsEngine.require()
+        # Запись отчёта в режиме constant_memory: ключ `xlsx_constant_memory` конфига или XLSX_CONSTANT_MEMORY
+        self.constant_memory = self.config.get('xlsx_constant_memory', XLSX_CONSTANT_MEMORY)
+
+    @staticmethod
+    def _normalize_bitrix_names(bitrix_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Ставит в названия задач Битрикс описания, начинающиеся с "ПЭ: ", и убирает этот префикс.
+
+        Длинные названия программ не вмещаются в название задачи и записываются в описание.
+        Обмен и удаление префикса выполняются по маске для всей колонки
+        (`np.where` и методы `.str`), без вызова Python-функции на каждую строку.
 
-        if config is not None:
-            self.config = config
+        :param bitrix_df: DataFrame задач Битрикс с колонками 'Название' и 'Описание'.
+        :return: DataFrame с исправленными названиями и описаниями.
+        """
+        # Описания начинающиеся с "ПЭ: " ставим в названия
+        swap = DataFrameUtils.startswith_mask(bitrix_df['Описание'], 'ПЭ: ')
+        names = bitrix_df['Название']
+        descriptions = bitrix_df['Описание']
+        if isinstance(names.dtype, pd.StringDtype) and names.dtype == descriptions.dtype:
+            # Обе колонки в `string[pyarrow]`: обмен без перевода в object
+            swapped = {
+                'Название': names.where(~swap, descriptions),
+                'Описание': descriptions.where(~swap, names),
+            }
         else:
-            with open(config_path, 'r', encoding='utf-8') as file:
-                self.config = json.load(file)
+            names = names.to_numpy(dtype=object)
+            descriptions = descriptions.to_numpy(dtype=object)
+            swapped = pd.DataFrame(
+                {
+                    'Название': np.where(swap, descriptions, names),
+                    'Описание': np.where(swap, names, descriptions),
+                },
+                index=bitrix_df.index,
+            ).infer_objects()
+        # Колонки заменяются в новом DataFrame, исходный не изменяется
+        bitrix_df = bitrix_df.assign(Название=swapped['Название'], Описание=swapped['Описание'])
+
+        # Нормализация
+        names = bitrix_df['Название']
+        prefixed = DataFrameUtils.startswith_mask(names, 'ПЭ: ')
+        if prefixed.any():
+            bitrix_df = bitrix_df.assign(Название=names.mask(prefixed, names.str[len('ПЭ: '):]))
+        return bitrix_df
 
     def _merge_content(self) -> pd.DataFrame:
         """
         Объединяет два DataFrame по ключевым колонкам.
 
+        :return: Объединённый DataFrame (см. `_merge`).
+        """
+        return self._merge().result_df
+
+    def _merge(self) -> MergeResult:
+        """
+        Объединяет строки Битрикс и веб-системы.
+
         Выполняет следующие шаги:
         1. Оставляет только нужные колонки, указанные в конфиге.
-        2. Нормализует данные: обрезает строки, заполняет пропуски.
-        3. Объединяет таблицы по полям 'Название' и 'Опытный узел'.
+        2. Нормализует данные: обрезает строки, заполняет пропуски. Все разбивки
+           по разделителям выполняются одним проходом `DataFrameUtils.explode_split`;
+           пиковая память каждого шага сохраняется в `memory_steps` результата
+           (при `PROFILE_MEMORY=1`).
+        3. Объединяет таблицы по полям 'Название' и 'Опытный узел'. Ключи нормализуются
+           и кодируются целыми числами один раз (`JoinKeyIndex`), объединение идёт по кодам.
         4. Удаляет дублирующиеся колонки, если они есть.
         5. Заполняет оставшиеся пропуски.
 
-        :return: Объединённый DataFrame.
+        Исходные `bitrix_df` и `web_df` не изменяются: каждый шаг возвращает новый DataFrame.
+
+        :return: Результат объединения с подготовленными строками и индексом ключей.
         """
-        # Загружаемнужные колонки из битркса
-        bitrix_cols = self.config['bitrix_columns']
-        self.bitrix_df = self.bitrix_df.loc[:, bitrix_cols]
+        memory = MemoryTracker()
 
-        # Длинные программы не вмещаются в названия задач на битркс
-        # Их названия записывают в описание задачи
-        # Описания начинающиеся с "ПЭ: " ставим в названия
-        self.bitrix_df[['Название', 'Описание']] = self.bitrix_df.apply(
-            lambda row: (row['Описание'], row['Название']) 
-            if str(row['Описание']).startswith('ПЭ: ') 
-            else (row['Название'], row['Описание']),
-            axis=1,
-            result_type='expand'
-        )
-        """self.bitrix_df = (
-            self.bitrix_df
-            .assign(Описание=self.bitrix_df['Описание'].str.split('; '))
-            .explode('Описание')
-        )
+        bitrix_df = self._prepare_bitrix(self.bitrix_df, memory)
 
-        self.bitrix_df = (
-            self.bitrix_df
-            .assign(Название=self.bitrix_df['Название'].str.split('; '))
-            .explode('Название')
-        )"""
+        with memory.step('Веб: разбивка'):
+            web_df = self._split_web(self.web_df)
+            web_df = web_df.assign(**{column: web_df[column].ffill() for column in self.WEB_FILL_COLUMNS})
 
-        # Нормализация
-        self.bitrix_df['Название'] = self.bitrix_df['Название'].apply(
-            lambda x: x[4:] if str(x).startswith('ПЭ: ') else x
-        )
-      
-        
-        # Разделяем задачи по бюро
-        self.bitrix_df = (
-            self.bitrix_df
-            .assign(Теги=self.bitrix_df['Теги'].str.split(', '))
-            .explode('Теги')
-        )
+        with memory.step('Объединение'):
+            # Ключи кодируются один раз, те же коды используют листы конфликтов и статистики
+            key_index = JoinKeyIndex(bitrix_df['Название'], web_df['Опытный узел'])
 
-         #Разбиваем составные названия программ по "; " (как в веб-системе)
-        self.bitrix_df['Название'] = self.bitrix_df['Название'].fillna('')  # Защита от NaN
-        self.bitrix_df = (
-            self.bitrix_df
-            .assign(Название=self.bitrix_df['Название'].str.split(r'\s*;\s*'))  # Устойчиво к пробелам
-            .explode('Название')
-        )
-        # Удаляем пустые и "только пробелы" после разбивки
-        self.bitrix_df = self.bitrix_df[
-            self.bitrix_df['Название'].notna() & 
-            (self.bitrix_df['Название'].str.strip() != '')
-        ].copy()
-        self.bitrix_df['Название'] = self.bitrix_df['Название'].str.strip()
-
-        web_cols = self.config['web_columns']
-        self.web_df = self.web_df.loc[:, web_cols]
-        self.web_df["ПЭ: Комментарий"] = self.web_df["ПЭ: Комментарий"].fillna(
-            value='-'
-        )
-        
-        self.web_df = (
-            self.web_df
-            .assign(**{'Опытный узел': self.web_df['Опытный узел'].str.split('; ')})
-            .explode('Опытный узел')
+            # Объединяем битрикс и веб по полям 'Название' и 'Опытный узел' (по кодам ключей)
+            if self.engine == 'polars':
+                merged = self._join_polars(bitrix_df, web_df, key_index)
+            else:
+                merged = self._join_with_snapshot(bitrix_df, web_df, key_index)
+
+            # split/explode возвращают object, возвращаем типы из конфига
+            # (бюро и опытные узлы снова становятся категориями для группировок)
+            merged.result_df = DataFrameUtils.apply_column_dtypes(
+                merged.result_df,
+                self.config.get('column_dtypes'),
+            )
+
+        merged.memory_steps = memory.steps
+        if memory.enabled:
+            print('Пиковая память при объединении:', memory.report())
+
+        return merged
+
+    def _prepare_bitrix(self, bitrix_df: pd.DataFrame, memory: MemoryTracker) -> pd.DataFrame:
+        """
+        Оставляет колонки Битрикс из конфига, исправляет названия и разбивает составные значения.
+
+        :param bitrix_df: DataFrame задач Битрикс.
+        :param memory: Замер пиковой памяти шагов.
+        :return: Подготовленные строки Битрикс.
+        """
+        with memory.step('Битрикс: названия'):
+            # Загружаемнужные колонки из битркса
+            bitrix_cols = self.config['bitrix_columns']
+            bitrix_df = bitrix_df.loc[:, bitrix_cols]
+
+            # В отчёте продолжительность контроля остаётся текстом ('3000 м/ч'),
+            # число часов для шапок листов бюро разбирается один раз здесь
+            if 'Примечание' in bitrix_df.columns:
+                bitrix_df = bitrix_df.assign(**{
+                    self.CONTROL_HOURS_COLUMN: DataFrameUtils.parse_numbers(
+                        bitrix_df['Примечание'], self.CONTROL_HOURS_PATTERN,
+                    ).to_numpy(),
+                })
+
+            # Длинные программы не вмещаются в названия задач на битркс
+            # Их названия записывают в описание задачи
+            bitrix_df = self._normalize_bitrix_names(bitrix_df)
+
+        # Разделяем задачи по бюро и составные названия программ по "; " (как в веб-системе)
+        # за один проход. Разбивка названий устойчива к пробелам,
+        # пустые и "только пробелы" названия после разбивки удаляются
+        with memory.step('Битрикс: разбивка'):
+            return self._explode_split(
+                bitrix_df,
+                self.BITRIX_DELIMITERS,
+                drop_blank=['Название'],
+            )
+
+    def _explode_split(
+        self,
+        df: pd.DataFrame,
+        delimiters: Dict[str, str],
+        drop_blank: Iterable[str] = (),
+    ) -> pd.DataFrame:
+        """
+        Разбивает и разворачивает колонки выбранным движком
+        (`DataFrameUtils.explode_split` или `PolarsEngine.explode_split`).
+        """
+        if self.engine == 'polars':
+            return PolarsEngine.explode_split(df, delimiters, drop_blank=drop_blank)
+        return DataFrameUtils.explode_split(df, delimiters, drop_blank=drop_blank)
+
+    def _split_web(self, web_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Оставляет колонки веб-системы из конфига, разбивает составные опытные узлы
+        и заполняет пустые комментарии. Все шаги построчные, поэтому их можно
+        выполнять и для части выгрузки.
+
+        :param web_df: DataFrame (или часть) выгрузки веб-системы.
+        :return: Обработанный DataFrame.
+        """
+        web_df = self._explode_split(
+            web_df.loc[:, self.config['web_columns']],
+            self.WEB_DELIMITERS,
         )
-        
-        
-        self.web_df[['№ трактора', 'Опытный узел']] = self.web_df[['№ трактора', 'Опытный узел']].ffill()
-
-        # Объединяем битрикс и веб по полям 'Название' и 'Опытный узел'
-        result_df = pd.merge(
-            self.bitrix_df,
-            self.web_df,
-            left_on='Название',
-            right_on='Опытный узел',
+        return web_df.assign(**{
+            "ПЭ: Комментарий": web_df["ПЭ: Комментарий"].fillna(value='-'),
+        })
+
+    def _join_with_snapshot(
+        self,
+        bitrix_df: pd.DataFrame,
+        web_df: pd.DataFrame,
+        key_index: JoinKeyIndex,
+    ) -> MergeResult:
+        """
+        Объединяет строки Битрикс и веб-системы, повторно используя прошлый результат.
+
+        Строки сравниваются по векторным хешам (`pandas.util.hash_pandas_object`).
+        Строка Битрикс берётся из прошлого результата целиком (вместе со всеми
+        найденными для неё строками веб-системы), если такая строка уже была,
+        а строки веб-системы с её ключом не изменились. Остальные строки (новые и
+        изменённые) объединяются заново, удалённые просто не попадают в результат.
+        Без снимка того же источника (или при изменённом конфиге) объединяются все строки.
+
+        Если задано хранилище снимков, в результат записываются прошлый снимок
+        (`previous_snapshot`) и новый (`snapshot`). Без хранилища хеши строк не считаются.
+
+        :param bitrix_df: Подготовленные строки Битрикс.
+        :param web_df: Подготовленные строки веб-системы.
+        :param key_index: Индекс ключей объединения этих строк.
+        :return: Результат объединения до приведения типов.
+        """
+        bitrix_codes, web_codes = key_index.join_codes()
+        previous = None
+        if self.snapshot_store is not None:
+            config_key = MergeSnapshotStore.config_key(self.config)
+            bitrix_hashes = pd.util.hash_pandas_object(bitrix_df, index=False).to_numpy()
+            previous = self.snapshot_store.get(config_key, bitrix_hashes)
+
+            web_hashes = pd.util.hash_pandas_object(web_df, index=False).to_numpy()
+            key_count = len(key_index.keys)
+            web_fingerprints = DataFrameUtils.group_fingerprints(web_hashes, key_index.right_codes, key_count)
+
+        # Позиция строки в прошлом результате, из которой её можно взять (-1 — объединять заново)
+        reuse = np.full(len(bitrix_df), -1)
+        if previous is not None and len(previous.bitrix_hashes):
+            known_hashes, first_rows = np.unique(previous.bitrix_hashes, return_index=True)
+            positions = np.minimum(np.searchsorted(known_hashes, bitrix_hashes), len(known_hashes) - 1)
+            reuse = np.where(known_hashes[positions] == bitrix_hashes, first_rows[positions], -1)
+
+            old_fingerprints = np.fromiter(
+                (previous.web_fingerprints.get(key, 0) for key in key_index.keys),
+                dtype=np.uint64,
+                count=key_count,
+            )
+            changed_keys = np.append(old_fingerprints != web_fingerprints, False)
+            reuse[changed_keys[key_index.left_codes]] = -1
+
+        to_merge = reuse < 0
+        merged_df = pd.merge(
+            bitrix_df[to_merge].assign(**{
+                self.KEY_COLUMN: bitrix_codes[to_merge],
+                self.ROW_COLUMN: np.flatnonzero(to_merge),
+            }),
+            web_df.assign(**{self.KEY_COLUMN: web_codes}),
+            on=self.KEY_COLUMN,
             #how='right',
             how='left',
             suffixes=('_bitrix', '')  # правый без суффикса
         )
+        merged_df.pop(self.KEY_COLUMN)
+        merged_rows = merged_df.pop(self.ROW_COLUMN).to_numpy()
+        lengths = np.bincount(merged_rows, minlength=len(bitrix_df))
+
+        reused = ~to_merge
+        if reused.any():
+            # Собираем результат в порядке строк Битрикс: блоки прошлого результата
+            # и новые блоки из общей таблицы [прошлый результат, объединённые строки]
+            old_lengths = previous.block_lengths
+            old_starts = np.cumsum(old_lengths) - old_lengths
+            new_starts = len(previous.result_df) + np.cumsum(lengths) - lengths
+            lengths = np.where(reused, old_lengths[reuse], lengths)
+            sources = np.where(reused, old_starts[reuse], new_starts)
+            rows = np.repeat(sources, lengths) + ExcelUtils._offsets_within(lengths)
+            parts = [previous.result_df, merged_df] if len(merged_df) else [previous.result_df]
+            result_df = pd.concat(parts, ignore_index=True).take(rows).reset_index(drop=True)
+        else:
+            result_df = merged_df
+
+        row_of_result = np.repeat(np.arange(len(bitrix_df)), lengths)
+        merged = MergeResult(
+            result_df=result_df,
+            bitrix_df=bitrix_df,
+            web_df=web_df,
+            key_index=key_index,
+            result_key_codes=key_index.matched_codes(key_index.left_codes[row_of_result]),
+        )
 
-        return result_df
+        merged.previous_snapshot = previous
+        if self.snapshot_store is not None:
+            merged.snapshot = MergeSnapshot(
+                config_key=config_key,
+                bitrix_hashes=bitrix_hashes,
+                web_fingerprints=dict(zip(key_index.keys, web_fingerprints.tolist())),
+                result_df=result_df,
+                block_lengths=lengths,
+            )
+        merged.incremental_stats = {
+            'reused_rows': int(reused.sum()),
+            'merged_rows': int(to_merge.sum()),
+        }
+        return merged
 
-    def _format_excel_report(self, group_col_name: str, output_file: str) -> None:
+    def _join_polars(self, bitrix_df: pd.DataFrame, web_df: pd.DataFrame, key_index: JoinKeyIndex) -> MergeResult:
+        """
+        Объединяет битрикс и веб по кодам ключей в плане Polars.
+
+        Polars считает только пары номеров строк, колонки собираются по ним в pandas.
+        Снимок прошлого объединения в этом режиме не используется.
+
+        :param bitrix_df: Подготовленные строки Битрикс.
+        :param web_df: Подготовленные строки веб-системы.
+        :param key_index: Индекс ключей объединения этих строк.
+        :return: Результат объединения до приведения типов.
+        """
+        bitrix_rows, web_rows = PolarsEngine.left_join_rows(*key_index.join_codes())
+
+        # Строки веб-системы без пары (-1) становятся пустыми, как при левом объединении
+        result_df = self._concat_merged(
+            bitrix_df.take(bitrix_rows).reset_index(drop=True),
+            web_df.reset_index(drop=True).reindex(web_rows).reset_index(drop=True),
+        )
+        return MergeResult(
+            result_df=result_df,
+            bitrix_df=bitrix_df,
+            web_df=web_df,
+            key_index=key_index,
+            result_key_codes=key_index.matched_codes(key_index.left_codes[bitrix_rows]),
+        )
+
+    @staticmethod
+    def _concat_merged(bitrix_part: pd.DataFrame, web_part: pd.DataFrame) -> pd.DataFrame:
+        """
+        Склеивает выровненные строки Битрикс и веб-системы в результат объединения.
+
+        Как в `pd.merge(suffixes=('_bitrix', ''))`: совпадающие колонки Битрикс
+        получают суффикс, веб-системы — нет.
+        """
+        bitrix_part = bitrix_part.rename(columns={
+            column: f'{column}_bitrix' for column in bitrix_part.columns if column in web_part.columns
+        })
+        return pd.concat([bitrix_part, web_part], axis=1)
+
+    def _reformat_result(self, df: pd.DataFrame, column_map: Dict[str, List[Any]]) -> pd.DataFrame:
+        """
+        Переименовывает и переставляет колонки результата (`DataFrameUtils.reformat_dataframe`),
+        оставляя в конце служебную колонку `CONTROL_HOURS_COLUMN` для шапок листов бюро.
+
+        :param df: Результат объединения.
+        :param column_map: Колонки отчёта из `report_column_map`.
+        :return: Результат с колонками отчёта.
+        """
+        result = DataFrameUtils.reformat_dataframe(df=df, column_map=column_map)
+        if self.CONTROL_HOURS_COLUMN in df.columns:
+            result = result.assign(**{self.CONTROL_HOURS_COLUMN: df[self.CONTROL_HOURS_COLUMN].to_numpy()})
+        return result
+
+    @staticmethod
+    def _bureau_fingerprints(result_df: pd.DataFrame, group_col_name: str) -> Dict[Any, int]:
+        """
+        Возвращает отпечаток строк (с учётом порядка) для каждого бюро отчёта.
+
+        :param result_df: Строки отчёта.
+        :param group_col_name: Название столбца для группировки (например, 'Бюро').
+        :return: Словарь {бюро: отпечаток}.
+        """
+        codes, names = pd.factorize(result_df[group_col_name])
+        row_hashes = pd.util.hash_pandas_object(result_df, index=False).to_numpy()
+        fingerprints = DataFrameUtils.group_fingerprints(row_hashes, codes, len(names))
+        return dict(zip(names, fingerprints.tolist()))
+
+    def _format_excel_report(
+        self,
+        group_col_name: str,
+        output_file: str,
+        merged: MergeResult | None = None,
+        reused_sheets: Dict[Any, Any] | None = None,
+    ) -> Dict[Any, Any]:
             """
             Форматирует и сохраняет данные в Excel-файл с несколькими листами.
 
             :param group_col_name: Название столбца для группировки (например, 'Бюро').
             :param output_file: Путь к выходному Excel-файлу.
+            :param merged: Результат объединения с колонками отчёта. Если не указан,
+                           отчёт строится по `result_df`, `bitrix_df` и `web_df` drawer'а.
+            :param reused_sheets: Данные листов бюро из прошлого объединения, которые не готовятся заново.
+            :return: Данные листов бюро {бюро: данные `_prepare_bureau_sheet`}.
             """
-            grouped = self.result_df.groupby(group_col_name)
+            if merged is None:
+                merged = MergeResult(self.result_df, self.bitrix_df, self.web_df)
+            reused_sheets = reused_sheets or {}
+            bureau_sheets = {}
+            # Статистика шапок всех листов бюро считается заранее одной группировкой
+            bureau_stats = self._bureau_node_stats(merged, group_col_name)
 
-            with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
+            with ExcelUtils.report_writer(output_file, self.constant_memory) as writer:
+                # Листы пишутся по строкам сверху вниз (см. `RowWriter`)
+                rows = RowWriter(writer)
 
                 # Создаем лист статистики
-                self._create_stats_sheet(writer)
-                self._create_conflict_sheet(writer)
+                self._create_stats_sheet(rows, merged)
+                self._create_conflict_sheet(rows, merged)
 
                 # Создаем листы по бюро
-                for name, group in grouped:
-                    group = group.copy()
-                    task_mask = (
-                        group['Опытный узел'].notna()
-                        & group['Опытный узел'].astype(str).str.strip().ne('')
-                    )
-                    group = group[task_mask]
-                    if group.empty:
+                for name, group in self._iter_bureau_groups(merged, group_col_name):
+                    # Данные листов бюро без изменений берутся из прошлого объединения
+                    if name in reused_sheets:
+                        sheet = reused_sheets[name]
+                    else:
+                        sheet = self._prepare_bureau_sheet(group, bureau_stats.get(name))
+                    bureau_sheets[name] = sheet
+                    if sheet is None:
                         continue
+                    self._write_bureau_sheet(rows, name, sheet)
+            return bureau_sheets
 
-                    sheet_name = str(name).replace(':', '').replace('\\', '').replace('/', '')[:31]
-                    format_dict = {}
+    def _iter_bureau_groups(self, merged: MergeResult, group_col_name: str) -> Iterator[Tuple[Any, pd.DataFrame]]:
+        """
+        Перебирает строки результата по бюро.
 
-                    # рассчитываем статистику в шапке
-                    name_counts = (
-                        group.groupby('Опытный узел')['№ трактора']
-                        .nunique()
-                        .reset_index()
-                        .rename(columns={'№ трактора': 'Количество тракторов'})
-                    )
+        :param merged: Результат объединения.
+        :param group_col_name: Название столбца для группировки (например, 'Бюро').
+        :return: Пары (бюро, строки бюро).
+        """
+        return iter(merged.result_df.groupby(group_col_name, observed=True))
 
-                    # Рассчитываем среднюю наработку для каждого опытного узла
-                    avg_hours = (
-                        group.groupby(['Опытный узел', '№ трактора'])['Наработка, м/ч']
-                        .max()
-                        .groupby(level=0)
-                        .mean()
-                        .reset_index(name='Средняя наработка, м/ч')
-                        .round(1)
-                    )
+    def _bureau_node_stats(self, merged: MergeResult, group_col_name: str) -> Dict[Any, pd.DataFrame] | None:
+        """
+        Считает статистику шапок всех листов бюро одной группировкой по (бюро, опытный узел).
 
-                    # Рассчитываем максимальную наработку для каждого опытного узла
-                    max_hours = (
-                        group.groupby('Опытный узел')['Продолжительность контроля, м/ч']
-                        .apply(lambda x: x.dropna().iloc[0] if not x.dropna().empty else None)
-                        .rename('Продолжительность контроля, м/ч')
-                        .reset_index()
-                    )
-                    max_hours['Продолжительность контроля, м/ч'] = (
-                        max_hours['Продолжительность контроля, м/ч']
-                        .astype(str)
-                        .str.extract(r'(\d+)')[0]
-                        .astype(float)
-                    )
+        Группировка по всему `result_df` сортирует строки один раз, статистика каждого
+        бюро — непрерывный срез результата. Так не повторяются копирование, группировки
+        и объединения для каждого бюро.
 
-                    # Объединяем данные
-                    stats_df = pd.merge(name_counts, avg_hours, on='Опытный узел')
-                    stats_df = pd.merge(stats_df, max_hours, on='Опытный узел')
-
-                    # Вычисляем отношение средней к максимальной наработке
-                    stats_df['Отношение avr/max'] = (stats_df['Средняя наработка, м/ч'] / stats_df['Продолжительность контроля, м/ч']).round(2) * 100
-
-                    # Шапка страницы
-                    header_df = pd.DataFrame({
-                        'Опытный узел': stats_df['Опытный узел'],
-                        'Пусто1': '',
-                        'Пусто2': '',
-                        'Пусто3': '',
-                        'Пусто4': '',
-                        'Количество тракторов': stats_df['Количество тракторов'],
-                        'Средняя наработка, м/ч': stats_df['Средняя наработка, м/ч'],
-                        'Отношение avr/max': stats_df['Отношение avr/max']
-                    })
+        :param merged: Результат объединения.
+        :param group_col_name: Название столбца для группировки (например, 'Бюро').
+        :return: Словарь {бюро: статистика по опытным узлам, как у `_node_stats`}.
+                 Бюро без тракторов в словарь не попадают.
+        """
+        result_df = merged.result_df
+        tasks = result_df[self._task_mask(result_df)]
+        stats_df = self._engine_node_stats(tasks, keys=(group_col_name, 'Опытный узел'))
+        return {
+            name: bureau_stats.drop(columns=group_col_name).reset_index(drop=True)
+            for name, bureau_stats in stats_df.groupby(group_col_name, observed=True, sort=False)
+        }
+
+    @staticmethod
+    def _task_mask(df: pd.DataFrame) -> np.ndarray:
+        """
+        Отмечает строки с заполненным опытным узлом (не пустым и не из одних пробелов).
 
-                    # Записываем шапку в Excel
-                    header_df.to_excel(writer, sheet_name=sheet_name, index=False, startrow=0)
-                    worksheet = writer.sheets[sheet_name]
-
-                    # Форматируем шапку
-                    for row_offset, value in enumerate(header_df['Опытный узел'], start=1):
-                        color = ExcelUtils.get_cell_color(value)
-                        if color not in format_dict:
-                            format_dict[color] = writer.book.add_format({
-                                'bg_color': color, 
-                                'valign': 'vcenter',
-                                'border': 1,
-                                })
-                        worksheet.merge_range(
-                            first_row=0 + row_offset,
-                            first_col=0,
-                            last_row=0 + row_offset,
-                            last_col=4,
-                            data=value,
-                            cell_format=format_dict[color],
-                        )
-
-                    # Создаем формат заголовков
-                    header_format = writer.book.add_format({
-                        'bold': True,
-                        'align': 'center',
-                        'valign': 'vcenter',
-                        'border': 1,
-                        'text_wrap': True,
-                    })
+        Для категорий проверяются только сами категории, а не каждая строка.
 
-                    # Создаем заголовок шапки страницы
-                    worksheet.merge_range(0, 0, 0, 4, 'Программа ПЭ:', header_format)
-                    worksheet.write(0, 5, 'Количество тракторов', header_format)
-                    worksheet.write(0, 6, 'Средняя наработка, м/ч', header_format)
-                    worksheet.write(0, 7, 'Прогресс программы, %', header_format)
-
-                    # Процентный формат (85% вместо 0.85)
-                    percent_format = writer.book.add_format({"num_format": "0%"})
-                    worksheet.set_column("H:H", None, percent_format)
-
-                    num_of_programs = len(name_counts)
-
-                    # Добавляем прогресс-бары (data bars)
-                    worksheet.conditional_format(
-                        f"H2:H{num_of_programs+1}",  # Диапазон 
-                        {
-                            "type": "data_bar",
-                            "bar_color": "#63C384",  # Зеленый
-                            "bar_solid": True,       # Сплошная заливка (не градиент)
-                            "min_type": "num",
-                            "min_value": 0,          # Минимум для шкалы (0%)
-                            "max_type": "num",
-                            "max_value": 100,          # Максимум для шкалы (100%)
-                        },
-                    )
+        :param df: Строки результата.
+        :return: Булев массив по строкам `df`.
+        """
+        nodes = df['Опытный узел']
+        if isinstance(nodes.dtype, pd.CategoricalDtype):
+            filled = nodes.cat.categories.astype(str).str.strip() != ''
+            # Код -1 (пропуск) указывает на добавленный в конец False
+            return np.append(filled, False)[nodes.cat.codes.to_numpy()]
+        return (nodes.notna() & nodes.astype(str).str.strip().ne('')).to_numpy()
+
+    def _engine_node_stats(self, group: pd.DataFrame, keys: Tuple[str, ...] = ('Опытный узел',)) -> pd.DataFrame:
+        """
+        Считает статистику по опытным узлам выбранным движком
+        (`_node_stats` или `PolarsEngine.node_stats`).
+        """
+        if self.engine == 'polars':
+            return PolarsEngine.node_stats(group, keys=keys)
+        return self._node_stats(group, keys=keys)
+
+    def _prepare_bureau_sheet(self, group: pd.DataFrame, stats_df: pd.DataFrame | None = None) -> Dict[str, Any] | None:
+        """
+        Рассчитывает данные листа бюро: шапку со статистикой по опытным узлам и главную таблицу.
+
+        :param group: Строки результата одного бюро.
+        :param stats_df: Статистика бюро по опытным узлам из `_bureau_node_stats`.
+                         Если не указана, она считается по строкам `group`.
+        :return: Словарь с шапкой (`header_df`), числом программ (`num_of_programs`)
+                 и главной таблицей (`group`) или None, если у бюро нет опытных узлов.
+        """
+        group = group[self._task_mask(group)]
+        if group.empty:
+            return None
+
+        # рассчитываем статистику в шапке
+        if stats_df is None:
+            stats_df = self._engine_node_stats(group)
+
+        # Вычисляем отношение средней к максимальной наработке
+        progress = (stats_df['Средняя наработка, м/ч'] / stats_df[self.CONTROL_COLUMN]).round(2) * 100
+
+        # Шапка страницы
+        header_df = pd.DataFrame({
+            'Опытный узел': stats_df['Опытный узел'],
+            'Пусто1': '',
+            'Пусто2': '',
+            'Пусто3': '',
+            'Пусто4': '',
+            'Количество тракторов': stats_df['Количество тракторов'],
+            'Средняя наработка, м/ч': stats_df['Средняя наработка, м/ч'],
+            'Отношение avr/max': progress,
+        })
+
+        return {
+            'header_df': header_df,
+            'num_of_programs': group['Опытный узел'].nunique(),
+            'group': group,
+        }
+
+    @staticmethod
+    def _node_stats(group: pd.DataFrame, keys: Tuple[str, ...] = ('Опытный узел',)) -> pd.DataFrame:
+        """
+        Статистика шапки листа бюро по опытным узлам (pandas, см. `PolarsEngine.node_stats`).
+
+        Для каждого узла: число различных тракторов, средняя по тракторам максимальная
+        наработка и первая известная продолжительность контроля в часах
+        (`CONTROL_HOURS_COLUMN`). Узлы без тракторов в результат не попадают.
+
+        :param group: Строки с заполненными опытными узлами.
+        :param keys: Колонки группировки, последняя — 'Опытный узел'
+                     (например, ('Бюро', 'Опытный узел') для всех бюро сразу).
+        :return: DataFrame с колонками `keys`, 'Количество тракторов',
+                 'Средняя наработка, м/ч', 'Продолжительность контроля, м/ч' в порядке `keys`.
+        """
+        keys = list(keys)
+        # Максимальная наработка каждого трактора узла; число тракторов — число таких групп
+        tractor_hours = (
+            group.groupby([*keys, '№ трактора'], observed=True)['Наработка, м/ч']
+            .max()
+            .groupby(level=list(range(len(keys))), observed=True)
+            .agg(['size', 'mean'])
+        )
+
+        # Продолжительность контроля — первая известная в строках узла
+        control = group.groupby(keys, observed=True)[MergeDrawer.CONTROL_HOURS_COLUMN].first()
+
+        return pd.DataFrame({
+            'Количество тракторов': tractor_hours['size'],
+            'Средняя наработка, м/ч': tractor_hours['mean'].round(1),
+            'Продолжительность контроля, м/ч': control.reindex(tractor_hours.index),
+        }).reset_index()
+
+    def _write_bureau_sheet(self, rows: RowWriter, name: Any, sheet: Dict[str, Any]) -> None:
+        """
+        Записывает и форматирует лист бюро по данным из `_prepare_bureau_sheet`.
+
+        Лист пишется сверху вниз: сначала настройки колонок, затем шапка и главная таблица.
+
+        :param rows: RowWriter отчёта.
+        :param name: Название бюро.
+        :param sheet: Данные листа.
+        """
+        header_df = sheet['header_df']
+        group = sheet['group']
+
+        sheet_name = str(name).replace(':', '').replace('\\', '').replace('/', '')[:31]
+        worksheet = rows.sheet(sheet_name)
+        format_dict = {}
+
+        # Создаем формат заголовков
+        header_format = rows.book.add_format({
+            'bold': True,
+            'align': 'center',
+            'valign': 'vcenter',
+            'border': 1,
+            'text_wrap': True,
+        })
 
+        # Процентный формат (85% вместо 0.85)
+        percent_format = rows.book.add_format({"num_format": "0%"})
+        worksheet.set_column("H:H", None, percent_format)
 
+        num_of_programs = sheet['num_of_programs']
 
-                    # Задаем размеры колонкам
-                    start_row = len(name_counts) + 4
-                    worksheet.set_column('A:A', 16)
-                    worksheet.set_column('B:B', 20)
-                    worksheet.set_column('C:C', 56)
-                    worksheet.set_column('D:D', 18)
-                    worksheet.set_column('E:E', 24)
-                    worksheet.set_column('F:F', 12)
-                    worksheet.set_column('G:G', 20)
-                    worksheet.set_column('H:H', 104)
-                    worksheet.set_column('I:I', 18)
-
-                    # Убираем колонку бюро из таблицы
-                    group = group.drop(columns=['Бюро'])
-                    
-                    # Заполняем заголовок главной таблицы
-                    for i, col in enumerate(group.columns):
-                        worksheet.write(
-                            start_row-1,
-                            i,
-                            col,
-                            header_format,
-                        )
-                    
-                    # Записываем главную таблицу
-                    group.to_excel(
-                        writer,
-                        sheet_name=sheet_name,
-                        index=False,
-                        startrow=start_row,
-                        header=False,
-                        )
-
-                    # Задаем какую колонку раскрашиваем
-                    colored_col = self.config["report_column_map"]["Опытный узел"][0]
-
-
-                    # Раскрашиваем ячейки
-                    for row_offset, value in enumerate(group['Опытный узел'], 0):
-                        color = ExcelUtils.get_cell_color(value)
-                        cell_value = '' if pd.isna(value) else value
-                        if color not in format_dict:
-                            format_dict[color] = writer.book.add_format({
-                                'bg_color': color,
-                                'valign': 'vcenter',
-                                'border': 1,
-                                'text_wrap': True
-                                })
-                        worksheet.write(start_row + row_offset, colored_col, cell_value, format_dict[color])
-
-                    # Задаем форматирование для всех строк
-                    cell_format = writer.book.add_format({
-                        'text_wrap': True,
-                        'valign': 'vcenter',
-                        'border': 1,
+        # Добавляем прогресс-бары (data bars)
+        worksheet.conditional_format(
+            f"H2:H{num_of_programs+1}",  # Диапазон 
+            {
+                "type": "data_bar",
+                "bar_color": "#63C384",  # Зеленый
+                "bar_solid": True,       # Сплошная заливка (не градиент)
+                "min_type": "num",
+                "min_value": 0,          # Минимум для шкалы (0%)
+                "max_type": "num",
+                "max_value": 100,          # Максимум для шкалы (100%)
+            },
+        )
+
+
+
+        # Задаем размеры колонкам
+        start_row = sheet['num_of_programs'] + 4
+        worksheet.set_column('A:A', 16)
+        worksheet.set_column('B:B', 20)
+        worksheet.set_column('C:C', 56)
+        worksheet.set_column('D:D', 18)
+        worksheet.set_column('E:E', 24)
+        worksheet.set_column('F:F', 12)
+        worksheet.set_column('G:G', 20)
+        worksheet.set_column('H:H', 104)
+        worksheet.set_column('I:I', 18)
+
+        # Создаем заголовок шапки страницы
+        worksheet.merge_range(0, 0, 0, 4, 'Программа ПЭ:', header_format)
+        worksheet.write(0, 5, 'Количество тракторов', header_format)
+        worksheet.write(0, 6, 'Средняя наработка, м/ч', header_format)
+        worksheet.write(0, 7, 'Прогресс программы, %', header_format)
+
+        # Записываем шапку: опытный узел на объединённых ячейках A:E и статистика по нему
+        header_stats = header_df[['Опытный узел', 'Количество тракторов', 'Средняя наработка, м/ч', 'Отношение avr/max']]
+        for row, (value, *stats) in enumerate(rows.rows(header_stats), start=1):
+            color = ExcelUtils.get_cell_color(value)
+            if color not in format_dict:
+                format_dict[color] = rows.book.add_format({
+                    'bg_color': color, 
+                    'valign': 'vcenter',
+                    'border': 1,
                     })
+            worksheet.merge_range(
+                first_row=row,
+                first_col=0,
+                last_row=row,
+                last_col=4,
+                data=value,
+                cell_format=format_dict[color],
+            )
+            for col, stat in enumerate(stats, start=5):
+                rows.write_cell(worksheet, row, col, stat)
+
+        # Убираем из таблицы колонку бюро и служебную колонку часов контроля
+        group = group.drop(columns=['Бюро', self.CONTROL_HOURS_COLUMN], errors='ignore')
+
+        # Задаем какую колонку раскрашиваем
+        colored_col = self.config["report_column_map"]["Опытный узел"][0]
+
+        def colored_format(value):
+            color = ExcelUtils.get_cell_color(value)
+            if color not in format_dict:
+                format_dict[color] = rows.book.add_format({
+                    'bg_color': color,
+                    'valign': 'vcenter',
+                    'border': 1,
+                    'text_wrap': True
+                    })
+            return format_dict[color]
+
+        # Задаем форматирование для всех строк
+        cell_format = rows.book.add_format({
+            'text_wrap': True,
+            'valign': 'vcenter',
+            'border': 1,
+        })
 
-                    for i in range(start_row, group.shape[0]+start_row):
-                        worksheet.set_row(
-                            i,
-                            None,
-                            cell_format,
-                        )
-    def _create_stats_sheet(self, writer):
+        # Записываем главную таблицу с заголовком и раскрашенной колонкой опытных узлов
+        rows.write_frame(
+            sheet_name,
+            group,
+            startrow=start_row - 1,
+            header_format=header_format,
+            row_format=cell_format,
+            column_formats={colored_col: colored_format},
+        )
+
+    def _stats_tables(self, merged: MergeResult) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Считает общую статистику и статистику по бюро для листа 'Статистика'.
+
+        :param merged: Результат объединения.
+        :return: Общая статистика и статистика по бюро.
+        """
         # Общая статистика
-        total_tractors = pd.DataFrame(self.web_df.agg(
+        total_tractors = pd.DataFrame(merged.web_df.agg(
                 func={
                     '№ трактора': 'nunique'
                 },
@@ -366,47 +806,54 @@ class MergeDrawer(Drawer):
                 '№ трактора': 'Число тракторов'
             })
         
-        total_programs = pd.DataFrame(self.bitrix_df.agg(
-            func={
-                'Название': 'nunique',
-            }
-        )).T.reset_index(drop=True)
+        # Число программ — число различных ключей Битрикс
+        total_programs = pd.DataFrame({
+            'Название': [JoinKeyIndex.count_distinct(merged.key_index.left_codes)],
+        })
 
         total = pd.concat([total_tractors, total_programs], axis=1)
-        
-        # Записываем общую статистику в Excel
-        total.to_excel(
-                excel_writer=writer,
-                sheet_name='Статистика',
-                index=False
-            )
 
         # Статистика по бюро
-        result = self.result_df.groupby('Бюро').agg({
-                'Опытный узел': 'nunique',
-                '№ трактора': 'nunique'
-            }).reset_index()
+        # Опытные узлы считаются по кодам ключей, если результат получен из `_merge`
+        result_df = merged.result_df
+        result_key_codes = merged.result_key_codes
+        nodes = result_df['Опытный узел']
+        if result_key_codes is not None and len(result_key_codes) == len(result_df):
+            nodes = pd.Series(result_key_codes, index=result_df.index).where(result_key_codes >= 0)
+        if self.engine == 'polars':
+            result = PolarsEngine.bureau_counts(result_df['Бюро'], nodes, result_df['№ трактора'])
+        else:
+            result = pd.DataFrame({
+                'Бюро': result_df['Бюро'],
+                'Опытный узел': nodes,
+                '№ трактора': result_df['№ трактора'],
+            }).groupby('Бюро', observed=True).agg({
+                    'Опытный узел': 'nunique',
+                    '№ трактора': 'nunique'
+                }).reset_index()
         result = result.rename(columns={
                 'Опытный узел': 'Число опытных узлов',
                 '№ трактора': 'Число тракторов'
             })
+        return total, result
+
+    def _create_stats_sheet(self, rows: RowWriter, merged: MergeResult):
+        total, result = self._stats_tables(merged)
+
+        # Записываем общую статистику в Excel
+        rows.write_frame('Статистика', total)
 
         # Write bureau stats table below the total stats
-        result.to_excel(
-                excel_writer=writer,
-                sheet_name='Статистика',
-                index=False,
-                startrow=len(total) + 2,
-            )
+        rows.write_frame('Статистика', result, startrow=len(total) + 2)
 
         # Set column widths
-        writer.sheets['Статистика'].set_column('A:A', 56)
-        writer.sheets['Статистика'].set_column('B:B', 24)
-        writer.sheets['Статистика'].set_column('C:C', 24)
+        worksheet = rows.sheet('Статистика')
+        worksheet.set_column('A:A', 56)
+        worksheet.set_column('B:B', 24)
+        worksheet.set_column('C:C', 24)
 
         # Create a pie chart
-        workbook = writer.book
-        worksheet = writer.sheets['Статистика']
+        workbook = rows.book
         
         # Create chart object
         chart = workbook.add_chart({'type': 'pie'})
@@ -433,22 +880,48 @@ class MergeDrawer(Drawer):
             })
 
 
-    def _create_conflict_sheet(self, writer):
-        bitrix_names = self.bitrix_df['Название'].astype(str).str.strip()
-        web_nodes = self.web_df['Опытный узел'].astype(str).str.strip()
+    def _unmatched_rows(self, merged: MergeResult) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Возвращает строки Битрикс и веб-системы, для которых не нашлось пары.
+
+        :param merged: Результат объединения.
+        :return: Строки только из Битрикс и строки только из веб-системы.
+        """
+        # Записи без пары ищутся по кодам ключей, построенным при объединении
+        key_index = merged.key_index
+        return merged.bitrix_df[key_index.left_only()], merged.web_df[key_index.right_only()]
 
-        bitrix_valid_mask = bitrix_names.ne('') & bitrix_names.ne('nan')
-        web_valid_mask = web_nodes.ne('') & web_nodes.ne('nan')
+    def _suggest_web_nodes(self, names: pd.Series, web_nodes: pd.Series) -> pd.DataFrame:
+        """
+        Предлагает для названий задач Битрикс без пары похожие опытные узлы веб-системы без пары.
 
-        bitrix_key_set = set(bitrix_names[bitrix_valid_mask].unique())
-        web_key_set = set(web_nodes[web_valid_mask].unique())
+        Чаще всего такие конфликты — опечатки и лишние пробелы в названиях программ.
+        Похожие узлы ищутся по индексу триграмм (`TrigramIndex`), без сравнения
+        каждого названия с каждым узлом; одинаковые названия ищутся один раз.
 
-        only_bitrix = self.bitrix_df[
-            bitrix_valid_mask & ~bitrix_names.isin(web_key_set)
-        ].copy()
-        only_web = self.web_df[
-            web_valid_mask & ~web_nodes.isin(bitrix_key_set)
-        ].copy()
+        :param names: Названия задач Битрикс.
+        :param web_nodes: Опытные узлы веб-системы.
+        :return: DataFrame с колонками `SUGGESTION_COLUMNS`, строки в порядке `names`.
+        """
+        candidates = pd.unique(web_nodes.dropna().astype(str).str.strip())
+        index = TrigramIndex(
+            node for node in candidates if node not in JoinKeyIndex.INVALID_KEYS
+        )
+        keys = names.astype(str).str.strip()
+        found = {name: index.search(name) for name in pd.unique(keys)}
+        matches = keys.map(found)
+
+        best_node, best_similarity, others = self.SUGGESTION_COLUMNS
+        return pd.DataFrame({
+            best_node: matches.map(lambda match: match[0][0] if match else None),
+            best_similarity: matches.map(lambda match: match[0][1] if match else None),
+            others: matches.map(
+                lambda match: '; '.join(f'{node} ({similarity:.0%})' for node, similarity in match[1:]) or None
+            ),
+        }, index=names.index)
+
+    def _create_conflict_sheet(self, rows: RowWriter, merged: MergeResult):
+        only_bitrix, only_web = self._unmatched_rows(merged)
 
         conflict_parts = []
 
@@ -466,6 +939,11 @@ class MergeDrawer(Drawer):
             })
             bitrix_conflicts.insert(0, 'Источник', 'БИТРИКС')
             bitrix_conflicts.insert(1, 'Причина', 'Нет в служебном отчете')
+            if not only_web.empty and 'Название' in only_bitrix.columns:
+                suggestions = self._suggest_web_nodes(only_bitrix['Название'], only_web['Опытный узел'])
+                bitrix_conflicts = bitrix_conflicts.assign(**{
+                    column_name: suggestions[column_name].to_numpy() for column_name in suggestions.columns
+                })
             conflict_parts.append(bitrix_conflicts)
 
         if not only_web.empty:
@@ -484,16 +962,17 @@ class MergeDrawer(Drawer):
 
         if conflict_parts:
             conflicts_df = pd.concat(conflict_parts, ignore_index=True, sort=False)
+            # Предложения похожих узлов — последними колонками
+            suggestion_cols = [column for column in self.SUGGESTION_COLUMNS if column in conflicts_df.columns]
+            conflicts_df = conflicts_df[
+                [column for column in conflicts_df.columns if column not in suggestion_cols] + suggestion_cols
+            ]
         else:
             conflicts_df = pd.DataFrame({'Статус': ['Конфликтов не найдено']})
 
-        conflicts_df.to_excel(
-            excel_writer=writer,
-            sheet_name='Конфликты',
-            index=False,
-        )
+        rows.write_frame('Конфликты', conflicts_df)
 
-        sheet = writer.sheets['Конфликты']
+        sheet = rows.sheet('Конфликты')
         sheet.set_column('A:A', 16)
         sheet.set_column('B:B', 28)
         sheet.set_column('C:C', 60)
@@ -501,42 +980,77 @@ class MergeDrawer(Drawer):
         sheet.set_column('E:E', 18)
         sheet.set_column('F:F', 20)
         sheet.set_column('G:G', 60)
+        for column_name, width in zip(self.SUGGESTION_COLUMNS, (60, 12, 80)):
+            if column_name in conflicts_df.columns:
+                column_index = conflicts_df.columns.get_loc(column_name)
+                sheet.set_column(column_index, column_index, width)
 
+    def _write_report(self, merged: MergeResult, output_file: str) -> MergeResult:
+        """
+        Строит по результату объединения отчёт и сохраняет его в `output_file`.
+
+        Переименовывает и переставляет колонки согласно конфигурации, записывает листы
+        и, если задано хранилище снимков, сохраняет снимок этого объединения.
+
+        :param merged: Результат объединения из `_merge`.
+        :param output_file: Путь к выходному Excel-файлу.
+        :return: Результат объединения с колонками отчёта и счётчиками инкрементального объединения.
+        """
+        # Переименовываем и переставляем колонки
+        col_map = self.config['report_column_map']
+        merged.result_df = self._reformat_result(merged.result_df, col_map)
+
+        # Листы бюро без изменений с прошлого объединения не готовятся заново (но записываются)
+        bureau_fingerprints = {}
+        if self.snapshot_store is not None:
+            bureau_fingerprints = self._bureau_fingerprints(merged.result_df, 'Бюро')
+        reused_sheets = {}
+        previous = merged.previous_snapshot
+        if previous is not None:
+            reused_sheets = {
+                name: previous.bureau_sheets[name]
+                for name, fingerprint in bureau_fingerprints.items()
+                if previous.bureau_fingerprints.get(name) == fingerprint and name in previous.bureau_sheets
+            }
+
+        # Форматируем Excel
+        bureau_sheets = self._format_excel_report(
+            group_col_name='Бюро',
+            output_file=output_file,
+            merged=merged,
+            reused_sheets=reused_sheets,
+        )
+
+        if self.snapshot_store is not None and merged.snapshot is not None:
+            merged.snapshot.bureau_fingerprints = bureau_fingerprints
+            merged.snapshot.bureau_sheets = bureau_sheets
+            self.snapshot_store.put(merged.snapshot, replaces=previous)
+            merged.incremental_stats['rendered_bureaus'] = len(bureau_sheets) - len(reused_sheets)
+            print('Инкрементальное объединение:', merged.incremental_stats)
+
+        return merged
 
     def draw_report(self) -> SuccesSchema:
         """
         Основной метод для генерации отчёта.
 
         Последовательность действий:
-        1. Объединение данных из двух источников.
+        1. Объединение данных из двух источников (`_merge`).
         2. Переформатирование DataFrame согласно конфигурации.
         3. Сохранение результата в файл.
-        4. Форматирование Excel-файла.
+        4. Форматирование Excel-файла (`_write_report`).
         5. Возврат успешного ответа с ссылкой на скачивание.
 
         :return: Объект `SuccesSchema`, содержащий сообщение и ссылку на скачивание файла.
         """
         # Сливаем 2 таблицы в одну
-        self.result_df = self._merge_content()
-
-        # Переименовываем и переставляем колонки
-        col_map = self.config['report_column_map']
-        self.result_df = DataFrameUtils.reformat_dataframe(
-            df=self.result_df,
-            column_map=col_map,
-        )
+        merged = self._merge()
 
         # Сохраняем отчет
-        upload_folder = os.environ.get('UPLOAD_FOLDER')
         output_file, link_file = Utils.create_save_file(
-            upl_folder=upload_folder,
-        )
-
-        # Форматируем Excel
-        self._format_excel_report(
-            group_col_name='Бюро',
-            output_file=output_file,
+            upl_folder=self.upload_folder,
         )
+        self._write_report(merged, output_file)
 
         return SuccesSchema(
             message='Отчет создан',
@@ -544,6 +1058,282 @@ class MergeDrawer(Drawer):
         )
 
 
+class ChunkedMergeResult(MergeResult):
+    """
+    Результат объединения по частям (`ChunkedMergeDrawer`).
+
+    Кроме полей `MergeResult` хранит сброшенные на диск строки и данные,
+    накопленные по частям для листов бюро, статистики и конфликтов.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Инициализирует результат объединения по частям.
+        """
+        super().__init__(*args, **kwargs)
+        # Сброшенные по бюро строки результата
+        self.spill: BureauSpill | None = None
+        # Бюро и код бюро каждой строки Битрикс
+        self.bureaus = None
+        self.bureau_codes = None
+        # Накопленные по частям данные для листов статистики и конфликтов
+        self.in_web = None
+        self.tractors = None
+        self.bureau_stats = None
+        self.only_web_df = None
+
+
+class ChunkedMergeDrawer(MergeDrawer):
+    """
+    Объединение по частям для выгрузок веб-системы, которые не помещаются в память.
+
+    Битрикс (он небольшой) нормализуется целиком и служит словарём ключей объединения.
+    Выгрузка веб-системы читается частями: каждая часть разбивается, заполняется
+    (с учётом последней строки предыдущей части) и объединяется с Битрикс,
+    найденные строки веб-системы сбрасываются на диск по бюро (`BureauSpill`).
+    Статистика и конфликты накапливаются по частям, а листы бюро собираются
+    из сброшенных строк по одному. Поэтому в памяти одновременно находятся только
+    Битрикс, одна часть выгрузки и строки одного бюро. Отчёт совпадает с отчётом `MergeDrawer`.
+    """
+
+    # Служебная колонка с номером строки веб-системы
+    WEB_ROW_COLUMN = '_строка веб'
+
+    def __init__(
+        self,
+        web_chunks: Iterable[pd.DataFrame],
+        bitrix_df: pd.DataFrame,
+        config: dict | None = None,
+        config_path: str = r'app/report_config.json',
+        spill_folder: str | None = None,
+        upload_folder: str = 'uploads',
+    ):
+        """
+        Инициализация объекта ChunkedMergeDrawer.
+
+        :param web_chunks: Части выгрузки веб-системы в порядке строк.
+        :param bitrix_df: DataFrame с данными из Битрикс.
+        :param config: Конфигурационный словарь. Если не указан — загружается из файла.
+        :param config_path: Путь к JSON-файлу с конфигурацией (по умолчанию 'app/report_config.json').
+        :param spill_folder: Папка для временных файлов (по умолчанию системная).
+        :param upload_folder: Папка, в которую сохраняется отчёт.
+        """
+        super().__init__(
+            web_df=None,
+            bitrix_df=bitrix_df,
+            config=config,
+            config_path=config_path,
+            upload_folder=upload_folder,
+        )
+        self.web_chunks = web_chunks
+        self.spill_folder = spill_folder
+
+    def _merge(self) -> 'ChunkedMergeResult':
+        """
+        Объединяет Битрикс с выгрузкой веб-системы по частям.
+
+        Строки результата сбрасываются на диск по бюро и собираются в `_iter_bureau_groups`.
+        Если объединение прервано ошибкой, временные файлы сразу удаляются.
+
+        :return: Результат объединения: `result_df` пуст (только колонки результата),
+                 остальное накоплено по частям.
+        """
+        memory = MemoryTracker()
+
+        bitrix_df = self._prepare_bitrix(self.bitrix_df, memory)
+
+        merged = ChunkedMergeResult(
+            result_df=None,
+            bitrix_df=bitrix_df,
+            web_df=pd.DataFrame(columns=self.config['web_columns']),
+            key_index=JoinKeyIndex(bitrix_df['Название'], pd.Series([], dtype=object)),
+        )
+        key_index = merged.key_index
+        left_codes = key_index.left_codes
+        bureau_codes, merged.bureaus = pd.factorize(bitrix_df['Теги'], sort=True)
+        merged.bureau_codes = bureau_codes
+        # Словарь для объединения: строки Битрикс с ключом
+        keyed_rows = np.flatnonzero(left_codes >= 0)
+        lookup = pd.DataFrame({self.KEY_COLUMN: left_codes[keyed_rows], self.ROW_COLUMN: keyed_rows})
+
+        in_web = merged.in_web = np.zeros(len(key_index.keys), dtype=bool)
+        spill = merged.spill = BureauSpill(self.spill_folder)
+        tractors, bureau_stats, only_web = [], [], []
+        last_filled = None
+        web_rows = 0
+
+        try:
+            with memory.step('Веб: объединение по частям'):
+                for chunk in self.web_chunks:
+                    web_df = self._split_web(chunk)
+                    web_df.index = pd.RangeIndex(web_rows, web_rows + len(web_df))
+                    web_rows += len(web_df)
+
+                    # Пустые значения в начале части берутся из последней строки предыдущей
+                    filled = web_df[self.WEB_FILL_COLUMNS].ffill()
+                    if last_filled is not None:
+                        filled = filled.fillna(last_filled)
+                    web_df = web_df.assign(**{column: filled[column] for column in self.WEB_FILL_COLUMNS})
+                    if len(filled):
+                        last_filled = filled.iloc[-1]
+
+                    codes = key_index.encode(web_df['Опытный узел'])
+                    in_web[codes[codes >= 0]] = True
+                    only_web.append(web_df[codes == -2])
+                    tractors.append(web_df['№ трактора'].drop_duplicates())
+
+                    matched = pd.merge(
+                        lookup,
+                        web_df.assign(**{self.KEY_COLUMN: codes, self.WEB_ROW_COLUMN: web_df.index}),
+                        on=self.KEY_COLUMN,
+                    )
+                    bureaus = bureau_codes[matched[self.ROW_COLUMN].to_numpy()]
+                    bureau_stats.append(pd.DataFrame({
+                        'Бюро': bureaus,
+                        'Опытный узел': matched[self.KEY_COLUMN].to_numpy(),
+                        '№ трактора': matched['№ трактора'].to_numpy(),
+                    }).drop_duplicates())
+
+                    matched = matched.drop(columns=self.KEY_COLUMN)
+                    for bureau, part in matched[bureaus >= 0].groupby(bureaus[bureaus >= 0], sort=False):
+                        spill.append(bureau, part)
+        except BaseException:
+            spill.cleanup()
+            raise
+
+        merged.tractors = pd.concat(tractors, ignore_index=True).drop_duplicates() if tractors else pd.Series([])
+        merged.bureau_stats = (
+            pd.concat(bureau_stats, ignore_index=True).drop_duplicates()
+            if bureau_stats else pd.DataFrame(columns=['Бюро', 'Опытный узел', '№ трактора'])
+        )
+        merged.only_web_df = (
+            pd.concat(only_web, ignore_index=True)
+            if only_web else pd.DataFrame(columns=self.config['web_columns'])
+        )
+
+        merged.result_df = self._assemble_rows(merged, np.empty(0, dtype=np.int64), None)
+
+        merged.memory_steps = memory.steps
+        if memory.enabled:
+            print('Пиковая память при объединении:', memory.report())
+
+        return merged
+
+    def _assemble_rows(
+        self,
+        merged: 'ChunkedMergeResult',
+        rows: np.ndarray,
+        web_part: pd.DataFrame | None,
+    ) -> pd.DataFrame:
+        """
+        Собирает строки результата для строк Битрикс `rows`.
+
+        Строки Битрикс без пары получают пустые колонки веб-системы. Строки идут
+        в том же порядке, что и при обычном левом объединении: по строкам Битрикс,
+        а для каждой из них — по строкам веб-системы.
+
+        :param merged: Результат объединения по частям.
+        :param rows: Номера строк Битрикс.
+        :param web_part: Сброшенные строки веб-системы с номерами строк Битрикс и веб-системы.
+        :return: Строки результата объединения.
+        """
+        web_columns = [self.ROW_COLUMN, self.WEB_ROW_COLUMN, *self.config['web_columns']]
+        if web_part is None:
+            web_part = pd.DataFrame(columns=web_columns)
+        unmatched = np.setdiff1d(rows, web_part[self.ROW_COLUMN].to_numpy())
+        if len(unmatched):
+            web_part = pd.concat([
+                web_part,
+                pd.DataFrame({self.ROW_COLUMN: unmatched, self.WEB_ROW_COLUMN: -1}),
+            ], ignore_index=True)
+
+        order = np.lexsort((
+            web_part[self.WEB_ROW_COLUMN].to_numpy(dtype=np.int64),
+            web_part[self.ROW_COLUMN].to_numpy(dtype=np.int64),
+        ))
+        web_part = web_part.take(order).reset_index(drop=True)
+        bitrix_rows = web_part.pop(self.ROW_COLUMN).to_numpy(dtype=np.int64)
+        web_part.pop(self.WEB_ROW_COLUMN)
+
+        return self._concat_merged(merged.bitrix_df.take(bitrix_rows).reset_index(drop=True), web_part)
+
+    def _iter_bureau_groups(
+        self,
+        merged: 'ChunkedMergeResult',
+        group_col_name: str,
+    ) -> Iterator[Tuple[Any, pd.DataFrame]]:
+        """
+        Собирает строки бюро из сброшенных на диск частей, по одному бюро.
+
+        :param merged: Результат объединения по частям.
+        :param group_col_name: Название столбца для группировки (например, 'Бюро').
+        :return: Пары (бюро, строки бюро).
+        """
+        for bureau, name in enumerate(merged.bureaus):
+            group = self._assemble_rows(merged, np.flatnonzero(merged.bureau_codes == bureau), merged.spill.read(bureau))
+            group = DataFrameUtils.apply_column_dtypes(group, self.config.get('column_dtypes'))
+            group = self._reformat_result(group, self.config['report_column_map'])
+            yield name, group
+
+    def _bureau_node_stats(self, merged: MergeResult, group_col_name: str) -> Dict[Any, pd.DataFrame]:
+        """
+        Строки бюро собираются с диска по одному, поэтому статистика
+        считается по строкам каждого бюро в `_prepare_bureau_sheet`.
+
+        :param merged: Результат объединения по частям.
+        :param group_col_name: Название столбца для группировки (например, 'Бюро').
+        :return: Пустой словарь.
+        """
+        return {}
+
+    def _stats_tables(self, merged: 'ChunkedMergeResult') -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Считает статистику по данным, накопленным при объединении по частям.
+
+        :param merged: Результат объединения по частям.
+        :return: Общая статистика и статистика по бюро.
+        """
+        total = pd.DataFrame({
+            'Число тракторов': [merged.tractors.nunique()],
+            'Название': [JoinKeyIndex.count_distinct(merged.key_index.left_codes)],
+        })
+
+        counts = merged.bureau_stats.groupby('Бюро').agg({
+            'Опытный узел': 'nunique',
+            '№ трактора': 'nunique',
+        }).reindex(range(len(merged.bureaus)), fill_value=0)
+        result = pd.DataFrame({
+            'Бюро': merged.bureaus,
+            'Число опытных узлов': counts['Опытный узел'].to_numpy(),
+            'Число тракторов': counts['№ трактора'].to_numpy(),
+        })
+        return total, result
+
+    def _unmatched_rows(self, merged: 'ChunkedMergeResult') -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Возвращает строки Битрикс и веб-системы, для которых не нашлось пары.
+
+        :param merged: Результат объединения по частям.
+        :return: Строки только из Битрикс и строки только из веб-системы.
+        """
+        left_codes = merged.key_index.left_codes
+        only_bitrix = merged.bitrix_df[(left_codes >= 0) & ~np.append(merged.in_web, True)[left_codes]]
+        return only_bitrix, merged.only_web_df
+
+    def _write_report(self, merged: 'ChunkedMergeResult', output_file: str) -> 'ChunkedMergeResult':
+        """
+        Записывает отчёт как `MergeDrawer._write_report` и удаляет временные файлы.
+
+        :param merged: Результат объединения по частям.
+        :param output_file: Путь к выходному Excel-файлу.
+        :return: Результат объединения.
+        """
+        try:
+            return super()._write_report(merged, output_file)
+        finally:
+            merged.spill.cleanup()
+
+
 class FormatDrawer(Drawer):
     """
     Класс для форматирования Excel-отчетов.
@@ -557,6 +1347,7 @@ class FormatDrawer(Drawer):
         format_df: pd.DataFrame,
         config: dict | None = None,
         config_path: str = r'app/report_config.json',
+        upload_folder: str = 'uploads',
     ):
         """
         Инициализация экземпляра класса.
@@ -568,14 +1359,14 @@ class FormatDrawer(Drawer):
         :type config: dict | None
         :param config_path: Путь к файлу конфигурации (по умолчанию 'app/report_config.json').
         :type config_path: str
+        :param upload_folder: Папка, в которую сохраняется отчёт.
+        :type upload_folder: str
         """
         self.format_df = format_df
-
-        if config is not None:
-            self.config = config
-        else:
-            with open(config_path, 'r', encoding='utf-8') as file:
-                self.config = json.load(file)
+        self.upload_folder = upload_folder
+        self.config = config if config is not None else Utils.load_config(config_path)
+        # Запись отчёта в режиме constant_memory: ключ `xlsx_constant_memory` конфига или XLSX_CONSTANT_MEMORY
+        self.constant_memory = self.config.get('xlsx_constant_memory', XLSX_CONSTANT_MEMORY)
 
     def _format_excel_report(self, output_file: str, sheet_name: str):
         """
@@ -588,17 +1379,10 @@ class FormatDrawer(Drawer):
         :param sheet_name: Название листа Excel.
         :type sheet_name: str
         """
-        with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
-
-            result_df = self.result_df.ffill()
-
-            result_df.to_excel(
-                excel_writer=writer,
-                sheet_name=sheet_name,
-                index=False,
-            )
+        with ExcelUtils.report_writer(output_file, self.constant_memory) as writer:
+            rows = RowWriter(writer)
 
-            worksheet = writer.sheets[sheet_name]
+            worksheet = rows.sheet(sheet_name)
             worksheet.set_column('A:A', 16)
             worksheet.set_column('B:B', 20)
             worksheet.set_column('C:C', 16)
@@ -611,20 +1395,15 @@ class FormatDrawer(Drawer):
             worksheet.set_column('J:J', 24)
 
             # Задаем форматирование для всех строк
-            cell_format = writer.book.add_format({
+            cell_format = rows.book.add_format({
                 'text_wrap': True,
                 'valign': 'vcenter',
                 'border': 1,
                 'align': 'center',
             })
 
-            # Применяем форматирование ко всем строкам
-            for i in range(1, self.format_df.shape[0]):
-                worksheet.set_row(
-                    i,
-                    None,
-                    cell_format,
-                )
+            # Записываем таблицу, применяя форматирование ко всем строкам
+            rows.write_frame(sheet_name, self.result_df.ffill(), row_format=cell_format)
 
     def draw_report(self):
         """
@@ -645,9 +1424,8 @@ class FormatDrawer(Drawer):
         )
 
         # Сохраняем отчет
-        upload_folder = os.environ.get('UPLOAD_FOLDER')
         output_file, link_file = Utils.create_save_file(
-            upl_folder=upload_folder,
+            upl_folder=self.upload_folder,
         )
 
         # Форматируем Excel
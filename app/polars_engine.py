@@ -0,0 +1,204 @@
+import os
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .utils import DataFrameUtils
+
+try:
+    import polars as pl
+except ImportError:  # pragma: no cover - polars необязателен
+    pl = None
+
+# Движок вычислений MergeDrawer: `pandas` (по умолчанию) или `polars`
+DRAWER_ENGINE = os.environ.get('DRAWER_ENGINE', 'pandas')
+DRAWER_ENGINES = ('pandas', 'polars')
+
+
+class PolarsEngine:
+    """
+    Вычисления `MergeDrawer` в ленивых планах Polars.
+
+    Polars выполняет разбивку, объединение и группировки в несколько потоков.
+    В план передаются только строковые колонки, которые разбиваются, целые коды
+    ключей и номера строк. Значения остальных колонок (в выгрузках встречаются
+    колонки со значениями разных типов, которые Polars не хранит) собираются
+    в pandas по номерам строк из плана, поэтому на выходе DataFrame pandas
+    с теми же значениями, что и у pandas-движка.
+    """
+
+    # Служебная колонка с номером исходной строки
+    ROW_COLUMN = '_строка'
+
+    @staticmethod
+    def require() -> None:
+        """
+        Проверяет, что polars установлен.
+
+        :raises ImportError: Если polars не установлен.
+        """
+        if pl is None:
+            raise ImportError('Не установлен polars')
+
+    @staticmethod
+    def _strings(series: pd.Series) -> 'pl.Series':
+        """
+        Возвращает строковые значения колонки, остальные значения (как у `.str` в pandas) — пропуски.
+        """
+        values = series.to_numpy(dtype=object)
+        is_string = np.fromiter((isinstance(value, str) for value in values), dtype=bool, count=len(values))
+        return pl.Series(np.where(is_string, values, None).tolist(), dtype=pl.String)
+
+    @staticmethod
+    def _codes(codes: np.ndarray) -> 'pl.Series':
+        """
+        Возвращает коды `pd.factorize` как колонку Polars, код -1 становится пропуском.
+        """
+        return pl.Series(codes, dtype=pl.Int64).replace(-1, None)
+
+    @staticmethod
+    def explode_split(
+        df: pd.DataFrame,
+        delimiters: Dict[str, str],
+        drop_blank: Iterable[str] = (),
+    ) -> pd.DataFrame:
+        """
+        Аналог `DataFrameUtils.explode_split`: разбивка и разворачивание колонок в плане Polars.
+
+        Колонки из `delimiters` разбиваются по регулярному выражению (как `Series.str.split`
+        с разделителем длиннее одного символа) и разворачиваются по очереди, поэтому
+        последняя колонка меняется быстрее. Остальные колонки берутся `take` по номерам строк.
+
+        :param df: Исходный DataFrame.
+        :param delimiters: Словарь {колонка: разделитель}.
+        :param drop_blank: Колонки, в которых пустые части отбрасываются.
+        :return: Новый DataFrame; индекс исходных строк повторяется, как после `explode`.
+        """
+        drop_blank = set(drop_blank)
+        plan = pl.LazyFrame({
+            PolarsEngine.ROW_COLUMN: np.arange(len(df), dtype=np.int64),
+            **{column: PolarsEngine._strings(df[column]) for column in delimiters},
+        })
+        for column, delimiter in delimiters.items():
+            plan = plan.with_columns(pl.col(column).str.split(delimiter, literal=False)).explode(column)
+            if column in drop_blank:
+                plan = plan.with_columns(pl.col(column).str.strip_chars()).filter(
+                    pl.col(column).is_not_null() & (pl.col(column) != '')
+                )
+        exploded = plan.collect()
+
+        rows = exploded[PolarsEngine.ROW_COLUMN].to_numpy()
+        result = df.take(rows)
+        for column in delimiters:
+            values = exploded[column].to_numpy().astype(object)
+            # Как у `.str.split`: None остаётся None, остальные нестроковые значения становятся NaN
+            missing = pd.isna(values)
+            original = df[column].to_numpy(dtype=object)[rows[missing]]
+            values[missing] = [None if value is None else np.nan for value in original]
+            result[column] = DataFrameUtils.restore_string_dtype(values, df[column].dtype)
+        return result
+
+    @staticmethod
+    def left_join_rows(left_codes: np.ndarray, right_codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Левое объединение по целым кодам ключей (например, из `JoinKeyIndex.join_codes`).
+
+        Порядок строк как у `pd.merge(how='left')`: по строкам левой стороны,
+        для каждой из них — по строкам правой.
+
+        :param left_codes: Коды ключей левой стороны.
+        :param right_codes: Коды ключей правой стороны.
+        :return: Номера строк левой и правой стороны для строк результата (-1 — нет пары).
+        """
+        left = pl.LazyFrame({'key': left_codes, 'left_row': np.arange(len(left_codes), dtype=np.int64)})
+        right = pl.LazyFrame({'key': right_codes, 'right_row': np.arange(len(right_codes), dtype=np.int64)})
+        joined = (
+            left.join(right, on='key', how='left', maintain_order='left_right')
+            .select('left_row', pl.col('right_row').fill_null(-1))
+            .collect()
+        )
+        return joined['left_row'].to_numpy(), joined['right_row'].to_numpy()
+
+    @staticmethod
+    def node_stats(group: pd.DataFrame, keys: Tuple[str, ...] = ('Опытный узел',)) -> pd.DataFrame:
+        """
+        Статистика шапки листа бюро по опытным узлам.
+
+        Для каждого узла: число различных тракторов, средняя по тракторам максимальная
+        наработка и первая известная продолжительность контроля в часах (колонка
+        '_часы контроля', см. `MergeDrawer.CONTROL_HOURS_COLUMN`). Узлы без тракторов
+        в результат не попадают, как при объединении таблиц статистики в pandas.
+
+        :param group: Строки с заполненными опытными узлами.
+        :param keys: Колонки группировки, последняя — 'Опытный узел'
+                     (например, ('Бюро', 'Опытный узел') для всех бюро сразу).
+                     Строки с пропуском в колонках группировки не учитываются.
+        :return: DataFrame с колонками `keys`, 'Количество тракторов',
+                 'Средняя наработка, м/ч', 'Продолжительность контроля, м/ч' в порядке `keys`.
+        """
+        key_columns, key_names = {}, []
+        for position, key in enumerate(keys):
+            codes, names = pd.factorize(group[key], sort=True)
+            key_columns[f'key{position}'] = codes.astype(np.int64)
+            key_names.append(names)
+        by = list(key_columns)
+        tractors, _ = pd.factorize(group['№ трактора'])
+        plan = pl.LazyFrame({
+            **key_columns,
+            'tractor': PolarsEngine._codes(tractors),
+            'control': pl.Series(group['_часы контроля'].to_numpy(dtype=float), nan_to_null=True),
+            'hours': pl.Series(pd.to_numeric(group['Наработка, м/ч']).to_numpy(dtype=float), nan_to_null=True),
+        }).filter(pl.all_horizontal(pl.col(by) >= 0))
+
+        counts = plan.group_by(by).agg(
+            pl.col('tractor').drop_nulls().n_unique().alias('tractors'),
+            pl.col('control').drop_nulls().first().alias('control'),
+        )
+        hours = (
+            plan.filter(pl.col('tractor').is_not_null())
+            .group_by(*by, 'tractor').agg(pl.col('hours').max())
+            .group_by(by).agg(pl.col('hours').mean())
+        )
+        stats = counts.join(hours, on=by, how='inner').sort(by).collect()
+
+        return pd.DataFrame({
+            **{
+                key: names.take(stats[column].to_numpy())
+                for key, names, column in zip(keys, key_names, by)
+            },
+            'Количество тракторов': stats['tractors'].to_numpy().astype(np.int64),
+            'Средняя наработка, м/ч': stats['hours'].to_numpy().astype(float).round(1),
+            'Продолжительность контроля, м/ч': stats['control'].to_numpy().astype(float),
+        })
+
+    @staticmethod
+    def bureau_counts(bureaus: pd.Series, nodes: pd.Series, tractors: pd.Series) -> pd.DataFrame:
+        """
+        Число различных опытных узлов и тракторов по бюро для листа статистики.
+
+        :param bureaus: Бюро строк результата.
+        :param nodes: Опытные узлы (или их коды) строк результата, пропуск — нет узла.
+        :param tractors: Номера тракторов строк результата.
+        :return: DataFrame с колонками 'Бюро', 'Опытный узел', '№ трактора' в порядке бюро.
+        """
+        bureau_codes, bureau_names = pd.factorize(bureaus, sort=True)
+        counts = (
+            pl.LazyFrame({
+                'bureau': PolarsEngine._codes(bureau_codes),
+                'node': PolarsEngine._codes(pd.factorize(nodes)[0]),
+                'tractor': PolarsEngine._codes(pd.factorize(tractors)[0]),
+            })
+            .filter(pl.col('bureau').is_not_null())
+            .group_by('bureau').agg(
+                pl.col('node').drop_nulls().n_unique(),
+                pl.col('tractor').drop_nulls().n_unique(),
+            )
+            .sort('bureau')
+            .collect()
+        )
+        return pd.DataFrame({
+            'Бюро': bureau_names.take(counts['bureau'].to_numpy()),
+            'Опытный узел': counts['node'].to_numpy().astype(np.int64),
+            '№ трактора': counts['tractor'].to_numpy().astype(np.int64),
+        })
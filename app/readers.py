@@ -0,0 +1,1087 @@
+import codecs
+import csv
+import datetime
+import io
+import json
+import posixpath
+import re
+import zipfile
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Iterator, List, Set, Tuple
+from xml.etree.ElementTree import iterparse, fromstring
+import numpy as np
+import pandas as pd
+from openpyxl.styles.numbers import (
+    BUILTIN_FORMATS_MAX_SIZE,
+    builtin_format_code,
+    is_date_format,
+    is_timedelta_format,
+)
+from openpyxl.utils.cell import column_index_from_string, range_boundaries
+from openpyxl.utils.datetime import (
+    CALENDAR_MAC_1904,
+    WINDOWS_EPOCH,
+    from_excel,
+    from_ISO8601,
+)
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # pragma: no cover - python-calamine необязателен
+    CalamineWorkbook = None
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow необязателен
+    pq = None
+
+# Пространства имён OOXML
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+ROW_TAG = f'{{{MAIN_NS}}}row'
+CELL_TAG = f'{{{MAIN_NS}}}c'
+VALUE_TAG = f'{{{MAIN_NS}}}v'
+INLINE_STRING_TAG = f'{{{MAIN_NS}}}is'
+TEXT_TAG = f'{{{MAIN_NS}}}t'
+RICH_RUN_TAG = f'{{{MAIN_NS}}}r'
+SHARED_STRING_TAG = f'{{{MAIN_NS}}}si'
+SHEET_DATA_TAG = f'{{{MAIN_NS}}}sheetData'
+MERGE_CELL_TAG = f'{{{MAIN_NS}}}mergeCell'
+DIMENSION_TAG = f'{{{MAIN_NS}}}dimension'
+
+OFFICE_DOCUMENT_REL = f'{REL_NS}/officeDocument'
+STYLES_REL = f'{REL_NS}/styles'
+SHARED_STRINGS_REL = f'{REL_NS}/sharedStrings'
+
+# Элемент `<mergeCell>` с любым префиксом пространства имён (но не контейнер `<mergeCells>`)
+# или ячейка с ошибкой (`t="e"`), которую calamine возвращает пустой
+CELL_BY_CELL_PATTERN = re.compile(rb'<(?:[\w.-]+:)?mergeCell[\s/>]|\st=["\']e["\']')
+# Пустая строка `<si>` (общая строка) или `<is>` (строка в ячейке): openpyxl читает её как '',
+# а calamine не отличает такую ячейку от пустой
+EMPTY_STRING_PATTERN = re.compile(
+    rb'<(?:[\w.-]+:)?(si|is)(?:\s*/>|>\s*(?:<(?:[\w.-]+:)?t(?:\s[^>]*)?(?:/>|></(?:[\w.-]+:)?t>)\s*)?'
+    rb'</(?:[\w.-]+:)?\1>)'
+)
+# Целые числа с плавающей точкой больше этого значения Excel записывает с экспонентой
+MAX_EXACT_INT = 10 ** 15
+
+# Кодировки CSV в порядке проверки: выгрузки бывают в UTF-8 (с BOM или без) и в Windows-1251
+CSV_ENCODINGS = ('utf-8-sig', 'cp1251')
+CSV_DELIMITERS = ';,\t|'
+CSV_SAMPLE_SIZE = 64 * 1024
+
+
+def _text_content(node) -> str:
+    """
+    Собирает текст строки xlsx (`<si>` или `<is>`) без форматирования.
+
+    Повторяет `openpyxl.cell.text.Text.content`: берётся простой текст `<t>`
+    и текст всех фрагментов `<r>`, фонетические подсказки `<rPh>` пропускаются.
+    """
+    parts = []
+    for child in node:
+        if child.tag == TEXT_TAG:
+            parts.append(child.text or '')
+        elif child.tag == RICH_RUN_TAG:
+            text = child.find(TEXT_TAG)
+            if text is not None:
+                parts.append(text.text or '')
+    return ''.join(parts)
+
+
+def normalize_column_name(name: Any) -> str:
+    """
+    Приводит название колонки к виду для сравнения: без пробелов по краям и в нижнем регистре.
+    """
+    return str(name).strip().lower()
+
+
+def _cast_number(value: str):
+    """
+    Преобразует строковое число из xlsx в int или float так же, как openpyxl.
+    """
+    if '.' in value or 'E' in value or 'e' in value:
+        return float(value)
+    return int(value)
+
+
+class XlsxStreamReader:
+    """
+    Потоковый читатель первого листа xlsx-файла.
+
+    В отличие от `openpyxl.load_workbook`, не создаёт объект `Cell` со стилями
+    на каждую ячейку: XML листа и таблица общих строк разбираются через `iterparse`,
+    значения сразу складываются в массивы колонок, а обработанные строки XML удаляются.
+    Пиковая память пропорциональна итоговому DataFrame.
+
+    Значения совпадают с `load_workbook(..., data_only=True)`: числа приводятся к int/float,
+    ячейки с форматом даты превращаются в datetime. Объединённые диапазоны из `<mergeCells>`
+    возвращаются отдельно, их заполнение выполняет `ExcelUtils.fill_merged_ranges`.
+
+    :param source: Путь к xlsx-файлу или бинарный файловый объект.
+    :type source: str | BinaryIO
+    """
+
+    def __init__(self, source: str | BinaryIO):
+        """
+        Инициализирует читатель.
+
+        :param source: Путь к xlsx-файлу или бинарный файловый объект.
+        """
+        self.source = source
+
+    def read_columns(
+        self,
+        columns: List[str] | None = None,
+    ) -> Tuple[List[np.ndarray | None], List[Tuple[int, int, int, int]]]:
+        """
+        Читает первый лист в массивы колонок без заполнения объединённых ячеек.
+
+        Все колонки выровнены по длине до последней строки листа (с учётом объединённых
+        диапазонов), элемент с индексом 0 — значение из строки заголовка.
+
+        Если передан `columns`, читаются только колонки, чьи заголовки совпадают с ними
+        (без учёта регистра и пробелов по краям): значения остальных колонок не декодируются,
+        а на их месте в результате стоит None.
+
+        :param columns: Названия колонок, которые нужно прочитать. None — читать все.
+        :type columns: List[str] | None
+        :return: Список колонок (`np.ndarray` с dtype=object или None) и список объединённых
+                 диапазонов в виде (min_col, min_row, max_col, max_row), нумерация с 1.
+        :rtype: Tuple[List[np.ndarray | None], List[Tuple[int, int, int, int]]]
+        :raises zipfile.BadZipFile: Если файл не является xlsx-архивом.
+        :raises KeyError: Если в архиве нет обязательных частей книги.
+        """
+        required = set(normalize_column_name(col) for col in columns) if columns else None
+
+        with zipfile.ZipFile(self.source) as archive:
+            workbook_path = self._find_workbook_path(archive)
+            sheet_path, epoch, parts = self._find_first_sheet(archive, workbook_path)
+            shared_strings = self._read_shared_strings(archive, parts.get(SHARED_STRINGS_REL))
+            date_styles, timedelta_styles = self._read_date_styles(archive, parts.get(STYLES_REL))
+
+            include = set()
+            while True:
+                with archive.open(sheet_path) as sheet_xml:
+                    column_values, merged_ranges, max_row = self._read_sheet(
+                        sheet_xml=sheet_xml,
+                        shared_strings=shared_strings,
+                        date_styles=date_styles,
+                        timedelta_styles=timedelta_styles,
+                        epoch=epoch,
+                        required=required,
+                        include=include,
+                    )
+                # Объединённая ячейка заголовка даёт своё название и покрытым колонкам,
+                # такие колонки нужно дочитать повторным проходом
+                missed = self._missed_header_columns(column_values, merged_ranges) if required else set()
+                if not missed:
+                    break
+                include |= missed
+
+            foreign_values = {}
+            if required is not None:
+                merged_ranges, foreign_sources = self._anchor_ranges_on_projection(
+                    column_values,
+                    merged_ranges,
+                )
+                if foreign_sources:
+                    with archive.open(sheet_path) as sheet_xml:
+                        source_values = self._read_cells(
+                            sheet_xml=sheet_xml,
+                            wanted=set(foreign_sources),
+                            shared_strings=shared_strings,
+                            date_styles=date_styles,
+                            timedelta_styles=timedelta_styles,
+                            epoch=epoch,
+                        )
+                    foreign_values = {
+                        anchor: source_values.get(source)
+                        for source, anchor in foreign_sources.items()
+                    }
+
+        arrays = []
+        for column in column_values:
+            if column is None:
+                arrays.append(None)
+                continue
+            array = np.empty(max_row, dtype=object)
+            array[:len(column)] = column
+            arrays.append(array)
+
+        for (row_index, col_index), value in foreign_values.items():
+            arrays[col_index - 1][row_index - 1] = value
+        return arrays, merged_ranges
+
+    @staticmethod
+    def build_frame(columns: List[np.ndarray]) -> pd.DataFrame:
+        """
+        Собирает DataFrame из массивов колонок: первая строка листа — заголовок.
+
+        Типы колонок выводятся так же, как при построении DataFrame из списка строк.
+
+        :param columns: Колонки листа одинаковой длины, пропущенные колонки — None.
+        :type columns: List[np.ndarray | None]
+        :return: DataFrame с данными листа.
+        :rtype: pd.DataFrame
+        """
+        columns = [column for column in columns if column is not None]
+        if not columns or len(columns[0]) == 0:
+            return pd.DataFrame()
+
+        header = [column[0] for column in columns]
+        if len(columns[0]) == 1:
+            return pd.DataFrame([], columns=header)
+
+        df = pd.DataFrame({index: column[1:].tolist() for index, column in enumerate(columns)})
+        df.columns = header
+        return df
+
+    def read_header(self) -> Tuple[List[Any], Tuple[int, int] | None]:
+        """
+        Читает только строку заголовка и размеры листа из тега `<dimension>`.
+
+        Разбор XML листа останавливается на первой строке, а из таблицы общих строк
+        читается ровно столько записей, сколько нужно для ячеек заголовка.
+
+        :return: Значения ячеек первой строки листа и размер листа (строк, колонок),
+                 если он указан в файле.
+        :rtype: Tuple[List[Any], Tuple[int, int] | None]
+        :raises zipfile.BadZipFile: Если файл не является xlsx-архивом.
+        :raises KeyError: Если в архиве нет обязательных частей книги.
+        """
+        with zipfile.ZipFile(self.source) as archive:
+            workbook_path = self._find_workbook_path(archive)
+            sheet_path, epoch, parts = self._find_first_sheet(archive, workbook_path)
+
+            with archive.open(sheet_path) as sheet_xml:
+                header_row, dimension = self._read_first_row(sheet_xml)
+
+            header_cells = [cell for cell in header_row if cell.tag == CELL_TAG] if header_row is not None else []
+            shared_indexes = [
+                int(cell.findtext(VALUE_TAG))
+                for cell in header_cells
+                if cell.get('t') == 's' and cell.findtext(VALUE_TAG)
+            ]
+            shared_strings = self._read_shared_strings(
+                archive,
+                parts.get(SHARED_STRINGS_REL),
+                limit=max(shared_indexes) + 1 if shared_indexes else 0,
+            )
+
+        header = []
+        col_counter = 0
+        for cell in header_cells:
+            coordinate = cell.get('r')
+            if coordinate:
+                col_counter = column_index_from_string(coordinate.rstrip('0123456789'))
+            else:
+                col_counter += 1
+            header.extend([None] * (col_counter - len(header)))
+            header[col_counter - 1] = self._cell_value(
+                cell=cell,
+                shared_strings=shared_strings,
+                date_styles=set(),
+                timedelta_styles=set(),
+                epoch=epoch,
+            )
+        return header, dimension
+
+    def requires_stream_reader(self, chunk_size: int = 1024 * 1024) -> bool:
+        """
+        Проверяет, может ли первый лист прочитать только этот читатель.
+
+        Это листы с объединёнными ячейками, ячейками с ошибками или явными пустыми
+        строками: calamine не знает об объединённых диапазонах, теряет значения ошибок
+        и возвращает '' и для пустых ячеек, и для пустых строк. XML не разбирается:
+        распакованные байты листа и таблицы общих строк просматриваются блоками,
+        поэтому проверка в разы быстрее чтения листа.
+
+        :param chunk_size: Размер блока распакованных данных.
+        :return: True, если лист нужно читать `XlsxStreamReader`.
+        :raises zipfile.BadZipFile: Если файл не является xlsx-архивом.
+        :raises KeyError: Если в архиве нет обязательных частей книги.
+        """
+        with zipfile.ZipFile(self.source) as archive:
+            workbook_path = self._find_workbook_path(archive)
+            sheet_path, _, parts = self._find_first_sheet(archive, workbook_path)
+            if self._search_part(archive, sheet_path, (CELL_BY_CELL_PATTERN, EMPTY_STRING_PATTERN), chunk_size):
+                return True
+            shared_strings_path = parts.get(SHARED_STRINGS_REL)
+            return (
+                shared_strings_path in archive.namelist()
+                and self._search_part(archive, shared_strings_path, (EMPTY_STRING_PATTERN,), chunk_size)
+            )
+
+    @staticmethod
+    def _search_part(
+        archive: zipfile.ZipFile,
+        path: str,
+        patterns: Tuple[re.Pattern, ...],
+        chunk_size: int,
+    ) -> bool:
+        """
+        Ищет шаблоны в распакованных байтах части архива, читая её блоками.
+
+        :return: True, если найден хотя бы один шаблон.
+        """
+        with archive.open(path) as xml_source:
+            tail = b''
+            for chunk in iter(lambda: xml_source.read(chunk_size), b''):
+                data = tail + chunk
+                if any(pattern.search(data) for pattern in patterns):
+                    return True
+                # Хвост блока нужен, если тег разрезан границей блоков
+                tail = chunk[-256:]
+        return False
+
+    @staticmethod
+    def _read_first_row(sheet_xml: BinaryIO):
+        """
+        Разбирает начало XML листа до конца первой строки.
+
+        :return: Элемент `<row>` первой строки листа (или None, если строка 1 пуста)
+                 и размер листа (строк, колонок) из `<dimension>`.
+        """
+        dimension = None
+        for _, element in iterparse(sheet_xml):
+            if element.tag == DIMENSION_TAG:
+                _, _, max_col, max_row = range_boundaries(element.get('ref'))
+                dimension = (max_row, max_col)
+            elif element.tag == ROW_TAG:
+                row_ref = element.get('r')
+                if row_ref and int(float(row_ref)) != 1:
+                    return None, dimension
+                return element, dimension
+        return None, dimension
+
+    @staticmethod
+    def _find_workbook_path(archive: zipfile.ZipFile) -> str:
+        """
+        Находит путь к `workbook.xml` по связям пакета `_rels/.rels`.
+        """
+        try:
+            root = fromstring(archive.read('_rels/.rels'))
+        except KeyError:
+            return 'xl/workbook.xml'
+
+        for rel in root.iter(f'{{{PKG_REL_NS}}}Relationship'):
+            if rel.get('Type') == OFFICE_DOCUMENT_REL:
+                return rel.get('Target').lstrip('/')
+        return 'xl/workbook.xml'
+
+    @staticmethod
+    def _find_first_sheet(
+        archive: zipfile.ZipFile,
+        workbook_path: str,
+    ) -> Tuple[str, Any, Dict[str, str]]:
+        """
+        Определяет путь к первому листу книги, эпоху дат и пути служебных частей.
+
+        :return: Путь к XML первого листа, эпоха дат книги и словарь
+                 {тип связи: путь к части} для стилей и общих строк.
+        """
+        workbook = fromstring(archive.read(workbook_path))
+
+        properties = workbook.find(f'{{{MAIN_NS}}}workbookPr')
+        epoch = WINDOWS_EPOCH
+        if properties is not None and properties.get('date1904') in ('1', 'true'):
+            epoch = CALENDAR_MAC_1904
+
+        sheet = workbook.find(f'{{{MAIN_NS}}}sheets/{{{MAIN_NS}}}sheet')
+        if sheet is None:
+            raise KeyError('В книге нет листов')
+        sheet_rel_id = sheet.get(f'{{{REL_NS}}}id')
+
+        base_dir = posixpath.dirname(workbook_path)
+        rels_path = posixpath.join(base_dir, '_rels', posixpath.basename(workbook_path) + '.rels')
+        rels = fromstring(archive.read(rels_path))
+
+        sheet_path = None
+        parts = {}
+        for rel in rels.iter(f'{{{PKG_REL_NS}}}Relationship'):
+            target = rel.get('Target')
+            if target.startswith('/'):
+                target = target.lstrip('/')
+            else:
+                target = posixpath.normpath(posixpath.join(base_dir, target))
+
+            if rel.get('Id') == sheet_rel_id:
+                sheet_path = target
+            elif rel.get('Type') in (STYLES_REL, SHARED_STRINGS_REL):
+                parts[rel.get('Type')] = target
+
+        if sheet_path is None:
+            raise KeyError('Не найден XML первого листа')
+        return sheet_path, epoch, parts
+
+    @staticmethod
+    def _read_shared_strings(
+        archive: zipfile.ZipFile,
+        path: str | None,
+        limit: int | None = None,
+    ) -> List[str]:
+        """
+        Потоково читает таблицу общих строк.
+
+        :param limit: Если указан, чтение останавливается после `limit` строк.
+        """
+        if path is None or path not in archive.namelist() or limit == 0:
+            return []
+
+        strings = []
+        root = None
+        with archive.open(path) as xml_source:
+            for event, node in iterparse(xml_source, events=('start', 'end')):
+                if root is None:
+                    root = node
+                if event == 'end' and node.tag == SHARED_STRING_TAG:
+                    strings.append(_text_content(node).replace('x005F_', ''))
+                    root.clear()
+                    if limit is not None and len(strings) >= limit:
+                        break
+        return strings
+
+    @staticmethod
+    def _read_date_styles(archive: zipfile.ZipFile, path: str | None) -> Tuple[Set[int], Set[int]]:
+        """
+        Находит индексы стилей ячеек, которые задают формат даты или длительности.
+
+        :return: Множество индексов стилей дат и множество индексов стилей длительностей.
+        """
+        date_styles = set()
+        timedelta_styles = set()
+        if path is None or path not in archive.namelist():
+            return date_styles, timedelta_styles
+
+        root = fromstring(archive.read(path))
+        custom_formats = {
+            int(fmt.get('numFmtId')): fmt.get('formatCode')
+            for fmt in root.iter(f'{{{MAIN_NS}}}numFmt')
+        }
+
+        cell_xfs = root.find(f'{{{MAIN_NS}}}cellXfs')
+        if cell_xfs is None:
+            return date_styles, timedelta_styles
+
+        for index, xf in enumerate(cell_xfs.findall(f'{{{MAIN_NS}}}xf')):
+            fmt_id = int(xf.get('numFmtId', 0))
+            if fmt_id in custom_formats:
+                fmt = custom_formats[fmt_id]
+            elif fmt_id < BUILTIN_FORMATS_MAX_SIZE:
+                fmt = builtin_format_code(fmt_id)
+            else:
+                fmt = None
+
+            if is_date_format(fmt):
+                date_styles.add(index)
+            if is_timedelta_format(fmt):
+                timedelta_styles.add(index)
+        return date_styles, timedelta_styles
+
+    @staticmethod
+    def _iter_sheet(sheet_xml: BinaryIO):
+        """
+        Потоково обходит XML листа.
+
+        Для каждой строки выдаёт `(ROW_TAG, номер строки, [(номер колонки, элемент <c>), ...])`,
+        для каждого объединённого диапазона — `(MERGE_CELL_TAG, (min_col, min_row, max_col, max_row), None)`.
+        Нумерация с 1, номера восстанавливаются так же, как в openpyxl, если атрибут `r` не задан.
+        Элементы строки удаляются из дерева после того, как потребитель их обработал.
+        """
+        row_counter = 0
+        sheet_data = None
+
+        for event, element in iterparse(sheet_xml, events=('start', 'end')):
+            tag = element.tag
+            if event == 'start':
+                if tag == SHEET_DATA_TAG:
+                    sheet_data = element
+                continue
+
+            if tag == ROW_TAG:
+                row_ref = element.get('r')
+                row_counter = int(float(row_ref)) if row_ref else row_counter + 1
+                col_counter = 0
+                cells = []
+                for cell in element:
+                    if cell.tag != CELL_TAG:
+                        continue
+                    coordinate = cell.get('r')
+                    if coordinate:
+                        col_counter = column_index_from_string(coordinate.rstrip('0123456789'))
+                    else:
+                        col_counter += 1
+                    cells.append((col_counter, cell))
+
+                yield ROW_TAG, row_counter, cells
+
+                if sheet_data is not None:
+                    sheet_data.clear()
+                else:
+                    element.clear()
+
+            elif tag == MERGE_CELL_TAG:
+                yield MERGE_CELL_TAG, range_boundaries(element.get('ref')), None
+
+    @staticmethod
+    def _read_sheet(
+        sheet_xml: BinaryIO,
+        shared_strings: List[str],
+        date_styles: Set[int],
+        timedelta_styles: Set[int],
+        epoch,
+        required: Set[str] | None = None,
+        include: Set[int] | None = None,
+    ) -> Tuple[List[list | None], List[Tuple[int, int, int, int]], int]:
+        """
+        Потоково разбирает XML листа в массивы колонок.
+
+        Каждая колонка — список значений, индекс в списке соответствует номеру строки листа
+        минус один. Если задан `required`, после первой строки (заголовка) значения колонок
+        с другими названиями не декодируются, а на их месте в результате стоит None.
+
+        :param required: Нормализованные названия колонок, которые нужно прочитать.
+        :param include: Номера колонок (с 1), которые читаются независимо от заголовка.
+        :return: Список колонок, список объединённых диапазонов
+                 (min_col, min_row, max_col, max_row) и номер последней строки листа.
+        """
+        columns: List[list | None] = []
+        merged_ranges = []
+        max_row = 0
+        projection = None
+
+        for kind, position, cells in XlsxStreamReader._iter_sheet(sheet_xml):
+            if kind == MERGE_CELL_TAG:
+                min_col, min_row, max_col, range_max_row = position
+                merged_ranges.append(position)
+                max_row = max(max_row, range_max_row)
+                while len(columns) < max_col:
+                    columns.append([] if projection is None else None)
+                continue
+
+            row_index = position
+            for col_index, cell in cells:
+                # Ячейки пропущенных колонок всё равно учитываются в размере листа
+                max_row = max(max_row, row_index)
+                while len(columns) < col_index:
+                    columns.append([] if projection is None else None)
+                column = columns[col_index - 1]
+                if column is None:
+                    continue
+
+                value = XlsxStreamReader._cell_value(
+                    cell=cell,
+                    shared_strings=shared_strings,
+                    date_styles=date_styles,
+                    timedelta_styles=timedelta_styles,
+                    epoch=epoch,
+                )
+                if len(column) >= row_index:
+                    column[row_index - 1] = value
+                else:
+                    column.extend([None] * (row_index - 1 - len(column)))
+                    column.append(value)
+
+            # После первой строки известен заголовок: оставляем только нужные колонки
+            if required is not None and projection is None:
+                include = include or set()
+                projection = [
+                    (bool(column) and normalize_column_name(column[0]) in required)
+                    or col_index in include
+                    for col_index, column in enumerate(columns, start=1)
+                ]
+                columns = [
+                    column if keep else None
+                    for column, keep in zip(columns, projection)
+                ]
+
+        return columns, merged_ranges, max_row
+
+    @staticmethod
+    def _read_cells(
+        sheet_xml: BinaryIO,
+        wanted: Set[Tuple[int, int]],
+        shared_strings: List[str],
+        date_styles: Set[int],
+        timedelta_styles: Set[int],
+        epoch,
+    ) -> Dict[Tuple[int, int], Any]:
+        """
+        Декодирует только указанные ячейки листа, останавливаясь после последней нужной строки.
+
+        :param wanted: Множество координат (строка, колонка), нумерация с 1.
+        :return: Словарь {(строка, колонка): значение}.
+        """
+        values = {}
+        wanted_rows = {row for row, _ in wanted}
+        last_row = max(wanted_rows)
+
+        for kind, row_index, cells in XlsxStreamReader._iter_sheet(sheet_xml):
+            if kind != ROW_TAG:
+                continue
+            if row_index in wanted_rows:
+                for col_index, cell in cells:
+                    if (row_index, col_index) in wanted:
+                        values[(row_index, col_index)] = XlsxStreamReader._cell_value(
+                            cell=cell,
+                            shared_strings=shared_strings,
+                            date_styles=date_styles,
+                            timedelta_styles=timedelta_styles,
+                            epoch=epoch,
+                        )
+            if row_index >= last_row:
+                break
+        return values
+
+    @staticmethod
+    def _missed_header_columns(
+        columns: List[list | None],
+        merged_ranges: List[Tuple[int, int, int, int]],
+    ) -> Set[int]:
+        """
+        Находит пропущенные колонки, которые покрыты объединённой ячейкой прочитанного заголовка.
+
+        :return: Номера таких колонок (с 1).
+        """
+        missed = set()
+        for min_col, min_row, max_col, _ in merged_ranges:
+            if min_row != 1 or columns[min_col - 1] is None:
+                continue
+            missed.update(
+                col_index
+                for col_index in range(min_col + 1, max_col + 1)
+                if columns[col_index - 1] is None
+            )
+        return missed
+
+    @staticmethod
+    def _anchor_ranges_on_projection(
+        columns: List[list | None],
+        merged_ranges: List[Tuple[int, int, int, int]],
+    ) -> Tuple[List[Tuple[int, int, int, int]], Dict[Tuple[int, int], Tuple[int, int]]]:
+        """
+        Приводит объединённые диапазоны к прочитанным колонкам.
+
+        Диапазоны, не задевающие прочитанные колонки, отбрасываются. Если верхняя левая ячейка
+        диапазона лежит в пропущенной колонке, диапазон начинается с первой прочитанной колонки,
+        а исходную ячейку нужно дочитать отдельно.
+
+        :return: Новые диапазоны и словарь {исходная ячейка (строка, колонка): новая верхняя левая ячейка}.
+        """
+        anchored = []
+        foreign_sources = {}
+        for min_col, min_row, max_col, max_row in merged_ranges:
+            targets = [
+                col_index
+                for col_index in range(min_col, max_col + 1)
+                if col_index <= len(columns) and columns[col_index - 1] is not None
+            ]
+            if not targets:
+                continue
+            if targets[0] != min_col:
+                foreign_sources[(min_row, min_col)] = (min_row, targets[0])
+            anchored.append((targets[0], min_row, max_col, max_row))
+        return anchored, foreign_sources
+
+    @staticmethod
+    def _cell_value(cell, shared_strings, date_styles, timedelta_styles, epoch):
+        """
+        Декодирует значение одной ячейки `<c>` по правилам openpyxl (режим data_only).
+        """
+        data_type = cell.get('t', 'n')
+
+        if data_type == 'inlineStr':
+            inline = cell.find(INLINE_STRING_TAG)
+            return _text_content(inline) if inline is not None else None
+
+        value = cell.findtext(VALUE_TAG, None) or None
+        if value is None:
+            return None
+
+        if data_type == 'n':
+            value = _cast_number(value)
+            style_id = int(cell.get('s', 0))
+            if style_id in date_styles:
+                try:
+                    return from_excel(value, epoch, timedelta=style_id in timedelta_styles)
+                except (OverflowError, ValueError):
+                    return '#VALUE!'
+            return value
+        if data_type == 's':
+            return shared_strings[int(value)]
+        if data_type == 'b':
+            return bool(int(value))
+        if data_type == 'd':
+            return from_ISO8601(value)
+        return value
+
+
+class CalamineReader:
+    """
+    Читатель первого листа xlsx через python-calamine (разбор на Rust).
+
+    Работает в разы быстрее `XlsxStreamReader`, но не знает об объединённых ячейках
+    и теряет значения ячеек с ошибками, поэтому используется только для листов без них
+    (см. `XlsxStreamReader.requires_stream_reader`). Значения приводятся
+    к тем же правилам, что у openpyxl: пустые ячейки — None, целые числа — int,
+    даты — datetime. Пустую ячейку calamine возвращает как '', поэтому '' читается
+    как None; листы с явными пустыми строками (openpyxl читает их как '') в режиме `auto`
+    тоже читаются `XlsxStreamReader`. Результат `read_columns` совместим с `XlsxStreamReader.read_columns`.
+
+    :param source: Путь к xlsx-файлу или бинарный файловый объект.
+    :type source: str | BinaryIO
+    """
+
+    def __init__(self, source: str | BinaryIO):
+        """
+        Инициализирует читатель.
+
+        :param source: Путь к xlsx-файлу или бинарный файловый объект.
+        :raises ImportError: Если не установлен python-calamine.
+        """
+        if CalamineWorkbook is None:
+            raise ImportError('Не установлен python-calamine')
+        self.source = source
+
+    def read_columns(
+        self,
+        columns: List[str] | None = None,
+    ) -> Tuple[List[np.ndarray | None], List[Tuple[int, int, int, int]]]:
+        """
+        Читает первый лист в массивы колонок.
+
+        :param columns: Названия колонок, которые нужно прочитать. None — читать все.
+        :type columns: List[str] | None
+        :return: Список колонок (`np.ndarray` с dtype=object или None для пропущенных)
+                 и пустой список объединённых диапазонов.
+        :rtype: Tuple[List[np.ndarray | None], List[Tuple[int, int, int, int]]]
+        """
+        if isinstance(self.source, str):
+            workbook = CalamineWorkbook.from_path(self.source)
+        else:
+            self.source.seek(0)
+            workbook = CalamineWorkbook.from_filelike(self.source)
+        rows = workbook.get_sheet_by_index(0).to_python(skip_empty_area=False)
+        if not rows:
+            return [], []
+
+        required = set(normalize_column_name(col) for col in columns) if columns else None
+        width = max(len(row) for row in rows)
+
+        arrays = []
+        for col_index in range(width):
+            header = self._value(rows[0][col_index]) if col_index < len(rows[0]) else None
+            if required is not None and normalize_column_name(header) not in required:
+                arrays.append(None)
+                continue
+            array = np.empty(len(rows), dtype=object)
+            array[:] = [
+                self._value(row[col_index]) if col_index < len(row) else None
+                for row in rows
+            ]
+            arrays.append(array)
+        return arrays, []
+
+    @staticmethod
+    def _value(value: Any) -> Any:
+        """
+        Приводит значение ячейки calamine к правилам openpyxl.
+        """
+        if isinstance(value, str):
+            return value if value != '' else None
+        if isinstance(value, float) and value.is_integer() and abs(value) < MAX_EXACT_INT:
+            return int(value)
+        if type(value) is datetime.date:
+            return datetime.datetime.combine(value, datetime.time())
+        return value
+
+
+class CsvReader:
+    """
+    Читатель CSV-выгрузок.
+
+    Кодировка (UTF-8 или Windows-1251) и разделитель определяются по началу файла.
+    Пустые ячейки становятся пропусками, остальные значения (в том числе «NA» и «null»)
+    сохраняются как есть, числа приводятся к числовым типам.
+
+    :param source: Путь к CSV-файлу или бинарный файловый объект.
+    :type source: str | BinaryIO
+    """
+
+    def __init__(self, source: str | BinaryIO):
+        """
+        Инициализирует читатель.
+
+        :param source: Путь к CSV-файлу или бинарный файловый объект.
+        """
+        self.source = source
+
+    @contextmanager
+    def _open(self) -> Iterator[BinaryIO]:
+        """
+        Открывает файл на чтение с начала. Переданный файловый объект не закрывается.
+        """
+        if isinstance(self.source, str):
+            with open(self.source, 'rb') as file:
+                yield file
+        else:
+            self.source.seek(0)
+            yield self.source
+
+    def _detect_format(self) -> Tuple[str, str]:
+        """
+        Определяет кодировку и разделитель по первым килобайтам файла.
+
+        :return: Кодировка и разделитель.
+        :raises ValueError: Если файл не удалось декодировать.
+        """
+        with self._open() as file:
+            sample = file.read(CSV_SAMPLE_SIZE)
+
+        for encoding in CSV_ENCODINGS:
+            try:
+                # Инкрементальный декодер не падает на символе, разрезанном границей выборки
+                text = codecs.getincrementaldecoder(encoding)().decode(sample)
+                break
+            except UnicodeDecodeError:
+                continue
+        else:
+            raise ValueError("Не удалось определить кодировку CSV")
+
+        # Разделитель ищется по полным строкам выборки: по одной строке заголовка
+        # его не отличить от запятых внутри названий колонок
+        lines = text.splitlines()
+        if len(sample) == CSV_SAMPLE_SIZE and len(lines) > 1:
+            lines = lines[:-1]
+        try:
+            delimiter = csv.Sniffer().sniff('\n'.join(lines), delimiters=CSV_DELIMITERS).delimiter
+        except csv.Error:
+            delimiter = ','
+        return encoding, delimiter
+
+    def read_header(self) -> Tuple[List[Any], None]:
+        """
+        Читает только строку заголовка.
+
+        :return: Названия колонок и None (размер файла без чтения неизвестен).
+        :rtype: Tuple[List[Any], None]
+        """
+        encoding, delimiter = self._detect_format()
+        with self._open() as file:
+            text = io.TextIOWrapper(file, encoding=encoding, newline='')
+            try:
+                header = next(csv.reader(text, delimiter=delimiter), [])
+            finally:
+                # Закрытие обёртки закрыло бы и сам файл
+                text.detach()
+        return header, None
+
+    def read_frame(self, columns: List[str] | None = None) -> pd.DataFrame:
+        """
+        Читает CSV в DataFrame.
+
+        :param columns: Названия колонок, которые нужно прочитать (без учёта регистра
+                        и пробелов по краям). None — читать все.
+        :type columns: List[str] | None
+        :return: DataFrame с данными файла.
+        :rtype: pd.DataFrame
+        """
+        options = self._read_options(columns)
+        try:
+            with self._open() as file:
+                return pd.read_csv(file, **options)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+
+    def iter_frames(self, columns: List[str] | None, chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """
+        Читает CSV частями по `chunk_rows` строк.
+
+        :param columns: Названия колонок, которые нужно прочитать. None — читать все.
+        :type columns: List[str] | None
+        :param chunk_rows: Число строк в части.
+        :type chunk_rows: int
+        :return: Части файла в виде DataFrame.
+        :rtype: Iterator[pd.DataFrame]
+        """
+        options = self._read_options(columns)
+        try:
+            with self._open() as file:
+                with pd.read_csv(file, chunksize=chunk_rows, **options) as chunks:
+                    yield from chunks
+        except pd.errors.EmptyDataError:
+            return
+
+    def _read_options(self, columns: List[str] | None) -> Dict[str, Any]:
+        """
+        Возвращает параметры `pd.read_csv` для этого файла.
+
+        Формат определяется по началу файла, поэтому параметры получают до открытия файла на чтение.
+        """
+        encoding, delimiter = self._detect_format()
+        required = set(normalize_column_name(col) for col in columns) if columns else None
+        return dict(
+            sep=delimiter,
+            encoding=encoding,
+            usecols=(lambda name: normalize_column_name(name) in required) if required else None,
+            keep_default_na=False,
+            na_values=[''],
+        )
+
+
+class ParquetReader:
+    """
+    Читатель Parquet-файлов из хранилища данных.
+
+    Колонки читаются выборочно средствами pyarrow, без разбора остальных.
+
+    :param source: Путь к Parquet-файлу или бинарный файловый объект.
+    :type source: str | BinaryIO
+    :raises ImportError: Если не установлен pyarrow.
+    """
+
+    def __init__(self, source: str | BinaryIO):
+        """
+        Инициализирует читатель.
+
+        :param source: Путь к Parquet-файлу или бинарный файловый объект.
+        """
+        if pq is None:
+            raise ImportError('Не установлен pyarrow')
+        self.source = source
+
+    def read_header(self) -> Tuple[List[Any], Tuple[int, int]]:
+        """
+        Читает названия колонок и размер таблицы из метаданных файла.
+
+        :return: Названия колонок и размер таблицы (строк, колонок).
+        :rtype: Tuple[List[Any], Tuple[int, int]]
+        """
+        metadata = pq.ParquetFile(self.source).metadata
+        header = metadata.schema.to_arrow_schema().names
+        return header, (metadata.num_rows, len(header))
+
+    def read_frame(self, columns: List[str] | None = None) -> pd.DataFrame:
+        """
+        Читает Parquet в DataFrame.
+
+        :param columns: Названия колонок, которые нужно прочитать (без учёта регистра
+                        и пробелов по краям). None — читать все.
+        :type columns: List[str] | None
+        :return: DataFrame с данными файла.
+        :rtype: pd.DataFrame
+        """
+        return pq.read_table(self.source, columns=self._select_columns(columns)).to_pandas()
+
+    def iter_frames(self, columns: List[str] | None, chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """
+        Читает Parquet частями не более `chunk_rows` строк.
+
+        :param columns: Названия колонок, которые нужно прочитать. None — читать все.
+        :type columns: List[str] | None
+        :param chunk_rows: Число строк в части.
+        :type chunk_rows: int
+        :return: Части файла в виде DataFrame.
+        :rtype: Iterator[pd.DataFrame]
+        """
+        batches = pq.ParquetFile(self.source).iter_batches(
+            batch_size=chunk_rows,
+            columns=self._select_columns(columns),
+        )
+        for batch in batches:
+            yield batch.to_pandas()
+
+    def _select_columns(self, columns: List[str] | None) -> List[str] | None:
+        """
+        Возвращает названия колонок файла, совпадающие с `columns` без учёта регистра.
+        """
+        if not columns:
+            return None
+        required = set(normalize_column_name(col) for col in columns)
+        header, _ = self.read_header()
+        return [name for name in header if normalize_column_name(name) in required]
+
+
+class NdjsonReader:
+    """
+    Читатель строк в формате NDJSON (один JSON-объект на строку).
+
+    Строки разбираются по мере чтения потока и сразу проверяются на наличие
+    требуемых колонок, поэтому ошибка во входных данных обнаруживается на первой
+    неверной строке. В память складываются только значения требуемых колонок.
+
+    :param source: Бинарный или текстовый поток со строками NDJSON.
+    :type source: BinaryIO
+    """
+
+    def __init__(self, source: BinaryIO):
+        """
+        Инициализирует читатель.
+
+        :param source: Бинарный или текстовый поток со строками NDJSON.
+        """
+        self.source = source
+
+    def read_frame(self, columns: List[str]) -> pd.DataFrame:
+        """
+        Читает строки потока в DataFrame с колонками `columns`.
+
+        Ключи объектов сопоставляются с колонками без учёта регистра и пробелов
+        по краям, лишние ключи отбрасываются, значение null становится пропуском.
+
+        :param columns: Требуемые колонки, в этом порядке они будут в результате.
+        :type columns: List[str]
+        :return: DataFrame с требуемыми колонками.
+        :rtype: pd.DataFrame
+        :raises ValueError: Если строка не является JSON-объектом или в ней не хватает колонок.
+        """
+        frames = list(self.iter_frames(columns))
+        if not frames:
+            return pd.DataFrame({column: [] for column in columns}, columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+    def iter_frames(self, columns: List[str], chunk_rows: int | None = None) -> Iterator[pd.DataFrame]:
+        """
+        Читает строки потока частями по `chunk_rows` строк.
+
+        :param columns: Требуемые колонки, в этом порядке они будут в результате.
+        :type columns: List[str]
+        :param chunk_rows: Число строк в части. None — весь поток одной частью.
+        :type chunk_rows: int | None
+        :return: Части потока в виде DataFrame.
+        :rtype: Iterator[pd.DataFrame]
+        :raises ValueError: Если строка не является JSON-объектом или в ней не хватает колонок.
+        """
+        required = {normalize_column_name(column): column for column in columns}
+        values = {column: [] for column in columns}
+        row_count = 0
+
+        for line_number, line in enumerate(self.source, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Строка {line_number}: некорректный JSON ({e})")
+            if not isinstance(row, dict):
+                raise ValueError(f"Строка {line_number}: ожидается JSON-объект")
+
+            row_by_name = {normalize_column_name(key): value for key, value in row.items()}
+            missing = required.keys() - row_by_name.keys()
+            if missing:
+                raise ValueError(f"Строка {line_number}: не хватает колонок: {missing}")
+
+            for name, column in required.items():
+                values[column].append(row_by_name[name])
+            row_count += 1
+
+            if chunk_rows is not None and row_count == chunk_rows:
+                yield pd.DataFrame(values, columns=columns)
+                values = {column: [] for column in columns}
+                row_count = 0
+
+        if row_count:
+            yield pd.DataFrame(values, columns=columns)
@@ -1,4 +1,4 @@
-from flask import redirect, render_template, jsonify, request, send_file
+from flask import redirect, render_template, jsonify, request, send_from_directory
 from .controllers import *
 from .schemas import FormatSchema, MergeSchema, ErrorSchema
 import os
@@ -10,6 +10,7 @@ def configure_routes(app):
 
     Функция определяет обработчики для логических и статических маршрутов:
     - Логические маршруты обрабатывают POST-запросы (например, загрузку и обработку файлов).
+      Конфиг отчётов и папка загрузок берутся из `app.config` и передаются контроллерам явно.
     - Статические маршруты возвращают HTML-страницы или перенаправления.
 
     :param app: Экземпляр Flask-приложения.
@@ -21,9 +22,10 @@ def configure_routes(app):
     @app.post(f'/merge-files')
     def send_merge_files():
         """
-        Обрабатывает POST-запрос на объединение двух файлов.
+        Обрабатывает POST-запрос на объединение файлов.
 
-        Получает два файла из формы, выполняет валидацию,
+        Получает из формы одну или несколько выгрузок веб-системы (`web_file`)
+        и файл Битрикс (`bitrix_file`), выполняет валидацию,
         передаёт их в контроллер для обработки и возвращает результат в формате JSON.
 
         :return: Ответ в формате JSON с данными результата или ошибкой.
@@ -31,19 +33,21 @@ def configure_routes(app):
         try:
             print('пришел запрос на merge')
             # - валидация -
-            web_file = request.files['web_file']
+            web_files = request.files.getlist('web_file')
             bitrix_file = request.files['bitrix_file']
             print('открыты файлы')
             data = MergeSchema(
-                web_file=web_file.filename,
-                bitrix_file=web_file.filename,
+                web_files=[web_file.filename for web_file in web_files],
+                bitrix_file=bitrix_file.filename,
             )
             print('данные валидны')
 
             # - Передача данных в контроллер -
             response = MergeController.merge(
-                web_file=web_file,
-                bitrix_file=bitrix_file
+                web_files=web_files,
+                bitrix_file=bitrix_file,
+                config=app.config['REPORT_CONFIG'],
+                upload_folder=app.config['UPLOAD_FOLDER'],
             )
 
             return jsonify(response.model_dump())
@@ -54,6 +58,38 @@ def configure_routes(app):
             )
             return jsonify(response.model_dump())
 
+    @app.post(f'/api/merge-ndjson')
+    def send_merge_ndjson():
+        """
+        Обрабатывает POST-запрос на объединение данных, переданных в формате NDJSON.
+
+        Ожидает multipart-запрос с двумя частями `web_file` и `bitrix_file`,
+        в каждой — строки таблицы по одному JSON-объекту на строку.
+
+        :return: Ответ в формате JSON с данными результата или ошибкой.
+        """
+        try:
+            print('пришел запрос на merge NDJSON')
+            web_file = request.files.get('web_file')
+            bitrix_file = request.files.get('bitrix_file')
+            if web_file is None or bitrix_file is None:
+                raise ValueError("Нужны части web_file и bitrix_file с данными NDJSON")
+
+            response = MergeController.merge_ndjson(
+                web_stream=web_file.stream,
+                bitrix_stream=bitrix_file.stream,
+                config=app.config['REPORT_CONFIG'],
+                upload_folder=app.config['UPLOAD_FOLDER'],
+            )
+
+            return jsonify(response.model_dump())
+        except Exception as e:
+            error = ErrorSchema(
+                message=str(e),
+                code=400
+            )
+            return jsonify(error.model_dump())
+
     @app.post(f'/format-file')
     def send_format_file():
         """
@@ -73,6 +109,8 @@ def configure_routes(app):
             # - Передача данных в контроллер -
             response = FormatController.format(
                 format_file=file,
+                config=app.config['REPORT_CONFIG'],
+                upload_folder=app.config['UPLOAD_FOLDER'],
             )
 
             return jsonify(response.model_dump())
@@ -88,13 +126,14 @@ def configure_routes(app):
         """
         Обрабатывает GET-запрос для скачивания файла.
 
-        Извлекает параметр `link` из URL и отправляет соответствующий файл из папки uploads.
+        Извлекает параметр `link` из URL и отправляет соответствующий файл из папки загрузок.
 
         :return: Файл для скачивания.
         """
         link = request.args.get('link')
-        return send_file(
-            f'../uploads/{link}',
+        return send_from_directory(
+            app.config['UPLOAD_FOLDER'],
+            link,
         )
 
     # ======================== Static Routes ========================
@@ -1,5 +1,9 @@
 from pydantic import BaseModel, field_validator
 from enum import Enum
+from typing import List
+
+# Допустимые расширения входных файлов
+ALLOWED_EXTENSIONS = ('.xlsx', '.csv', '.parquet')
 
 class MergeSchema(BaseModel):
     """
@@ -7,42 +11,46 @@ class MergeSchema(BaseModel):
 
     Используется для валидации входных данных, полученных от клиента при отправке запроса на объединение.
     Обязательные поля:
-        - web_file: имя файла из веб-системы (должно иметь расширение .xlsx)
-        - bitrix_file: имя файла из Битрикс (должно иметь расширение .xlsx)
+        - web_files: имена файлов из веб-системы, одного или нескольких (.xlsx, .csv или .parquet)
+        - bitrix_file: имя файла из Битрикс (.xlsx, .csv или .parquet)
 
     """
 
-    web_file: str
+    web_files: List[str]
     bitrix_file: str
 
-    @field_validator('web_file')
-    def validate_web_extension(cls, value: str) -> str:
+    @field_validator('web_files')
+    def validate_web_extension(cls, value: List[str]) -> List[str]:
         """
-        Проверяет, что имя файла из веб-системы имеет расширение `.xlsx`.
+        Проверяет, что передан хотя бы один файл из веб-системы и у каждого
+        расширение `.xlsx`, `.csv` или `.parquet`.
 
-        :param value: Имя файла для проверки.
-        :type value: str
-        :raises ValueError: Если расширение файла не `.xlsx`.
+        :param value: Имена файлов для проверки.
+        :type value: List[str]
+        :raises ValueError: Если файлов нет или расширение файла не входит в `ALLOWED_EXTENSIONS`.
         :return: Возвращается оригинальное значение, если валидация успешна.
-        :rtype: str
+        :rtype: List[str]
         """
-        if not value.lower().endswith('.xlsx'):
-            raise ValueError("Файл веб системы должен иметь расширение .xlsx")
+        if not value:
+            raise ValueError("Не передан файл веб системы")
+        for filename in value:
+            if not filename.lower().endswith(ALLOWED_EXTENSIONS):
+                raise ValueError("Файл веб системы должен иметь расширение .xlsx, .csv или .parquet")
         return value
 
     @field_validator('bitrix_file')
     def validate_bitrix_extension(cls, value: str) -> str:
         """
-        Проверяет, что имя файла из Битрикс имеет расширение `.xlsx`.
+        Проверяет, что имя файла из Битрикс имеет расширение `.xlsx`, `.csv` или `.parquet`.
 
         :param value: Имя файла для проверки.
         :type value: str
-        :raises ValueError: Если расширение файла не `.xlsx`.
+        :raises ValueError: Если расширение файла не входит в `ALLOWED_EXTENSIONS`.
         :return: Возвращается оригинальное значение, если валидация успешна.
         :rtype: str
         """
-        if not value.lower().endswith('.xlsx'):
-            raise ValueError("Файл битрикс должен иметь расширение .xlsx")
+        if not value.lower().endswith(ALLOWED_EXTENSIONS):
+            raise ValueError("Файл битрикс должен иметь расширение .xlsx, .csv или .parquet")
         return value
 
 class FormatSchema(BaseModel):
@@ -51,7 +59,7 @@ class FormatSchema(BaseModel):
 
     Используется для валидации входных данных, полученных от клиента при отправке запроса на форматирование.
     Обязательные поля:
-        - format_file: имя файла, который будет обработан (должно иметь расширение .xlsx)
+        - format_file: имя файла, который будет обработан (.xlsx, .csv или .parquet)
     """
 
     format_file: str
@@ -59,16 +67,16 @@ class FormatSchema(BaseModel):
     @field_validator('format_file')
     def validate_excel_extension(cls, value: str) -> str:
         """
-        Проверяет, что имя файла имеет расширение `.xlsx`.
+        Проверяет, что имя файла имеет расширение `.xlsx`, `.csv` или `.parquet`.
 
         :param value: Имя файла для проверки.
         :type value: str
-        :raises ValueError: Если расширение файла не `.xlsx`.
+        :raises ValueError: Если расширение файла не входит в `ALLOWED_EXTENSIONS`.
         :return: Возвращается оригинальное значение, если валидация успешна.
         :rtype: str
         """
-        if not value.lower().endswith('.xlsx'):
-            raise ValueError("Файл должен иметь расширение .xlsx")
+        if not value.lower().endswith(ALLOWED_EXTENSIONS):
+            raise ValueError("Файл должен иметь расширение .xlsx, .csv или .parquet")
         return value
 
 class SuccesSchema(BaseModel):
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+# Инкрементальное объединение относительно прошлой выгрузки: заново объединяются только
+# изменённые строки и готовятся только изменённые листы бюро, запись всех листов в файл
+# не пропускается. Включается явно: снимок с результатом объединения и данными листов
+# бюро занимает память воркера
+INCREMENTAL_MERGE = os.environ.get('INCREMENTAL_MERGE', '0') == '1'
+# Через сколько секунд без объединений снимок удаляется из памяти (0 — не удаляется)
+INCREMENTAL_MERGE_TTL = float(os.environ.get('INCREMENTAL_MERGE_TTL', 600))
+# Сколько снимков (источников выгрузок) хранит воркер
+INCREMENTAL_MERGE_SNAPSHOTS = int(os.environ.get('INCREMENTAL_MERGE_SNAPSHOTS', 4))
+
+
+class MergeSnapshot:
+    """
+    Состояние последнего объединения, с которым сравнивается следующее.
+
+    Хранит хеши нормализованных строк Битрикс, отпечатки строк веб-системы по ключам
+    объединения, результат объединения (до приведения типов), а также отпечатки и подготовленные данные листов бюро.
+
+    :param config_key: Отпечаток конфига, при котором получен результат.
+    :type config_key: str
+    :param bitrix_hashes: Хеши строк Битрикс после нормализации.
+    :type bitrix_hashes: np.ndarray
+    :param web_fingerprints: Отпечаток строк веб-системы для каждого ключа объединения.
+    :type web_fingerprints: Dict[str, int]
+    :param result_df: Результат объединения до приведения типов.
+    :type result_df: pd.DataFrame
+    :param block_lengths: Число строк результата для каждой строки Битрикс.
+    :type block_lengths: np.ndarray
+    """
+
+    def __init__(
+        self,
+        config_key: str,
+        bitrix_hashes: np.ndarray,
+        web_fingerprints: Dict[str, int],
+        result_df: pd.DataFrame,
+        block_lengths: np.ndarray,
+    ):
+        """
+        Инициализирует снимок объединения.
+        """
+        self.config_key = config_key
+        self.bitrix_hashes = bitrix_hashes
+        self.web_fingerprints = web_fingerprints
+        self.result_df = result_df
+        self.block_lengths = block_lengths
+        # Заполняются после построения отчёта
+        self.bureau_fingerprints: Dict[Any, int] = {}
+        self.bureau_sheets: Dict[Any, Any] = {}
+
+
+class MergeSnapshotStore:
+    """
+    Хранилище снимков последних объединений в памяти процесса.
+
+    Каждый воркер gunicorn хранит до `max_entries` снимков — по одному на источник
+    выгрузок, чтобы чередующиеся объединения разных отчётов не вытесняли друг друга.
+    Источник узнаётся по содержимому: для объединения берётся снимок при том же
+    конфиге, с которым у выгрузки Битрикс больше всего общих строк. Новый снимок
+    заменяет тот, из которого получен; при переполнении удаляется снимок, которым
+    дольше всех не пользовались. Снимок, которым не пользовались `ttl` секунд, тоже
+    удаляется, чтобы воркер не держал его память без дела.
+
+    Снимок избавляет только от повторного объединения строк и подготовки листов
+    бюро: лист записывается в файл отчёта заново при каждом объединении.
+
+    :param ttl: Время жизни снимка в секундах после последнего объединения. None или 0 — без ограничения.
+    :type ttl: float | None
+    :param max_entries: Максимальное число снимков. По умолчанию — `INCREMENTAL_MERGE_SNAPSHOTS`.
+    :type max_entries: int | None
+    """
+
+    def __init__(self, ttl: float | None = None, max_entries: int | None = None):
+        """
+        Создаёт пустое хранилище.
+
+        :param ttl: Время жизни снимка в секундах. None или 0 — без ограничения.
+        :param max_entries: Максимальное число снимков.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries or INCREMENTAL_MERGE_SNAPSHOTS
+        # Снимки от давно использованного к недавнему и таймеры их удаления
+        self._timers: OrderedDict[MergeSnapshot, threading.Timer | None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'MergeSnapshotStore | None':
+        """
+        Возвращает общее хранилище процесса или None, если `INCREMENTAL_MERGE` выключен.
+
+        :rtype: MergeSnapshotStore | None
+        """
+        if not INCREMENTAL_MERGE:
+            return None
+        return _default_store
+
+    @staticmethod
+    def config_key(config: Dict[str, Any]) -> str:
+        """
+        Возвращает отпечаток конфига.
+
+        :param config: Конфиг отчёта.
+        :return: SHA-256 канонического JSON конфига.
+        """
+        dump = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(dump.encode()).hexdigest()
+
+    def get(self, config_key: str, bitrix_hashes: np.ndarray) -> MergeSnapshot | None:
+        """
+        Возвращает снимок того же источника: при том же конфиге и с наибольшим
+        числом общих строк Битрикс.
+
+        :param config_key: Отпечаток текущего конфига.
+        :param bitrix_hashes: Хеши строк текущей выгрузки Битрикс.
+        :return: Снимок или None, если ни один снимок не подходит.
+        """
+        with self._lock:
+            candidates = [snapshot for snapshot in self._timers if snapshot.config_key == config_key]
+
+        best, best_overlap = None, 0
+        for snapshot in candidates:
+            overlap = int(np.isin(bitrix_hashes, snapshot.bitrix_hashes).sum())
+            if overlap > best_overlap:
+                best, best_overlap = snapshot, overlap
+
+        if best is not None:
+            with self._lock:
+                if best in self._timers:
+                    self._timers.move_to_end(best)
+        return best
+
+    def put(self, snapshot: MergeSnapshot, replaces: MergeSnapshot | None = None) -> None:
+        """
+        Запоминает снимок объединения.
+
+        :param snapshot: Новый снимок.
+        :param replaces: Снимок, из которого получен новый; удаляется из хранилища.
+        """
+        with self._lock:
+            if replaces is not None:
+                self._remove(replaces)
+            self._remove(snapshot)
+            timer = None
+            if self.ttl:
+                timer = threading.Timer(self.ttl, self._expire, args=(snapshot,))
+                timer.daemon = True
+                timer.start()
+            self._timers[snapshot] = timer
+            while len(self._timers) > self.max_entries:
+                self._remove(next(iter(self._timers)))
+
+    def clear(self) -> None:
+        """
+        Забывает все снимки.
+        """
+        with self._lock:
+            for snapshot in list(self._timers):
+                self._remove(snapshot)
+
+    def _remove(self, snapshot: MergeSnapshot) -> None:
+        """
+        Удаляет снимок и останавливает таймер его удаления. Вызывается под `_lock`.
+
+        :param snapshot: Снимок.
+        """
+        timer = self._timers.pop(snapshot, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _expire(self, snapshot: MergeSnapshot) -> None:
+        """
+        Удаляет снимок по истечении `ttl`.
+
+        :param snapshot: Снимок, для которого запускался таймер.
+        """
+        with self._lock:
+            self._timers.pop(snapshot, None)
+
+
+_default_store = MergeSnapshotStore(ttl=INCREMENTAL_MERGE_TTL)
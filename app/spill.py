@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+from typing import Dict, List
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - pyarrow необязателен
+    pa = None
+
+# Число строк выгрузки веб-системы в одной части при объединении по частям (0 — читать целиком)
+MERGE_CHUNK_ROWS = int(os.environ.get('MERGE_CHUNK_ROWS', '0'))
+
+
+class BureauSpill:
+    """
+    Временная папка с частями результата объединения, разложенными по бюро.
+
+    Каждая часть записывается отдельным Parquet-файлом. Колонку со значениями
+    разных типов (например, номера тракторов числами и строками) pyarrow записать
+    не может, такая часть сохраняется через pickle. Папка удаляется `cleanup`.
+
+    :param folder: Папка, в которой создаётся временная папка (по умолчанию системная).
+    :type folder: str | None
+    """
+
+    def __init__(self, folder: str | None = None):
+        """
+        Создаёт временную папку.
+
+        :param folder: Папка, в которой создаётся временная папка.
+        """
+        self.path = tempfile.mkdtemp(prefix='merge-spill-', dir=folder)
+        self._parts: Dict[int, List[str]] = {}
+
+    def __enter__(self) -> 'BureauSpill':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.cleanup()
+
+    def append(self, bureau: int, df: pd.DataFrame) -> None:
+        """
+        Сбрасывает часть строк бюро на диск.
+
+        :param bureau: Код бюро.
+        :param df: Строки бюро.
+        """
+        parts = self._parts.setdefault(bureau, [])
+        part_path = os.path.join(self.path, f'{bureau}-{len(parts)}')
+        if pa is not None:
+            try:
+                df.to_parquet(part_path + '.parquet', index=False)
+                parts.append(part_path + '.parquet')
+                return
+            except pa.ArrowException:
+                pass
+        df.to_pickle(part_path + '.pkl')
+        parts.append(part_path + '.pkl')
+
+    def read(self, bureau: int) -> pd.DataFrame | None:
+        """
+        Читает все части бюро.
+
+        :param bureau: Код бюро.
+        :return: Строки бюро в порядке записи или None, если частей нет.
+        """
+        parts = self._parts.get(bureau)
+        if not parts:
+            return None
+        frames = [
+            pd.read_parquet(path) if path.endswith('.parquet') else pd.read_pickle(path)
+            for path in parts
+        ]
+        return pd.concat(frames, ignore_index=True)
+
+    def cleanup(self) -> None:
+        """
+        Удаляет временную папку со всеми частями.
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
+        self._parts = {}
@@ -0,0 +1,200 @@
+import hashlib
+import io
+import os
+import uuid
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+# Максимальный размер одного загружаемого файла
+UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_MB', 100)) * 1024 * 1024
+# Файлы не больше этого размера обрабатываются в памяти, не попадая на диск (0 — отключено)
+ZERO_DISK_MAX_SIZE = int(os.environ.get('ZERO_DISK_MAX_MB', 20)) * 1024 * 1024
+
+# Сигнатуры начала файла по расширению: xlsx — zip-архив, Parquet начинается с PAR1
+FILE_SIGNATURES = {
+    '.xlsx': b'PK\x03\x04',
+    '.parquet': b'PAR1',
+}
+# Сколько первых байт нужно для проверки сигнатуры
+SIGNATURE_SIZE = 4
+
+
+class UploadSpool:
+    """
+    Файл, в который загрузка пишется прямо в папку загрузок по мере поступления тела запроса.
+
+    Werkzeug передаёт сюда части файла из multipart-запроса. Вместе с записью
+    считается SHA-256 содержимого, проверяется размер и сигнатура начала файла,
+    поэтому слишком большой или явно неподходящий файл отклоняется, не дожидаясь
+    конца загрузки. `Utils.save_uploaded_files` переименовывает готовый файл вместо
+    копирования, а хеш используется как ключ `ParseCache`.
+
+    Пока размер файла не превышает `memory_size`, он хранится в памяти и может быть
+    прочитан прямо отсюда, без записи на диск (см. `in_memory`). Файл переносится
+    в папку загрузок, как только вырастает больше `memory_size`.
+
+    Если файл так и не был сохранён, он удаляется при закрытии запроса.
+
+    :param folder: Папка загрузок.
+    :type folder: str
+    :param filename: Имя загружаемого файла.
+    :type filename: str | None
+    :param max_size: Максимальный размер файла в байтах.
+    :type max_size: int
+    :param memory_size: До какого размера файл хранится в памяти (0 — сразу на диске).
+    :type memory_size: int
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        filename: str | None,
+        max_size: int = UPLOAD_MAX_SIZE,
+        memory_size: int = 0,
+    ):
+        """
+        Создаёт буфер в памяти или временный файл в папке загрузок.
+
+        :param folder: Папка загрузок.
+        :param filename: Имя загружаемого файла.
+        :param max_size: Максимальный размер файла в байтах.
+        :param memory_size: До какого размера файл хранится в памяти.
+        """
+        self.folder = folder
+        self.filename = filename
+        self.path = None
+        self.file = io.BytesIO()
+        if memory_size <= 0:
+            self._rollover()
+        self.max_size = max_size
+        self.memory_size = memory_size
+        self.size = 0
+        self.kept = False
+        self._digest = hashlib.sha256()
+        self._signature = FILE_SIGNATURES.get(os.path.splitext(filename or '')[1].lower())
+        self._head = b''
+
+    def write(self, data: bytes) -> int:
+        """
+        Дописывает часть файла, обновляя хеш и проверяя ограничения.
+
+        :param data: Очередная часть файла.
+        :return: Число записанных байт.
+        :raises RequestEntityTooLarge: Если файл превышает допустимый размер.
+        :raises UnsupportedMediaType: Если начало файла не соответствует расширению.
+        """
+        # При отказе файл удаляется сразу: werkzeug не вернёт его в request.files
+        # и не закроет вместе с запросом
+        self.size += len(data)
+        if self.size > self.max_size:
+            self.close()
+            raise RequestEntityTooLarge(
+                f"Файл больше допустимого размера {self.max_size / (1024 * 1024):g} МБ"
+            )
+
+        if self._signature is not None and len(self._head) < SIGNATURE_SIZE:
+            self._head += data[:SIGNATURE_SIZE - len(self._head)]
+            if len(self._head) >= SIGNATURE_SIZE and not self._head.startswith(self._signature):
+                self.close()
+                raise UnsupportedMediaType("Содержимое файла не соответствует его расширению")
+
+        self._digest.update(data)
+        if self.in_memory and self.size > self.memory_size:
+            self._rollover()
+        return self.file.write(data)
+
+    def _rollover(self) -> None:
+        """
+        Переносит содержимое из памяти во временный файл в папке загрузок.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        self.path = os.path.join(self.folder, f'{uuid.uuid4()}.upload')
+        disk_file = open(self.path, 'w+b')
+        disk_file.write(self.file.getbuffer())
+        self.file.close()
+        self.file = disk_file
+
+    @property
+    def in_memory(self) -> bool:
+        """
+        True, если файл целиком хранится в памяти и ещё не записан на диск.
+        """
+        return self.path is None
+
+    @property
+    def content_hash(self) -> str:
+        """
+        SHA-256 записанного содержимого.
+        """
+        return self._digest.hexdigest()
+
+    def keep(self, path: str) -> None:
+        """
+        Сохраняет загруженный файл под именем `path`.
+
+        Файл на диске переименовывается без копирования данных,
+        файл из памяти записывается по этому пути.
+
+        :param path: Итоговый путь файла.
+        """
+        if self.in_memory:
+            with open(path, 'wb') as file:
+                file.write(self.file.getbuffer())
+        else:
+            self.file.flush()
+            os.replace(self.path, path)
+        self.path = path
+        self.kept = True
+
+    def close(self) -> None:
+        """
+        Закрывает файл и удаляет его, если он не был сохранён.
+        """
+        if self.file.closed:
+            return
+        self.file.close()
+        if self.path is not None and not self.kept:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __iter__(self):
+        return iter(self.file)
+
+    def __getattr__(self, name):
+        # read, readline, seek, tell и прочие методы файла
+        return getattr(self.file, name)
+
+
+class UploadRequest(Request):
+    """
+    Запрос Flask, который пишет загружаемые файлы сразу в папку загрузок через `UploadSpool`.
+
+    Файлы не больше `ZERO_DISK_MAX_SIZE` остаются в памяти. Если размер части
+    заранее известен и превышает порог, файл сразу пишется на диск.
+    Папка загрузок берётся из `UPLOAD_FOLDER` конфига приложения (см. `create_app`).
+    """
+
+    def _get_file_stream(
+        self,
+        total_content_length: int | None,
+        content_type: str | None,
+        filename: str | None = None,
+        content_length: int | None = None,
+    ) -> UploadSpool:
+        """
+        Возвращает файл для записи загружаемой части запроса.
+
+        :raises RequestEntityTooLarge: Если заявленный размер файла превышает допустимый.
+        """
+        if content_length and content_length > UPLOAD_MAX_SIZE:
+            raise RequestEntityTooLarge(
+                f"Файл больше допустимого размера {UPLOAD_MAX_SIZE / (1024 * 1024):g} МБ"
+            )
+        return UploadSpool(
+            folder=current_app.config.get('UPLOAD_FOLDER', 'uploads'),
+            filename=filename,
+            max_size=UPLOAD_MAX_SIZE,
+            memory_size=0 if content_length and content_length > ZERO_DISK_MAX_SIZE else ZERO_DISK_MAX_SIZE,
+        )
@@ -1,8 +1,61 @@
 import uuid
+import datetime
 import os
-from typing import Tuple, List, Dict, Any
+import json
+import multiprocessing
+import zipfile
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import Tuple, List, Dict, Any, BinaryIO, Iterable, Iterator, Set
+import numpy as np
 import pandas as pd
-from openpyxl import load_workbook
+from .readers import (
+    CalamineReader,
+    CalamineWorkbook,
+    CsvReader,
+    ParquetReader,
+    XlsxStreamReader,
+    normalize_column_name,
+)
+from .cache import ParseCache
+from .uploads import UploadSpool
+
+# Ограничения предварительной проверки xlsx, задаются переменными окружения
+XLSX_MAX_ROWS = int(os.environ.get('XLSX_MAX_ROWS', 1_048_576))
+XLSX_MAX_CELLS = int(os.environ.get('XLSX_MAX_CELLS', 20_000_000))
+XLSX_MAX_UNCOMPRESSED_SIZE = int(os.environ.get('XLSX_MAX_UNCOMPRESSED_MB', 512)) * 1024 * 1024
+XLSX_MAX_COMPRESSION_RATIO = float(os.environ.get('XLSX_MAX_COMPRESSION_RATIO', 200))
+# Степень сжатия проверяется только для крупных частей архива
+XLSX_RATIO_CHECK_MIN_SIZE = 1024 * 1024
+
+# Движок чтения xlsx: auto — calamine для листов без объединённых ячеек,
+# calamine — всегда calamine, stream — всегда потоковый читатель
+READER_ENGINES = ('auto', 'calamine', 'stream')
+EXCEL_READER_ENGINE = os.environ.get('EXCEL_READER_ENGINE', 'auto')
+
+# Число процессов для параллельного разбора входных файлов (0 или 1 — разбор в текущем процессе)
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', min(2, os.cpu_count() or 1)))
+
+# Замер пиковой памяти по шагам обработки (tracemalloc заметно замедляет работу)
+PROFILE_MEMORY = os.environ.get('PROFILE_MEMORY', '0') == '1'
+
+# Строковые колонки в Arrow (`string[pyarrow]`): методы `.str` выполняются в pyarrow, а не по одной строке
+ARROW_STRINGS = os.environ.get('ARROW_STRINGS', '0') == '1'
+
+# Запись отчётов xlsxwriter в режиме `constant_memory`: в памяти хранится только текущая строка листа
+XLSX_CONSTANT_MEMORY = os.environ.get('XLSX_CONSTANT_MEMORY', '0') == '1'
+
+# Пул процессов создаётся при первом обращении, отдельно в каждом воркере gunicorn
+_parse_pool = None
+_parse_pool_pid = None
+_parse_pool_lock = threading.Lock()
+# Замер памяти `MemoryTracker` (tracemalloc общий для всех потоков процесса)
+_memory_lock = threading.RLock()
 
 class Utils:
     """
@@ -18,6 +71,7 @@ class Utils:
 
         Каждому файлу присваивается уникальное имя на основе UUID4. Сохранённые пути возвращаются в виде кортежа.
         ВАЖНО, что при вызове метода все файлы получают одинаковый UUID
+        (к повторяющимся именам дополнительно добавляется порядковый номер файла)
 
         :param files: Список объектов файлов, которые нужно сохранить.
         :type files: List
@@ -28,15 +82,63 @@ class Utils:
         """
         file_id = str(uuid.uuid4())
         file_paths = list()
-        for file in files:
+        for index, file in enumerate(files):
             unique_name = f'{file_id}_{file.filename}'
             path = os.path.join(upload_folder, unique_name)
-            file.save(path)
+            # Несколько выгрузок могут называться одинаково
+            if path in file_paths:
+                path = os.path.join(upload_folder, f'{file_id}_{index}_{file.filename}')
+            # Файл, загруженный через UploadSpool, уже лежит в папке загрузок
+            if isinstance(getattr(file, 'stream', None), UploadSpool):
+                file.stream.keep(path)
+            else:
+                file.save(path)
             file_paths.append(path)
         if len(file_paths) == 1:
             return file_paths[0]
         return tuple(file_paths)
 
+    @staticmethod
+    def get_upload_sources(files: List, upload_folder: str) -> List[str | BinaryIO]:
+        """
+        Возвращает источники для чтения загруженных файлов.
+
+        Файл, который `UploadSpool` держит в памяти (не больше `ZERO_DISK_MAX_MB`),
+        возвращается как поток и читается без записи на диск. Остальные файлы
+        сохраняются через `save_uploaded_files`, для них возвращается путь.
+
+        :param files: Список загруженных файлов.
+        :type files: List
+        :param upload_folder: Путь к папке, в которую будут сохранены файлы.
+        :type upload_folder: str
+        :return: Поток или путь для каждого файла в порядке `files`.
+        :rtype: List[str | BinaryIO]
+        """
+        sources = [
+            file.stream if isinstance(getattr(file, 'stream', None), UploadSpool) and file.stream.in_memory else None
+            for file in files
+        ]
+        disk_files = [file for file, source in zip(files, sources) if source is None]
+        if disk_files:
+            paths = Utils.save_uploaded_files(files=disk_files, upload_folder=upload_folder)
+            paths = iter([paths] if isinstance(paths, str) else paths)
+            sources = [next(paths) if source is None else source for source in sources]
+        return sources
+
+    @staticmethod
+    def get_content_hash(file) -> str | None:
+        """
+        Возвращает SHA-256 загруженного файла, посчитанный во время загрузки.
+
+        :param file: Загруженный файл (`FileStorage`).
+        :return: Хеш содержимого или None, если файл загружен не через `UploadSpool`.
+        :rtype: str | None
+        """
+        stream = getattr(file, 'stream', None)
+        if isinstance(stream, UploadSpool):
+            return stream.content_hash
+        return None
+
     @staticmethod
     def create_save_file(upl_folder: str) -> str:
         """
@@ -54,6 +156,22 @@ class Utils:
         path = os.path.join(upl_folder, unique_name)
         return path, unique_name
 
+    @staticmethod
+    def load_config(config_path: str = r'app/report_config.json') -> Dict[str, Any]:
+        """
+        Читает конфиг отчётов из JSON-файла.
+
+        Приложение читает конфиг один раз при создании (`create_app`) и передаёт его
+        контроллерам и drawer'ам. Конфиг общий для всех запросов, поэтому его не изменяют.
+
+        :param config_path: Путь к JSON-файлу с конфигурацией (по умолчанию 'app/report_config.json').
+        :type config_path: str
+        :return: Конфиг отчётов.
+        :rtype: Dict[str, Any]
+        """
+        with open(config_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
 class ExcelUtils:
     """
     Вспомогательный класс для работы с Excel-файлами.
@@ -61,68 +179,493 @@ class ExcelUtils:
     Содержит статические методы для проверки структуры данных в Excel-файлах.
     """
 
+    # Форматы дат при записи отчётов (как в выгрузках веб-системы)
+    DATE_FORMATS = {'datetime_format': 'DD.MM.YYYY HH:MM:SS', 'date_format': 'DD.MM.YYYY'}
+
+    @staticmethod
+    def excel_dates(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Готовит колонки дат к записи в Excel.
+
+        pandas записывает значения datetime64 в формате даты и времени. Колонки,
+        где у всех значений нет времени (например, 'Граничная дата гарантии'),
+        переводятся в даты, чтобы записаться в формате даты.
+
+        :param df: DataFrame для записи.
+        :return: DataFrame с датами без времени в колонках без времени.
+        """
+        date_columns = {}
+        for column in df.columns:
+            series = df[column]
+            if isinstance(series, pd.DataFrame) or not pd.api.types.is_datetime64_any_dtype(series.dtype):
+                continue
+            if (series.dropna() == series.dropna().dt.normalize()).all():
+                date_columns[column] = series.dt.date.where(series.notna(), None)
+        if not date_columns:
+            return df
+        return df.assign(**date_columns)
+
     @staticmethod
-    def _read_excel_with_merged_cells(file_path: str) -> pd.DataFrame:
+    def report_writer(output_file: str, constant_memory: bool | None = None) -> pd.ExcelWriter:
+        """
+        Открывает ExcelWriter (xlsxwriter) для записи отчёта.
+
+        В режиме `constant_memory` xlsxwriter сбрасывает каждую строку на диск, как только
+        начата запись следующей, поэтому память не растёт с размером листа. Записи в уже
+        сброшенные строки в этом режиме теряются: листы пишутся через `RowWriter` строго сверху вниз.
+
+        :param output_file: Путь к выходному Excel-файлу.
+        :param constant_memory: Включить режим `constant_memory`. По умолчанию — `XLSX_CONSTANT_MEMORY`.
+        :return: ExcelWriter с форматами дат `DATE_FORMATS`.
+        """
+        if constant_memory is None:
+            constant_memory = XLSX_CONSTANT_MEMORY
+        return pd.ExcelWriter(
+            output_file,
+            engine='xlsxwriter',
+            engine_kwargs={'options': {'constant_memory': constant_memory}},
+            **ExcelUtils.DATE_FORMATS,
+        )
+
+    @staticmethod
+    def select_reader(file_path: str | BinaryIO, engine: str | None = None) -> XlsxStreamReader | CalamineReader:
+        """
+        Выбирает читатель xlsx для файла.
+
+        В режиме `auto` лист без объединённых ячеек (ячеек с ошибками и явных пустых строк) читается
+        быстрым `CalamineReader`, остальные — `XlsxStreamReader`, который умеет
+        разворачивать объединённые диапазоны. Если python-calamine не установлен,
+        всегда используется `XlsxStreamReader`.
+
+        :param file_path: Путь к Excel-файлу или бинарный файловый объект.
+        :param engine: `auto`, `calamine` или `stream`. По умолчанию — `EXCEL_READER_ENGINE`.
+        :return: Читатель с методом `read_columns`.
+        :raises ValueError: Если указан неизвестный движок или calamine не установлен.
+        """
+        engine = engine or EXCEL_READER_ENGINE
+        if engine not in READER_ENGINES:
+            raise ValueError(f"Неизвестный движок чтения Excel: {engine}")
+
+        if engine == 'calamine':
+            if CalamineWorkbook is None:
+                raise ValueError("Движок calamine недоступен: не установлен python-calamine")
+            return CalamineReader(file_path)
+
+        stream_reader = XlsxStreamReader(file_path)
+        if engine == 'auto' and CalamineWorkbook is not None and not stream_reader.requires_stream_reader():
+            return CalamineReader(file_path)
+        return stream_reader
+
+    @staticmethod
+    def _read_excel_with_merged_cells(
+        file_path: str | BinaryIO,
+        columns: List[str] | None = None,
+        engine: str | None = None,
+    ) -> pd.DataFrame:
         """
         Читает первый лист Excel и разворачивает объединенные ячейки.
 
         Это позволяет сохранить визуальную структуру исходного файла:
         значения из верхней левой ячейки merged range копируются во все
         ячейки диапазона до преобразования в DataFrame.
+
+        Файл читается потоково через `XlsxStreamReader`, без построения
+        объектной модели openpyxl, поэтому память пропорциональна результату.
+        Листы без объединённых ячеек читаются быстрым `CalamineReader` (см. `select_reader`).
+
+        :param file_path: Путь к Excel-файлу.
+        :param columns: Если задан, читаются только колонки с этими заголовками,
+                        значения остальных колонок не декодируются.
+        :param engine: Движок чтения (`auto`, `calamine`, `stream`).
+        :return: DataFrame с данными первого листа.
+        """
+        reader = ExcelUtils.select_reader(file_path, engine)
+        arrays, merged_ranges = reader.read_columns(columns)
+        ExcelUtils.fill_merged_ranges(arrays, merged_ranges)
+        return XlsxStreamReader.build_frame(arrays)
+
+    @staticmethod
+    def fill_merged_ranges(
+        columns: List[np.ndarray],
+        merged_ranges: List[Tuple[int, int, int, int]],
+    ) -> None:
         """
-        workbook = load_workbook(filename=file_path, data_only=True)
-        worksheet = workbook.worksheets[0]
-        merged_values = {}
+        Заполняет объединённые диапазоны значением их верхней левой ячейки.
 
-        for merged_range in worksheet.merged_cells.ranges:
-            min_col, min_row, max_col, max_row = merged_range.bounds
-            top_left_value = worksheet.cell(row=min_row, column=min_col).value
+        Работает блочными присваиваниями по массивам колонок: диапазоны группируются
+        по целевой колонке, позиции всех покрытых строк строятся одним `np.repeat`,
+        и каждая колонка заполняется одной операцией. Массивы изменяются на месте.
 
-            for row_index in range(min_row, max_row + 1):
-                for column_index in range(min_col, max_col + 1):
-                    merged_values[(row_index, column_index)] = top_left_value
+        :param columns: Колонки листа одинаковой длины, индекс 0 — строка заголовка.
+                        Пропущенные при чтении колонки — None.
+        :type columns: List[np.ndarray | None]
+        :param merged_ranges: Диапазоны (min_col, min_row, max_col, max_row), нумерация с 1.
+        :type merged_ranges: List[Tuple[int, int, int, int]]
+        """
+        if not merged_ranges:
+            return
 
-        rows = []
-        for row in worksheet.iter_rows():
-            row_values = []
-            for cell in row:
-                row_values.append(merged_values.get((cell.row, cell.column), cell.value))
-            rows.append(tuple(row_values))
+        bounds = np.asarray(merged_ranges, dtype=np.int64) - 1
+        min_col, min_row, max_col, max_row = bounds.T
 
-        if not rows:
-            return pd.DataFrame()
+        # Значения верхних левых ячеек берём до любых записей
+        top_left = np.empty(len(bounds), dtype=object)
+        for column_index in np.unique(min_col):
+            mask = min_col == column_index
+            top_left[mask] = columns[column_index][min_row[mask]]
+
+        # Разворачиваем каждый диапазон на все колонки, которые он покрывает
+        widths = max_col - min_col + 1
+        range_ids = np.repeat(np.arange(len(bounds)), widths)
+        target_cols = min_col[range_ids] + ExcelUtils._offsets_within(widths)
 
-        header, *data_rows = rows
-        return pd.DataFrame(data_rows, columns=header)
+        for column_index in np.unique(target_cols):
+            # Пропущенные при чтении колонки не заполняем
+            if columns[column_index] is None:
+                continue
+            ids = range_ids[target_cols == column_index]
+            lengths = max_row[ids] - min_row[ids] + 1
+            positions = np.repeat(min_row[ids], lengths) + ExcelUtils._offsets_within(lengths)
+            columns[column_index][positions] = np.repeat(top_left[ids], lengths)
+
+    @staticmethod
+    def _offsets_within(lengths: np.ndarray) -> np.ndarray:
+        """
+        Для блоков заданной длины возвращает смещения внутри блока: [3, 2] -> [0, 1, 2, 0, 1].
+        """
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return np.arange(lengths.sum()) - starts
+
+    @staticmethod
+    def _normalize_columns(columns: Iterable[Any]) -> Set[str]:
+        """
+        Приводит названия колонок к виду для сравнения: без пробелов по краям и в нижнем регистре.
+        Пустые заголовки пропускаются.
+        """
+        return set(normalize_column_name(col) for col in columns if col is not None)
 
     @staticmethod
-    def check_excel_structure(file_path: str, columns: List[str]):
+    def _check_required_columns(actual_columns: Iterable[Any], columns: List[str]) -> None:
+        """
+        Проверяет, что среди колонок файла есть все требуемые.
+
+        :raises ValueError: Если каких-то колонок не хватает.
+        """
+        actual_set = ExcelUtils._normalize_columns(actual_columns)
+        required_set = ExcelUtils._normalize_columns(columns)
+
+        if not required_set.issubset(actual_set):
+            missing = required_set - actual_set
+            raise ValueError(f"Не хватает колонок: {missing}")
+
+    @staticmethod
+    def _check_archive_size(archive: zipfile.ZipFile) -> None:
+        """
+        Защищает от zip-бомб: проверяет распакованный размер и степень сжатия частей xlsx
+        по центральному каталогу архива, ничего не распаковывая.
+
+        :raises ValueError: Если архив превышает допустимые размеры.
+        """
+        total_size = 0
+        for info in archive.infolist():
+            total_size += info.file_size
+            if info.file_size >= XLSX_RATIO_CHECK_MIN_SIZE:
+                ratio = info.file_size / max(info.compress_size, 1)
+                if ratio > XLSX_MAX_COMPRESSION_RATIO:
+                    raise ValueError(
+                        f"Подозрительная степень сжатия части {info.filename}: {ratio:.0f}"
+                    )
+
+        if total_size > XLSX_MAX_UNCOMPRESSED_SIZE:
+            raise ValueError(
+                f"Файл слишком большой после распаковки: {total_size // (1024 * 1024)} МБ"
+            )
+
+    @staticmethod
+    def get_table_reader(file_path: str | BinaryIO) -> CsvReader | ParquetReader | None:
+        """
+        Возвращает читатель для CSV- и Parquet-файлов по расширению.
+
+        Для файлового объекта расширение берётся из имени загруженного файла
+        (`filename`, как у `UploadSpool`) или из `name`.
+
+        :param file_path: Путь к входному файлу или бинарный файловый объект.
+        :return: `CsvReader`, `ParquetReader` или None для xlsx.
+        """
+        if isinstance(file_path, str):
+            file_name = file_path
+        else:
+            file_name = getattr(file_path, 'filename', None) or getattr(file_path, 'name', '')
+        extension = os.path.splitext(str(file_name))[1].lower()
+        if extension == '.csv':
+            return CsvReader(file_path)
+        if extension == '.parquet':
+            return ParquetReader(file_path)
+        return None
+
+    @staticmethod
+    def read_input_file(
+        file_path: str | BinaryIO,
+        columns: List[str] | None = None,
+        engine: str | None = None,
+    ) -> pd.DataFrame:
+        """
+        Читает входной файл (xlsx, CSV или Parquet) в DataFrame.
+
+        :param file_path: Путь к входному файлу или бинарный файловый объект.
+        :param columns: Если задан, читаются только колонки с этими заголовками.
+        :param engine: Движок чтения xlsx (`auto`, `calamine`, `stream`).
+        :return: DataFrame с данными файла.
+        """
+        table_reader = ExcelUtils.get_table_reader(file_path)
+        if table_reader is not None:
+            return table_reader.read_frame(columns)
+        return ExcelUtils._read_excel_with_merged_cells(file_path, columns=columns, engine=engine)
+
+    @staticmethod
+    def iter_input_chunks(
+        file_path: str | BinaryIO,
+        columns: List[str],
+        chunk_rows: int,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Читает входной файл частями по `chunk_rows` строк.
+
+        CSV и Parquet читаются частями с диска, поэтому файл целиком в память не загружается.
+        xlsx частями не читается: объединённые ячейки перечислены в конце листа,
+        и без полного чтения их значения не восстановить. Каждая часть проверяется
+        на наличие требуемых колонок.
+
+        :param file_path: Путь к входному файлу или бинарный файловый объект.
+        :param columns: Требуемые колонки.
+        :param chunk_rows: Число строк в части.
+        :return: Части файла в виде DataFrame.
+        :raises ValueError: Если файл не CSV и не Parquet, в нём не хватает колонок
+            или произошла ошибка чтения.
+        """
+        table_reader = ExcelUtils.get_table_reader(file_path)
+        if table_reader is None:
+            raise ValueError("Чтение частями поддерживается только для CSV и Parquet")
+
+        try:
+            for frame in table_reader.iter_frames(columns, chunk_rows):
+                ExcelUtils._check_required_columns(frame.columns, columns)
+                yield frame
+        except Exception as e:
+            raise ValueError(f"Ошибка при чтении файла: {str(e)}")
+
+    @staticmethod
+    def preflight_excel_structure(file_path: str | BinaryIO, columns: List[str]) -> None:
+        """
+        Быстрая предварительная проверка входного файла без полного разбора.
+
+        Для xlsx читает только центральный каталог архива, размер листа из `<dimension>`
+        и строку заголовка. Проверяет степень сжатия, размер листа и наличие
+        требуемых колонок, поэтому неподходящий файл отклоняется до выделения
+        памяти под данные. Для CSV проверяется строка заголовка, для Parquet —
+        схема и число строк из метаданных.
+
+        :param file_path: Путь к Excel-файлу или бинарный файловый объект.
+        :type file_path: str | BinaryIO
+        :param columns: Список ожидаемых колонок (регистр не важен).
+        :type columns: List[str]
+        :raises ValueError: Если файл не проходит одну из проверок.
+        """
+        reader = ExcelUtils.get_table_reader(file_path)
+        if reader is None:
+            with zipfile.ZipFile(file_path) as archive:
+                ExcelUtils._check_archive_size(archive)
+            reader = XlsxStreamReader(file_path)
+
+        header, dimension = reader.read_header()
+
+        if dimension is not None:
+            rows, cols = dimension
+            if rows > XLSX_MAX_ROWS or rows * cols > XLSX_MAX_CELLS:
+                raise ValueError(f"Лист слишком большой: {rows} строк, {cols} колонок")
+
+        ExcelUtils._check_required_columns(header, columns)
+
+    @staticmethod
+    def check_excel_structure(
+        file_path: str | BinaryIO,
+        columns: List[str],
+        preflight: bool = True,
+        dtypes: Dict[str, str] | None = None,
+        engine: str | None = None,
+        content_hash: str | None = None,
+    ):
         """
         Проверяет, содержит ли Excel-файл указанные колонки.
 
+        Кроме xlsx принимаются CSV и Parquet (по расширению файла), результат для них
+        такой же: DataFrame с требуемыми колонками.
         Метод считывает файл и сравнивает набор требуемых колонок с теми, что присутствуют в файле.
         Если какие-либо из требуемых колонок отсутствуют, генерируется исключение `ValueError`.
+        Перед полным чтением выполняется `preflight_excel_structure`, чтобы неподходящие
+        файлы отклонялись по заголовку, без разбора всего листа. Из файла читаются
+        только требуемые колонки, остальные не декодируются.
 
-        :param file_path: Путь к Excel-файлу.
-        :type file_path: str
+        Если настроен `ParseCache`, результат ищется в кэше по хешу содержимого файла
+        и списку колонок; при попадании файл не разбирается вовсе. В кэше хранится
+        DataFrame до приведения типов, типы из `dtypes` применяются к результату
+        `DataFrameUtils.apply_column_dtypes`.
+
+        Вместо пути можно передать файловый объект (например, `UploadSpool` из памяти),
+        тогда файл разбирается без обращения к диску.
+
+        :param file_path: Путь к Excel-файлу или бинарный файловый объект.
+        :type file_path: str | BinaryIO
         :param columns: Список ожидаемых колонок (регистр не важен).
         :type columns: List[str]
-        :return: DataFrame, считанный из файла.
+        :param preflight: Выполнять ли предварительную проверку заголовка и размеров.
+        :type preflight: bool
+        :param dtypes: Типы колонок из конфига (`column_dtypes`).
+        :type dtypes: Dict[str, str] | None
+        :param engine: Движок чтения (`auto`, `calamine`, `stream`), по умолчанию `EXCEL_READER_ENGINE`.
+        :type engine: str | None
+        :param content_hash: SHA-256 содержимого, если он уже известен (см. `Utils.get_content_hash`).
+        :type content_hash: str | None
+        :return: DataFrame с требуемыми колонками, считанный из файла.
         :rtype: pandas.DataFrame
         :raises ValueError: Если файл содержит недостающие колонки или произошла ошибка чтения.
         """
         try:
-            df = ExcelUtils._read_excel_with_merged_cells(file_path)
-            actual_columns = set(col.strip().lower() for col in df.columns)
-            required_set = set(col.strip().lower() for col in columns)
+            cache = ParseCache.from_env()
+            if cache is not None:
+                cache_key = ParseCache.make_key(content_hash or ParseCache.file_hash(file_path), columns)
+                cached_df = cache.get(cache_key)
+                if cached_df is not None:
+                    return DataFrameUtils.apply_column_dtypes(cached_df, dtypes)
 
-            if not required_set.issubset(actual_columns):
-                missing = required_set - actual_columns
-                raise ValueError(f"Не хватает колонок: {missing}")
-            return df
+            if preflight:
+                ExcelUtils.preflight_excel_structure(file_path, columns)
+
+            df = ExcelUtils.read_input_file(file_path, columns=columns or None, engine=engine)
+            ExcelUtils._check_required_columns(df.columns, columns)
+
+            if cache is not None:
+                cache.put(cache_key, df)
+            return DataFrameUtils.apply_column_dtypes(df, dtypes)
         except Exception as e:
             raise ValueError(f"Ошибка при чтении файла: {str(e)}")
     
+    @staticmethod
+    def _get_parse_pool() -> ProcessPoolExecutor:
+        """
+        Возвращает общий пул процессов для разбора файлов, создавая его при первом вызове.
+
+        Пул создаётся в том процессе, который его использует: пул, унаследованный
+        при форке (например, воркером gunicorn от мастера), не используется.
+        Процессы пула запускаются через forkserver (spawn, где его нет): воркер работает
+        в нескольких потоках, а форк многопоточного процесса может зависнуть на блокировке,
+        которую в момент форка держал другой поток (логирование, аллокатор, pyarrow).
+
+        :return: Пул процессов.
+        :rtype: ProcessPoolExecutor
+        """
+        global _parse_pool, _parse_pool_pid
+        with _parse_pool_lock:
+            if _parse_pool is None or _parse_pool_pid != os.getpid():
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                _parse_pool = ProcessPoolExecutor(
+                    max_workers=PARSE_WORKERS,
+                    mp_context=multiprocessing.get_context(start_method),
+                )
+                _parse_pool_pid = os.getpid()
+            return _parse_pool
+
+    @staticmethod
+    def _reset_parse_pool() -> None:
+        """
+        Сбрасывает пул процессов, например после аварийного завершения одного из процессов.
+        """
+        global _parse_pool
+        with _parse_pool_lock:
+            if _parse_pool is not None and _parse_pool_pid == os.getpid():
+                _parse_pool.shutdown(wait=False, cancel_futures=True)
+            _parse_pool = None
+
+    @staticmethod
+    def iter_excel_structures(jobs: List[Dict[str, Any]]) -> Iterator[pd.DataFrame]:
+        """
+        Выполняет `check_excel_structure` для нескольких независимых файлов параллельно
+        и отдаёт результаты по одному.
+
+        Разбор xlsx упирается в процессор и держит GIL, поэтому файлы разбираются
+        в пуле процессов (`PARSE_WORKERS`). Одновременно разбирается не больше
+        `PARSE_WORKERS` файлов: следующий файл отправляется в пул, когда забирают
+        результат предыдущего, так что в памяти не копятся все DataFrame сразу.
+        Результаты отдаются в порядке `jobs`. Ошибки поднимаются так же, как при
+        последовательной проверке: первой — ошибка файла, стоящего в списке раньше;
+        оставшиеся задачи при этом отменяются.
+
+        Файлы, переданные потоком из памяти, разбираются в текущем процессе: они
+        небольшие, а передача в пул означала бы копирование содержимого.
+
+        :param jobs: Список аргументов `check_excel_structure` для каждого файла.
+        :type jobs: List[Dict[str, Any]]
+        :return: Итератор DataFrame в порядке `jobs`.
+        :rtype: Iterator[pandas.DataFrame]
+        :raises ValueError: Если файл содержит недостающие колонки или произошла ошибка чтения.
+        """
+        disk_jobs = sum(isinstance(job['file_path'], str) for job in jobs)
+        if PARSE_WORKERS <= 1 or disk_jobs <= 1:
+            for job in jobs:
+                yield ExcelUtils.check_excel_structure(**job)
+            return
+
+        pool = ExcelUtils._get_parse_pool()
+        waiting_jobs = iter(jobs)
+        pending = deque(
+            ExcelUtils._submit_parse_job(pool, job)
+            for job in islice(waiting_jobs, PARSE_WORKERS)
+        )
+        try:
+            while pending:
+                result = pending.popleft().result()
+                next_job = next(waiting_jobs, None)
+                if next_job is not None:
+                    pending.append(ExcelUtils._submit_parse_job(pool, next_job))
+                yield result
+        except BrokenProcessPool as e:
+            ExcelUtils._reset_parse_pool()
+            raise ValueError(f"Ошибка при чтении файла: {str(e)}")
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def _submit_parse_job(pool: ProcessPoolExecutor, job: Dict[str, Any]) -> Future:
+        """
+        Отправляет разбор файла в пул, а файл из памяти разбирает сразу в текущем процессе.
+
+        :return: Future с результатом `check_excel_structure`.
+        """
+        if isinstance(job['file_path'], str):
+            return pool.submit(ExcelUtils.check_excel_structure, **job)
+        future = Future()
+        try:
+            future.set_result(ExcelUtils.check_excel_structure(**job))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    @staticmethod
+    def check_excel_structures(jobs: List[Dict[str, Any]]) -> List[pd.DataFrame]:
+        """
+        Выполняет `check_excel_structure` для нескольких независимых файлов параллельно.
+
+        См. `iter_excel_structures`.
+
+        :param jobs: Список аргументов `check_excel_structure` для каждого файла.
+        :type jobs: List[Dict[str, Any]]
+        :return: Список DataFrame в порядке `jobs`.
+        :rtype: List[pandas.DataFrame]
+        :raises ValueError: Если файл содержит недостающие колонки или произошла ошибка чтения.
+        """
+        return list(ExcelUtils.iter_excel_structures(jobs))
+
     @staticmethod
     def get_cell_color(value: str) -> str:
         """
@@ -145,8 +688,497 @@ class ExcelUtils:
         return hex_color
 
 
+class RowWriter:
+    """
+    Запись листов отчёта строго сверху вниз.
+
+    `DataFrame.to_excel` записывает ячейки по колонкам, поэтому в режиме `constant_memory`
+    xlsxwriter теряет всё, кроме последней строки таблицы. RowWriter записывает таблицы
+    по строкам: формат строки задаётся до её ячеек, а значения приводятся так же, как
+    в `to_excel` (пропуски не записываются, даты — в форматах ExcelWriter). Лист получается
+    одинаковым с `constant_memory` и без него.
+    """
+
+    # Формат заголовков таблицы, как у `to_excel`
+    HEADER_FORMAT = {'bold': True, 'align': 'center', 'valign': 'top', 'top': 1, 'right': 1, 'bottom': 1, 'left': 1}
+
+    def __init__(self, writer: pd.ExcelWriter):
+        """
+        :param writer: ExcelWriter отчёта (xlsxwriter), например из `ExcelUtils.report_writer`.
+        """
+        self.writer = writer
+        self.book = writer.book
+        self._formats = {}
+
+    def add_format(self, properties: Dict[str, Any]):
+        """
+        Возвращает формат xlsxwriter с указанными свойствами, одинаковые форматы создаются один раз.
+
+        :param properties: Свойства формата.
+        :return: Формат xlsxwriter.
+        """
+        key = tuple(sorted(properties.items()))
+        if key not in self._formats:
+            self._formats[key] = self.book.add_format(properties)
+        return self._formats[key]
+
+    def sheet(self, sheet_name: str):
+        """
+        Возвращает лист отчёта, создавая его при первом обращении.
+
+        :param sheet_name: Название листа.
+        :return: Лист xlsxwriter.
+        """
+        worksheet = self.writer.sheets.get(sheet_name)
+        if worksheet is None:
+            worksheet = self.book.add_worksheet(sheet_name)
+        return worksheet
+
+    def cell_value(self, value: Any) -> Tuple[Any, str | None]:
+        """
+        Приводит значение к записи в ячейку так же, как `to_excel`.
+
+        :param value: Значение из DataFrame.
+        :return: Значение (None для пропуска) и числовой формат ячейки или None.
+        :raises ValueError: Если дата с часовым поясом (Excel их не поддерживает).
+        """
+        if pd.api.types.is_scalar(value) and pd.isna(value):
+            return None, None
+        if getattr(value, 'tzinfo', None) is not None:
+            raise ValueError("Excel не поддерживает даты с часовым поясом")
+        if isinstance(value, (bool, np.bool_)):
+            return bool(value), None
+        if isinstance(value, (int, np.integer)):
+            return int(value), None
+        if isinstance(value, (float, np.floating)):
+            if np.isinf(value):
+                return 'inf' if value > 0 else '-inf', None
+            return float(value), None
+        if isinstance(value, datetime.datetime):
+            return value, self.writer.datetime_format
+        if isinstance(value, datetime.date):
+            return value, self.writer.date_format
+        if isinstance(value, datetime.timedelta):
+            return value.total_seconds() / 86400, '0'
+        return str(value), None
+
+    def write_cell(self, worksheet, row: int, col: int, value: Any, cell_format=None) -> None:
+        """
+        Записывает значение в ячейку.
+
+        Пропуск записывается пустой ячейкой, только если указан формат. Ячейка без формата
+        получает формат строки (`set_row`), дата без формата — числовой формат даты.
+
+        :param worksheet: Лист xlsxwriter.
+        :param row: Номер строки.
+        :param col: Номер колонки.
+        :param value: Значение из DataFrame.
+        :param cell_format: Формат ячейки.
+        """
+        value, num_format = self.cell_value(value)
+        if value is None:
+            if cell_format is not None:
+                worksheet.write_blank(row, col, None, cell_format)
+            return
+        if cell_format is None and num_format is not None:
+            cell_format = self.add_format({'num_format': num_format})
+        if cell_format is None:
+            worksheet.write(row, col, value)
+        else:
+            worksheet.write(row, col, value, cell_format)
+
+    @staticmethod
+    def rows(df: pd.DataFrame) -> Iterator[Tuple[Any, ...]]:
+        """
+        Перебирает строки DataFrame, не создавая Series для каждой строки.
+
+        :param df: DataFrame.
+        :return: Итератор кортежей значений строк.
+        """
+        return zip(*(df.iloc[:, i].to_numpy(dtype=object) for i in range(df.shape[1])))
+
+    def write_frame(
+        self,
+        sheet_name: str,
+        df: pd.DataFrame,
+        startrow: int = 0,
+        header: bool = True,
+        header_format=None,
+        row_format=None,
+        column_formats: Dict[int, Any] | None = None,
+    ) -> int:
+        """
+        Записывает DataFrame на лист по строкам, как `to_excel(index=False)`.
+
+        :param sheet_name: Название листа.
+        :param df: DataFrame для записи (даты готовит `ExcelUtils.excel_dates`).
+        :param startrow: Строка заголовка (или первой строки данных без заголовка).
+        :param header: Записывать ли заголовок.
+        :param header_format: Формат заголовка. По умолчанию — `HEADER_FORMAT`.
+        :param row_format: Формат строк данных (`set_row`).
+        :param column_formats: Словарь {номер колонки: функция значение -> формат ячейки}.
+        :return: Номер строки после таблицы.
+        """
+        worksheet = self.sheet(sheet_name)
+        row = startrow
+        if header:
+            if header_format is None:
+                header_format = self.add_format(self.HEADER_FORMAT)
+            for col, value in enumerate(df.columns):
+                self.write_cell(worksheet, row, col, value, header_format)
+            row += 1
+
+        column_formats = column_formats or {}
+        for values in self.rows(ExcelUtils.excel_dates(df)):
+            if row_format is not None:
+                worksheet.set_row(row, None, row_format)
+            for col, value in enumerate(values):
+                cell_format = column_formats.get(col)
+                self.write_cell(worksheet, row, col, value, cell_format(value) if cell_format else None)
+            row += 1
+        return row
+
+
 class DataFrameUtils:
 
+    # Типы колонок, которые можно задать в `column_dtypes` конфига
+    COLUMN_DTYPES = ('category', 'numeric', 'datetime', 'string')
+    # Разделители разрядов в числах из выгрузок (пробел, неразрывные пробелы)
+    NUMBER_SPACES = '[\\s\u00a0\u202f]'
+
+    # Строковый тип pandas в Arrow
+    ARROW_STRING_DTYPE = pd.StringDtype('pyarrow')
+
+    @staticmethod
+    def apply_column_dtypes(
+        df: pd.DataFrame,
+        column_dtypes: Dict[str, str] | None,
+        arrow_strings: bool | None = None,
+    ) -> pd.DataFrame:
+        """
+        Приводит колонки DataFrame к типам, заданным в конфиге.
+
+        Поддерживаемые типы:
+        - `category` — повторяющиеся значения хранятся как коды, память и группировки
+          зависят от числа различных значений, а не от числа строк;
+        - `numeric` — числа (`parse_numbers`: пробелы между разрядами, десятичная запятая),
+          нечисловые значения заменяются на NaN;
+        - `datetime` — дата и время (день идёт первым), нераспознанные значения заменяются на NaT.
+          Формат можно указать после двоеточия (`datetime:%d.%m.%Y`), тогда колонка
+          разбирается по нему без угадывания формата каждого значения (`parse_datetimes`);
+        - `string` — строковый тип pandas.
+
+        Колонки сопоставляются без учёта регистра и пробелов по краям, отсутствующие
+        колонки пропускаются. Колонки без единого значения в `category` не переводятся:
+        у такой категории нет строковых значений и `.str` на ней недоступен.
+        Преобразования `category` и `string` выполняются одним вызовом `DataFrame.astype`.
+
+        В режиме Arrow-строк (`arrow_strings`, по умолчанию `ARROW_STRINGS`) тип `string`
+        хранится в Arrow, а остальные колонки из одних строк (без типа в конфиге)
+        переводятся в `string[pyarrow]`. Колонки со значениями разных типов
+        (например, номера тракторов из чисел и строк) остаются object.
+
+        :param df: Исходный DataFrame.
+        :param column_dtypes: Словарь {название колонки: тип}.
+        :param arrow_strings: Переводить ли строковые колонки в `string[pyarrow]`.
+        :return: Новый DataFrame с приведёнными типами.
+        :raises ValueError: Если указан неизвестный тип.
+        """
+        if arrow_strings is None:
+            arrow_strings = ARROW_STRINGS
+        if not column_dtypes and not arrow_strings:
+            return df
+        column_dtypes = column_dtypes or {}
+        string_dtype = DataFrameUtils.ARROW_STRING_DTYPE if arrow_strings else 'string'
+
+        dtype_by_name = {}
+        for name, dtype in column_dtypes.items():
+            if dtype.partition(':')[0] not in DataFrameUtils.COLUMN_DTYPES:
+                raise ValueError(f"Неизвестный тип колонки {name}: {dtype}")
+            dtype_by_name[normalize_column_name(name)] = dtype
+
+        astype_map = {}
+        converted = {}
+        for column in df.columns:
+            dtype = dtype_by_name.get(normalize_column_name(column))
+            if isinstance(df[column], pd.DataFrame):
+                continue
+            series = df[column]
+            dtype_format = None
+            if dtype is not None:
+                dtype, _, dtype_format = dtype.partition(':')
+            if dtype is None:
+                if arrow_strings and series.dtype == object and pd.api.types.infer_dtype(series) == 'string':
+                    astype_map[column] = string_dtype
+            elif dtype == 'category':
+                if series.notna().any():
+                    astype_map[column] = 'category'
+            elif dtype == 'string':
+                astype_map[column] = string_dtype
+            elif dtype == 'numeric':
+                converted[column] = DataFrameUtils.parse_numbers(series)
+            elif dtype == 'datetime':
+                converted[column] = DataFrameUtils.parse_datetimes(series, dtype_format or None)
+
+        if astype_map:
+            df = df.astype(astype_map)
+        if converted:
+            df = df.assign(**converted)
+        return df
+
+    @staticmethod
+    def parse_numbers(series: pd.Series, pattern: str | None = None) -> pd.Series:
+        """
+        Разбирает числа в колонке со значениями разных типов.
+
+        Числовые значения берутся как есть. В строках убираются пробелы между
+        разрядами и десятичная запятая заменяется точкой (`1 595,5` — 1595.5).
+        Если задан `pattern`, число берётся из первой группы регулярного выражения
+        (например, `(\\d+)` для `3000 м/ч`). Все шаги выполняются методами `.str`
+        для всей колонки, у категорий разбираются только различные значения.
+
+        :param series: Колонка DataFrame.
+        :param pattern: Регулярное выражение с группой, из которой берётся число.
+        :return: Числа (float), нераспознанные значения — NaN.
+        """
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            numbers = DataFrameUtils.parse_numbers(pd.Series(series.cat.categories), pattern).to_numpy()
+            # Код -1 пропуска указывает на добавленный в конец NaN
+            return pd.Series(np.append(numbers, np.nan)[series.cat.codes.to_numpy()], index=series.index)
+        if pd.api.types.is_numeric_dtype(series.dtype) and pattern is None:
+            return pd.to_numeric(series, errors='coerce')
+
+        numbers = pd.to_numeric(series, errors='coerce')
+        try:
+            if pattern is not None:
+                text = series.str.extract(pattern, expand=False)
+            else:
+                text = series.str.replace(DataFrameUtils.NUMBER_SPACES, '', regex=True).str.replace(',', '.', regex=False)
+        except AttributeError:
+            # В колонке нет строк
+            return numbers.astype(float)
+        parsed = pd.to_numeric(text, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        numbers = numbers.to_numpy(dtype=float, na_value=np.nan)
+        return pd.Series(np.where(np.isnan(parsed), numbers, parsed), index=series.index)
+
+    @staticmethod
+    def parse_datetimes(series: pd.Series, date_format: str | None = None) -> pd.Series:
+        """
+        Разбирает дату и время.
+
+        С форматом (`%d.%m.%Y %H:%M:%S`) колонка разбирается по нему векторно. Значения
+        в другом формате (обычно их нет) разбираются общим разборщиком с днём впереди,
+        чтобы не пропасть из отчёта. Без формата общим разборщиком разбирается вся колонка.
+
+        :param series: Колонка DataFrame.
+        :param date_format: Формат `strftime`.
+        :return: Колонка datetime64, нераспознанные значения — NaT.
+        """
+        if date_format is None:
+            return pd.to_datetime(series, errors='coerce', dayfirst=True)
+
+        parsed = pd.to_datetime(series, format=date_format, errors='coerce')
+        failed = (parsed.isna() & series.notna()).to_numpy()
+        if failed.any():
+            parsed[failed] = pd.to_datetime(series[failed], errors='coerce', dayfirst=True)
+        return parsed
+
+    @staticmethod
+    def startswith_mask(series: pd.Series, prefix: str) -> np.ndarray:
+        """
+        Возвращает маску значений, строковое представление которых начинается с `prefix`.
+
+        Результат совпадает с `series.map(lambda x: str(x).startswith(prefix))`,
+        но для строковых колонок проверка выполняется методом `.str.startswith`
+        без вызова Python-функции на каждую строку. Пропуски и нестроковые значения
+        в маску не попадают.
+
+        :param series: Колонка DataFrame.
+        :param prefix: Искомое начало строки.
+        :return: Булев массив длины `series`.
+        :rtype: np.ndarray
+        """
+        try:
+            mask = series.str.startswith(prefix, na=False)
+        except AttributeError:
+            # В колонке нет строк (например, только пропуски или числа)
+            mask = series.astype(str).str.startswith(prefix)
+        return mask.to_numpy(dtype=bool)
+
+    @staticmethod
+    def explode_split(
+        df: pd.DataFrame,
+        delimiters: Dict[str, str],
+        drop_blank: Iterable[str] = (),
+    ) -> pd.DataFrame:
+        """
+        Разбивает значения нескольких колонок по разделителям и разворачивает их в строки за один проход.
+
+        Результат совпадает с последовательными `.assign(col=df[col].str.split(sep)).explode(col)`
+        в порядке `delimiters`: строка размножается на все сочетания частей. Вместо
+        промежуточного DataFrame после каждого `explode` позиции строк результата
+        считаются один раз, и каждая колонка собирается одним `take`.
+
+        Для колонок из `drop_blank` у частей обрезаются пробелы по краям, а пустые
+        и пропущенные части отбрасываются (строка без непустых частей не попадает
+        в результат). Пропуск в остальных колонках остаётся одной строкой с пропуском,
+        как в `explode`.
+
+        :param df: Исходный DataFrame.
+        :param delimiters: Словарь {колонка: разделитель}, разделитель — как в `Series.str.split`.
+        :param drop_blank: Колонки, в которых пустые части отбрасываются.
+        :return: Новый DataFrame; индекс исходных строк повторяется, как после `explode`.
+        :rtype: pd.DataFrame
+        """
+        drop_blank = set(drop_blank)
+        row_count = len(df)
+        parts = {}
+        counts = {}
+        for column, delimiter in delimiters.items():
+            series = df[column]
+            if isinstance(series.dtype, pd.CategoricalDtype) and isinstance(series.cat.categories.dtype, pd.StringDtype):
+                # У категорий из `string[pyarrow]` `.str.split` возвращает списки строками
+                series = series.astype(series.cat.categories.dtype)
+            try:
+                split = series.str.split(delimiter)
+            except AttributeError:
+                # В колонке нет строк: как и нестроковые значения при `.str.split`, это пропуски
+                split = pd.Series(np.nan, index=df.index, dtype=object)
+            flat = split.reset_index(drop=True).explode()
+            if column in drop_blank:
+                flat = flat.str.strip() if flat.notna().any() else flat
+                flat = flat[flat.notna() & (flat != '')]
+            parts[column] = flat.to_numpy(dtype=object)
+            counts[column] = np.bincount(flat.index.to_numpy(dtype=np.int64), minlength=row_count)
+
+        # Число строк результата для каждой исходной строки — произведение числа частей
+        totals = np.ones(row_count, dtype=np.int64)
+        for column_counts in counts.values():
+            totals *= column_counts
+        rows = np.repeat(np.arange(row_count), totals)
+        offsets = ExcelUtils._offsets_within(totals)
+
+        # Номер части каждой колонки: смешанная система счисления, последняя колонка меняется быстрее
+        exploded = {}
+        inner = np.ones(row_count, dtype=np.int64)
+        for column in reversed(list(delimiters)):
+            column_counts = counts[column]
+            starts = np.cumsum(column_counts) - column_counts
+            part_index = (offsets // inner[rows]) % np.maximum(column_counts[rows], 1)
+            exploded[column] = parts[column][starts[rows] + part_index]
+            inner *= column_counts
+
+        result = df.take(rows)
+        for column, values in exploded.items():
+            result[column] = DataFrameUtils.restore_string_dtype(values, df[column].dtype)
+        return result
+
+    @staticmethod
+    def restore_string_dtype(values: np.ndarray, dtype: Any) -> np.ndarray | pd.api.extensions.ExtensionArray:
+        """
+        Возвращает части строк, собранные в object-массив, в строковый тип исходной колонки.
+
+        Так колонки `string[pyarrow]` (и категории из таких строк) остаются в Arrow
+        после разбивки. Для остальных типов массив возвращается как есть.
+
+        :param values: Значения колонки после разбивки.
+        :param dtype: Тип исходной колонки.
+        :return: Массив для записи в колонку.
+        """
+        if isinstance(dtype, pd.CategoricalDtype):
+            dtype = dtype.categories.dtype
+        if isinstance(dtype, pd.StringDtype):
+            return pd.array(values, dtype=dtype)
+        return values
+
+    @staticmethod
+    def union_unique_rows(
+        frames: Iterable[pd.DataFrame],
+        block_column: str | None = None,
+    ) -> pd.DataFrame:
+        """
+        Объединяет DataFrame из нескольких выгрузок, отбрасывая повторяющиеся записи.
+
+        Выгрузки обрабатываются по одной: для каждой считается векторный хеш строк
+        (`pandas.util.hash_pandas_object`), в результат попадают только записи,
+        хешей которых ещё не было. Поэтому память пропорциональна числу уникальных
+        записей, а не сумме размеров всех выгрузок.
+
+        Если задан `block_column`, запись — это строка с заполненной колонкой
+        `block_column` вместе со следующими за ней строками, где она пуста
+        (так в выгрузке веб-системы под трактором идут строки его обращений).
+        Блок отбрасывается только целиком, чтобы строки-продолжения не оторвались
+        от своей записи. Хеш блока учитывает хеши и порядок его строк.
+
+        :param frames: DataFrame выгрузок с одинаковым набором колонок.
+        :type frames: Iterable[pd.DataFrame]
+        :param block_column: Колонка, с которой начинается новая запись.
+        :type block_column: str | None
+        :return: Объединённый DataFrame без повторов.
+        :rtype: pd.DataFrame
+        :raises ValueError: Если наборы колонок выгрузок различаются.
+        """
+        columns = None
+        seen_hashes = np.empty(0, dtype=np.uint64)
+        parts = []
+
+        for df in frames:
+            if columns is None:
+                columns = list(df.columns)
+            elif list(df.columns) != columns:
+                if set(df.columns) != set(columns):
+                    raise ValueError(f"Колонки выгрузок не совпадают: {list(df.columns)} и {columns}")
+                df = df[columns]
+            if df.empty:
+                parts.append(df)
+                continue
+
+            row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+            if block_column is not None:
+                block_ids = np.cumsum(df[block_column].notna().to_numpy())
+                block_index = block_ids - block_ids[0]
+                block_starts = np.flatnonzero(np.diff(block_ids, prepend=-1))
+                # Позиция строки внутри блока, чтобы хеш зависел от порядка строк
+                positions = np.arange(len(df)) - block_starts[block_index]
+                weighted = row_hashes * (positions.astype(np.uint64) * np.uint64(2) + np.uint64(1))
+                block_hashes = np.add.reduceat(weighted, block_starts)
+            else:
+                block_index = np.arange(len(df))
+                block_hashes = row_hashes
+
+            new_blocks = ~np.isin(block_hashes, seen_hashes) & ~pd.Series(block_hashes).duplicated().to_numpy()
+            seen_hashes = np.concatenate([seen_hashes, block_hashes[new_blocks]])
+            parts.append(df[new_blocks[block_index]])
+
+        if not parts:
+            return pd.DataFrame()
+        return pd.concat(parts, ignore_index=True)
+
+    @staticmethod
+    def group_fingerprints(row_hashes: np.ndarray, group_codes: np.ndarray, group_count: int) -> np.ndarray:
+        """
+        Считает отпечаток строк каждой группы с учётом их порядка.
+
+        Хеш строки умножается на нечётный вес по позиции строки в группе и суммируется
+        (как хеш блока в `union_unique_rows`). Строки с кодом группы -1 не учитываются.
+
+        :param row_hashes: Хеши строк (`pandas.util.hash_pandas_object`).
+        :type row_hashes: np.ndarray
+        :param group_codes: Код группы каждой строки.
+        :type group_codes: np.ndarray
+        :param group_count: Число групп.
+        :type group_count: int
+        :return: Отпечаток каждой группы (0 — у пустой группы).
+        :rtype: np.ndarray
+        """
+        fingerprints = np.zeros(group_count, dtype=np.uint64)
+        valid = group_codes >= 0
+        codes = group_codes[valid]
+        positions = pd.Series(codes).groupby(codes).cumcount().to_numpy()
+        weighted = row_hashes[valid] * (positions.astype(np.uint64) * np.uint64(2) + np.uint64(1))
+        np.add.at(fingerprints, codes, weighted)
+        return fingerprints
+
     @staticmethod
     def reformat_dataframe(df: pd.DataFrame, column_map: Dict[str, List[Any]]) -> pd.DataFrame:
         """
@@ -172,4 +1204,271 @@ class DataFrameUtils:
         new_columns_order = [k for k, _ in sorted(column_map.items(), key=lambda x: x[1][0])]
 
         # Возвращаем DataFrame только с нужными колонками в правильном порядке
-        return df_filtered[new_columns_order]
\ No newline at end of file
+        return df_filtered[new_columns_order]
+
+class JoinKeyIndex:
+    """
+    Общий индекс ключей объединения задач Битрикс и опытных узлов веб-системы.
+
+    Ключ нормализуется так же, как при поиске конфликтов: значение приводится к строке,
+    пробелы по краям обрезаются, пустые строки и пропуски ключами не считаются.
+    Ключи обеих сторон кодируются словарём в целые коды: сначала колонки
+    факторизуются как есть, затем нормализуются только их различные значения.
+    Объединение, поиск записей без пары и подсчёт различных значений
+    выполняются по кодам, без повторного хеширования строк.
+
+    :param left: Ключи левой стороны (названия задач Битрикс).
+    :type left: pd.Series
+    :param right: Ключи правой стороны (опытные узлы веб-системы).
+    :type right: pd.Series
+    """
+
+    # Значения, которые после нормализации не считаются ключом
+    INVALID_KEYS = ('', 'nan')
+
+    def __init__(self, left: pd.Series, right: pd.Series):
+        """
+        Строит коды ключей обеих сторон.
+
+        :param left: Ключи левой стороны.
+        :param right: Ключи правой стороны.
+        """
+        if isinstance(left.dtype, pd.StringDtype) and left.dtype == right.dtype:
+            # Обе стороны в `string[pyarrow]`: factorize выполняется в Arrow
+            values = pd.concat([left, right], ignore_index=True)
+        else:
+            values = pd.concat([left.astype(object), right.astype(object)], ignore_index=True)
+        raw_codes, normalized = self._normalize_values(values)
+        unique_codes, self.keys = pd.factorize(normalized)
+
+        # Пропуски и недопустимые ключи получают код -1
+        unique_codes = np.where(np.isin(self.keys, self.INVALID_KEYS)[unique_codes], -1, unique_codes)
+        # Код -1 пропуска после factorize указывает на добавленный в конец -1
+        codes = np.append(unique_codes, -1).astype(np.int64)[raw_codes]
+
+        self.left_codes = codes[:len(left)]
+        self.right_codes = codes[len(left):]
+        self.in_left = self._presence(self.left_codes)
+        self.in_right = self._presence(self.right_codes)
+
+    @staticmethod
+    def _normalize_values(values: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+        """
+        Факторизует значения и нормализует только различные из них.
+
+        :return: Коды значений (-1 — пропуск) и нормализованные различные значения.
+        """
+        if not isinstance(values.dtype, pd.StringDtype):
+            values = values.astype(object)
+        raw_codes, raw_uniques = pd.factorize(values)
+        return raw_codes, pd.Index(raw_uniques, dtype=object).astype(str).str.strip()
+
+    def encode(self, values: pd.Series) -> np.ndarray:
+        """
+        Кодирует новые значения ключей словарём индекса (например, часть выгрузки,
+        прочитанную после построения индекса).
+
+        :param values: Значения ключей.
+        :return: Коды ключей: -1 — не ключ, -2 — ключ, которого нет в словаре.
+        """
+        raw_codes, normalized = self._normalize_values(values)
+        unique_codes = pd.Index(self.keys).get_indexer(normalized)
+        unique_codes = np.where(unique_codes >= 0, unique_codes, -2)
+        unique_codes[normalized.isin(self.INVALID_KEYS)] = -1
+        return np.append(unique_codes, -1).astype(np.int64)[raw_codes]
+
+    def _presence(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Возвращает булев массив по всем ключам: встречается ли ключ среди `codes`.
+        """
+        presence = np.zeros(len(self.keys), dtype=bool)
+        presence[codes[codes >= 0]] = True
+        return presence
+
+    def join_codes(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Возвращает коды для объединения левой и правой стороны.
+
+        Строки без ключа получают разные отрицательные коды на разных сторонах,
+        поэтому между собой не объединяются.
+
+        :return: Коды левой и правой стороны.
+        """
+        return self.left_codes, np.where(self.right_codes >= 0, self.right_codes, -2)
+
+    def left_only(self) -> np.ndarray:
+        """
+        Маска строк левой стороны с ключом, которого нет справа.
+        """
+        return (self.left_codes >= 0) & ~self.in_right[self.left_codes]
+
+    def right_only(self) -> np.ndarray:
+        """
+        Маска строк правой стороны с ключом, которого нет слева.
+        """
+        return (self.right_codes >= 0) & ~self.in_left[self.right_codes]
+
+    def matched_codes(self, left_codes: np.ndarray) -> np.ndarray:
+        """
+        Для кодов строк результата левого объединения возвращает код найденного справа ключа
+        или -1, если пары не нашлось.
+
+        :param left_codes: Коды левой стороны в строках результата.
+        :return: Коды ключей, найденных справа.
+        """
+        return np.where((left_codes >= 0) & self.in_right[left_codes], left_codes, -1)
+
+    @staticmethod
+    def count_distinct(codes: np.ndarray) -> int:
+        """
+        Считает различные коды ключей, не считая строк без ключа (-1).
+
+        :param codes: Коды ключей.
+        :return: Число различных ключей.
+        """
+        return int(np.unique(codes[codes >= 0]).size)
+
+class TrigramIndex:
+    """
+    Индекс триграмм для поиска похожих строк (опечатки и пробелы в названиях программ).
+
+    Строки приводятся к нижнему регистру, повторяющиеся пробелы схлопываются, по краям
+    добавляются пробелы. Для каждой триграммы хранится список строк, в которых она
+    встречается (массивы numpy, отсортированные по коду триграммы). Поиск проходит
+    только по спискам триграмм запроса, а не по всем строкам, поэтому его время
+    зависит от числа строк с общими триграммами, а не от размера индекса.
+    Сходство — коэффициент Дайса по множествам триграмм: 2·|A∩B| / (|A| + |B|).
+
+    :param values: Строки, среди которых ищутся похожие.
+    :type values: Iterable[str]
+    """
+
+    # Число предлагаемых вариантов и минимальное сходство варианта
+    LIMIT = 3
+    MIN_SIMILARITY = 0.5
+
+    def __init__(self, values: Iterable[str]):
+        """
+        Строит индекс.
+
+        :param values: Строки, среди которых ищутся похожие.
+        """
+        self.values = list(dict.fromkeys(values))
+        self._codes: Dict[str, int] = {}
+        value_ids, gram_codes = [], []
+        sizes = np.zeros(len(self.values), dtype=np.int64)
+
+        for value_id, value in enumerate(self.values):
+            grams = self._trigrams(value)
+            sizes[value_id] = len(grams)
+            for gram in grams:
+                gram_codes.append(self._codes.setdefault(gram, len(self._codes)))
+                value_ids.append(value_id)
+
+        gram_codes = np.asarray(gram_codes, dtype=np.int64)
+        order = np.argsort(gram_codes, kind='stable')
+        self._postings = np.asarray(value_ids, dtype=np.int64)[order]
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(gram_codes, minlength=len(self._codes)))])
+        self._sizes = sizes
+
+    @staticmethod
+    def _trigrams(value: Any) -> Set[str]:
+        """
+        Возвращает множество триграмм нормализованной строки.
+        """
+        text = f"  {' '.join(str(value).lower().split())} "
+        return {text[start:start + 3] for start in range(len(text) - 2)}
+
+    def _candidates(self, codes: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Возвращает строки, в которых есть хотя бы одна из триграмм, и число общих триграмм.
+
+        :param codes: Коды триграмм запроса.
+        :return: Номера строк индекса и число общих с запросом триграмм для каждой.
+        """
+        return np.unique(
+            np.concatenate([self._postings[self._offsets[code]:self._offsets[code + 1]] for code in codes]),
+            return_counts=True,
+        )
+
+    def search(
+        self,
+        query: Any,
+        limit: int | None = None,
+        min_similarity: float | None = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Ищет строки индекса, похожие на `query`.
+
+        :param query: Искомая строка.
+        :param limit: Сколько вариантов вернуть (по умолчанию `LIMIT`).
+        :param min_similarity: Минимальное сходство (по умолчанию `MIN_SIMILARITY`).
+        :return: Пары (строка, сходство) по убыванию сходства.
+        """
+        limit = self.LIMIT if limit is None else limit
+        min_similarity = self.MIN_SIMILARITY if min_similarity is None else min_similarity
+        grams = self._trigrams(query)
+        codes = [self._codes[gram] for gram in grams if gram in self._codes]
+        if not codes:
+            return []
+
+        candidates, shared = self._candidates(codes)
+        similarity = 2 * shared / (len(grams) + self._sizes[candidates])
+        keep = similarity >= min_similarity
+        candidates, similarity = candidates[keep], similarity[keep]
+        # По убыванию сходства, при равенстве — в порядке строк индекса
+        best = np.lexsort((candidates, -similarity))[:limit]
+        return [(self.values[candidates[i]], round(float(similarity[i]), 2)) for i in best]
+
+class MemoryTracker:
+    """
+    Замер пиковой памяти по шагам обработки через `tracemalloc`.
+
+    Учитываются и буферы numpy/pandas, которые numpy регистрирует в `tracemalloc`.
+    Для каждого шага запоминается, насколько пик памяти внутри шага превысил
+    объём памяти на его начало. Если замер выключен, шаги выполняются без накладных расходов.
+
+    :param enabled: Выполнять ли замер. По умолчанию — переменная окружения `PROFILE_MEMORY`.
+    :type enabled: bool | None
+    """
+
+    def __init__(self, enabled: bool | None = None):
+        """
+        Инициализирует замер.
+
+        :param enabled: Выполнять ли замер.
+        """
+        self.enabled = PROFILE_MEMORY if enabled is None else enabled
+        self.steps: Dict[str, int] = {}
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        """
+        Замеряет пиковую память шага `name` (в байтах) и сохраняет её в `steps`.
+
+        :param name: Название шага.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        # tracemalloc один на процесс: шаги с замером из разных потоков выполняются по очереди
+        with _memory_lock:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            try:
+                yield
+            finally:
+                _, peak = tracemalloc.get_traced_memory()
+                self.steps[name] = peak - base
+                if started:
+                    tracemalloc.stop()
+
+    def report(self) -> str:
+        """
+        Возвращает замеры в виде строки «шаг: МБ».
+        """
+        return ', '.join(f'{name}: {size / (1024 * 1024):.1f} МБ' for name, size in self.steps.items())
@@ -0,0 +1,126 @@
+import datetime
+import os
+import pandas as pd
+import pytest
+from unittest.mock import patch
+from app.cache import ParseCache
+from app.utils import ExcelUtils
+
+pa = pytest.importorskip('pyarrow')
+
+
+class TestParseCache:
+    """
+    Тесты кэша разобранных файлов `ParseCache`.
+    """
+
+    @pytest.fixture
+    def cache(self, tmpdir):
+        """Фикстура, создающая кэш во временной папке."""
+        return ParseCache(folder=str(tmpdir.join("cache")), max_size=10 * 1024 * 1024)
+
+    @pytest.fixture
+    def sample_df(self):
+        """Фикстура с DataFrame разных типов колонок."""
+        return pd.DataFrame({
+            "Опытный узел": ["Узел 1", None, "Узел 2"],
+            "№ трактора": [101, 102, 103],
+            "Наработка, м/ч": [10.5, None, 30.0],
+            "ПЭ: дата время": pd.to_datetime(["2024-01-01", None, "2024-01-03"]),
+        })
+
+    def test_put_and_get_roundtrip(self, cache, sample_df):
+        """
+        Проверяет, что DataFrame после сохранения и чтения через memory map не меняется.
+        """
+        key = ParseCache.make_key("abc", ["Опытный узел"])
+        assert cache.put(key, sample_df)
+        pd.testing.assert_frame_equal(cache.get(key), sample_df)
+
+    def test_get_missing_key_returns_none(self, cache):
+        """
+        Проверяет, что для отсутствующего ключа возвращается None.
+        """
+        assert cache.get("missing") is None
+
+    def test_key_depends_on_columns(self):
+        """
+        Проверяет, что ключ зависит от списка колонок.
+        """
+        assert ParseCache.make_key("abc", ["A"]) != ParseCache.make_key("abc", ["A", "B"])
+
+    def test_object_columns_keep_value_types(self, cache):
+        """
+        Проверяет, что колонки object со значениями разных типов (как '№ трактора' в выгрузках)
+        восстанавливаются без изменения типов: целые с пропусками не становятся float.
+        """
+        df = pd.DataFrame({
+            "№ трактора": pd.Series([101, None, 103], dtype=object),
+            "Продолжительность контроля": pd.Series([3000, "3000 м/ч", None], dtype=object),
+            "Статус": ["Открыт", True, None],
+            "Дата": [datetime.datetime(2024, 1, 1, 10, 44), datetime.timedelta(hours=5), 1.5],
+            "Опытный узел": ["Узел 1", None, "Узел 2"],
+        })
+        assert cache.put("mixed", df)
+
+        result = cache.get("mixed")
+        pd.testing.assert_frame_equal(result, df)
+        assert list(result.dtypes) == [object] * 5
+        for column in df.columns:
+            assert [type(value) for value in result[column]] == [type(value) for value in df[column]]
+
+    def test_put_skips_unsupported_values(self, cache):
+        """
+        Проверяет, что DataFrame со значениями неподдерживаемых типов не кэшируется и не вызывает ошибку.
+        """
+        df = pd.DataFrame({"Статус": ["Открыт", ["список"], None]})
+        assert not cache.put("unsupported", df)
+        assert cache.get("unsupported") is None
+
+    def test_get_closes_memory_map(self, cache, sample_df):
+        """
+        Проверяет, что memory map файла кэша закрывается после чтения.
+        """
+        cache.put("key", sample_df)
+        sources = []
+        memory_map = pa.memory_map
+
+        def tracked_memory_map(*args, **kwargs):
+            sources.append(memory_map(*args, **kwargs))
+            return sources[-1]
+
+        with patch('app.cache.pa.memory_map', tracked_memory_map):
+            pd.testing.assert_frame_equal(cache.get("key"), sample_df)
+
+        assert len(sources) == 1 and sources[0].closed
+
+    def test_evicts_least_recently_used(self, tmpdir, sample_df):
+        """
+        Проверяет, что при превышении размера удаляются давно не использованные записи.
+        """
+        cache = ParseCache(folder=str(tmpdir.join("lru_cache")), max_size=10 * 1024 * 1024)
+        cache.put("old", sample_df)
+        cache.put("new", sample_df)
+        os.utime(cache._path("old"), (0, 0))
+
+        entry_size = os.path.getsize(cache._path("new"))
+        cache.max_size = entry_size
+        cache._evict()
+
+        assert cache.get("old") is None
+        assert cache.get("new") is not None
+
+    def test_check_excel_structure_uses_cache(self, tmpdir, monkeypatch):
+        """
+        Проверяет, что повторная проверка того же файла берёт результат из кэша без разбора xlsx.
+        """
+        monkeypatch.setenv('PARSE_CACHE_FOLDER', str(tmpdir.join("cache")))
+        file_path = str(tmpdir.join("web.xlsx"))
+        pd.DataFrame({"Имя": ["Анна", "Иван"], "Возраст": [25, 30]}).to_excel(file_path, index=False)
+
+        first = ExcelUtils.check_excel_structure(file_path, ["Имя"])
+        with patch.object(ExcelUtils, '_read_excel_with_merged_cells') as full_read:
+            second = ExcelUtils.check_excel_structure(file_path, ["Имя"])
+
+        full_read.assert_not_called()
+        pd.testing.assert_frame_equal(first, second)
@@ -0,0 +1,128 @@
+import copy
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from app import create_app
+from app.drawer import MergeDrawer, ChunkedMergeDrawer
+from app.snapshots import MergeSnapshotStore
+from app.utils import Utils
+from .test_merge import _export_frames
+
+THREADS = 8
+
+
+def _variants(bitrix_df, web_df, count=4):
+    """Разные срезы одних и тех же выгрузок: отчёты в потоках читают общие исходные DataFrame."""
+    step = len(web_df) // (count + 1)
+    return [(bitrix_df.iloc[i * 10:], web_df.iloc[i * step:(i + 2) * step]) for i in range(count)]
+
+
+def _sheets(path):
+    return pd.read_excel(path, sheet_name=None)
+
+
+def test_parallel_reports_match_sequential(tmp_path):
+    """
+    Стресс-тест: отчёты строятся одновременно в потоках по общим исходным DataFrame,
+    общему конфигу и общему хранилищу снимков и совпадают с отчётами, построенными по одному.
+    """
+    bitrix_df, web_df = _export_frames(size=1200, tasks=60)
+    bitrix_source, web_source = bitrix_df.copy(), web_df.copy()
+    config = Utils.load_config()
+    config_source = copy.deepcopy(config)
+    variants = _variants(bitrix_df, web_df)
+
+    expected = []
+    for i, (bitrix_part, web_part) in enumerate(variants):
+        folder = tmp_path / f'sequential_{i}'
+        folder.mkdir()
+        link = MergeDrawer(web_df=web_part, bitrix_df=bitrix_part, config=config, upload_folder=str(folder)).draw_report()
+        expected.append(_sheets(folder / link.download_link))
+
+    store = MergeSnapshotStore()
+
+    def draw(job):
+        variant = job % len(variants)
+        bitrix_part, web_part = variants[variant]
+        folder = tmp_path / f'job_{job}'
+        folder.mkdir()
+        if job % 3 == 2:
+            drawer = ChunkedMergeDrawer(
+                web_chunks=(web_part.iloc[start:start + 500] for start in range(0, len(web_part), 500)),
+                bitrix_df=bitrix_part,
+                config=config,
+                spill_folder=str(folder),
+                upload_folder=str(folder),
+            )
+        else:
+            drawer = MergeDrawer(
+                web_df=web_part,
+                bitrix_df=bitrix_part,
+                config=config,
+                snapshot_store=store,
+                upload_folder=str(folder),
+            )
+        link = drawer.draw_report().download_link
+        # В папке задания только его отчёт (временные файлы удалены)
+        assert os.listdir(folder) == [link]
+        return variant, _sheets(folder / link)
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        results = list(pool.map(draw, range(2 * THREADS)))
+
+    for variant, sheets in results:
+        assert list(sheets) == list(expected[variant])
+        for sheet_name, sheet in sheets.items():
+            pd.testing.assert_frame_equal(sheet, expected[variant][sheet_name])
+
+    # Исходные DataFrame и конфиг не изменились
+    pd.testing.assert_frame_equal(bitrix_df, bitrix_source)
+    pd.testing.assert_frame_equal(web_df, web_source)
+    assert config == config_source
+
+
+def _ndjson(rows):
+    return io.BytesIO("\n".join(json.dumps(row, ensure_ascii=False) for row in rows).encode("utf-8"))
+
+
+def test_app_serves_parallel_requests(tmp_path, monkeypatch):
+    """
+    Проверяет, что приложение не меняет окружение процесса и обслуживает запросы
+    из нескольких потоков одновременно, сохраняя отчёты в свою папку загрузок.
+    """
+    monkeypatch.delenv('UPLOAD_FOLDER', raising=False)
+    app = create_app(upload_folder=str(tmp_path))
+    assert 'UPLOAD_FOLDER' not in os.environ
+    assert app.config['UPLOAD_FOLDER'] == str(tmp_path)
+
+    def post(job):
+        web_rows = [
+            {
+                "Модель трактора": "К-742", "№ трактора": f"Т{job}-{i}", "Граничная дата гарантии": "30.11.2025",
+                "Опытный узел": f"Муфта; Узел {i % 3}", "Наработка, м/ч": 100 + i, "ПЭ: дата время": "03.08.2024 10:44:18",
+                "ПЭ: Комментарий": None, "ПЭ: наработка м/ч": i,
+            }
+            for i in range(job + 5)
+        ]
+        bitrix_rows = [
+            {"Название": "Муфта", "Примечание": "3000 м/ч", "Описание": None, "Теги": "Бюро трансмиссий"},
+            {"Название": f"Узел {job % 3}", "Примечание": "500 м/ч", "Описание": None, "Теги": "Бюро гидравлики"},
+        ]
+        response = app.test_client().post('/api/merge-ndjson', data={
+            'web_file': (_ndjson(web_rows), 'web.ndjson'),
+            'bitrix_file': (_ndjson(bitrix_rows), 'bitrix.ndjson'),
+        })
+        return job, response.get_json()
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        results = list(pool.map(post, range(2 * THREADS)))
+
+    links = set()
+    for job, body in results:
+        assert body.get('message') == 'Отчет создан', body
+        stats = pd.read_excel(tmp_path / body['download_link'], sheet_name='Статистика')
+        assert stats['Число тракторов'].iloc[0] == job + 5
+        links.add(body['download_link'])
+    assert sorted(links) == sorted(os.listdir(tmp_path))
@@ -12,8 +12,6 @@ class DummySchema:
 
 def test_draw_report_integration(tmp_path, monkeypatch):
     # Подменим схемы и Utils
-    monkeypatch.setenv('UPLOAD_FOLDER', str(tmp_path))
-
     def fake_create_save_file(upl_folder):
         out = Path(upl_folder) / "out.xlsx"
         link = "http://test/download/out.xlsx"
@@ -48,9 +46,9 @@ def test_draw_report_integration(tmp_path, monkeypatch):
         'ПЭ: Комментарий': ['-'],
     })
 
-    md = MergeDrawer(web_df=web_df, bitrix_df=bitrix_df, config=config)
+    md = MergeDrawer(web_df=web_df, bitrix_df=bitrix_df, config=config, upload_folder=str(tmp_path))
     with patch.object(MergeDrawer, '_format_excel_report', autospec=True) as format_report:
-        def fake_format_report(self, group_col_name, output_file):
+        def fake_format_report(self, group_col_name, output_file, merged=None, reused_sheets=None):
             Path(output_file).touch()
 
         format_report.side_effect = fake_format_report
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.drawer import MergeDrawer, ChunkedMergeDrawer
+from app.utils import DataFrameUtils
+
+pytest.importorskip('polars')
+from app.polars_engine import PolarsEngine  # noqa: E402
+
+
+def _frames():
+    bitrix_df = pd.DataFrame({
+        'Название': ['A', 'B; C', 'ПЭ: D', ' E ', None, 'F;  ;G', 'Муфта'],
+        'Описание': [None, None, 'описание D', None, None, None, 'ПЭ: Муфта'],
+        'Примечание': ['100 м/ч', '200 м/ч', '300 м/ч', None, '500 м/ч', '600', '700 м/ч'],
+        'Теги': ['Бюро А', 'Бюро А, Бюро Б', 'Бюро В', None, 'Бюро В', 'Бюро Г', 'Бюро А'],
+    })
+    web_df = pd.DataFrame({
+        'Модель трактора': ['M1', None, 'M2', 'M2', 'M3', None, 'M4'],
+        '№ трактора': ['Т1', None, 102, 'Т3', 'Т1', None, 'Т4'],
+        'Граничная дата гарантии': ['2025-01-01'] * 7,
+        'Опытный узел': ['A; B', 'C', 'D', 'A', 'E;G', 'F', 'Муфты'],
+        'Наработка, м/ч': [10, 15, 20, 30, 40, 50, 60],
+        'ПЭ: дата время': ['2024-01-01'] * 7,
+        'ПЭ: Комментарий': [None, 'есть', None, None, '-', None, None],
+        'ПЭ: наработка м/ч': [1, 2, 3, 4, 5, 6, 7],
+    })
+    return bitrix_df, web_df
+
+
+def _report(tmp_path, monkeypatch, name, drawer):
+    monkeypatch.setattr('app.drawer.Utils.create_save_file', lambda upl_folder: (str(tmp_path / name), name))
+    drawer.draw_report()
+    return pd.read_excel(tmp_path / name, sheet_name=None)
+
+
+def _assert_same_sheets(left, right):
+    assert list(left) == list(right)
+    for sheet_name in left:
+        pd.testing.assert_frame_equal(left[sheet_name], right[sheet_name])
+
+
+@pytest.fixture
+def upload_folder(tmp_path):
+    return tmp_path
+
+
+def test_unknown_engine():
+    bitrix_df, web_df = _frames()
+    config = MergeDrawer(web_df=web_df, bitrix_df=bitrix_df).config
+    with pytest.raises(ValueError):
+        MergeDrawer(web_df=web_df, bitrix_df=bitrix_df, config=dict(config, drawer_engine='spark'))
+
+
+def test_engines_produce_same_sheets(upload_folder):
+    bitrix_df, web_df = _frames()
+    config = MergeDrawer(web_df=web_df, bitrix_df=bitrix_df).config
+
+    pandas_drawer = MergeDrawer(web_df=web_df.copy(), bitrix_df=bitrix_df.copy(), config=dict(config, drawer_engine='pandas'))
+    polars_drawer = MergeDrawer(web_df=web_df.copy(), bitrix_df=bitrix_df.copy(), config=dict(config, drawer_engine='polars'))
+    pandas_merged = pandas_drawer._write_report(pandas_drawer._merge(), str(upload_folder / 'pandas.xlsx'))
+    polars_merged = polars_drawer._write_report(polars_drawer._merge(), str(upload_folder / 'polars.xlsx'))
+
+    _assert_same_sheets(
+        pd.read_excel(upload_folder / 'polars.xlsx', sheet_name=None),
+        pd.read_excel(upload_folder / 'pandas.xlsx', sheet_name=None),
+    )
+    pd.testing.assert_frame_equal(polars_merged.result_df, pandas_merged.result_df)
+    np.testing.assert_array_equal(polars_merged.result_key_codes, pandas_merged.result_key_codes)
+
+
+def test_engines_produce_same_sheets_chunked(upload_folder, monkeypatch):
+    bitrix_df, web_df = _frames()
+    monkeypatch.setenv('DRAWER_ENGINE', 'pandas')
+    pandas_sheets = _report(upload_folder, monkeypatch, 'pandas.xlsx', MergeDrawer(web_df=web_df.copy(), bitrix_df=bitrix_df.copy()))
+
+    monkeypatch.setattr('app.drawer.DRAWER_ENGINE', 'polars')
+    chunks = (web_df.iloc[start:start + 3] for start in range(0, len(web_df), 3))
+    drawer = ChunkedMergeDrawer(web_chunks=chunks, bitrix_df=bitrix_df.copy(), spill_folder=str(upload_folder))
+    assert drawer.engine == 'polars'
+
+    _assert_same_sheets(_report(upload_folder, monkeypatch, 'polars.xlsx', drawer), pandas_sheets)
+
+
+@pytest.mark.parametrize("drop_blank", [(), ('Название',)])
+def test_explode_split_matches_pandas(drop_blank):
+    df = pd.DataFrame({
+        'Название': ['A; B', None, ' C ;;D', 5, ''],
+        'Теги': ['x, y', 'z', None, 'w', 'v, '],
+        'Число': [1, 2, 3, 4, 5],
+    }, index=[10, 11, 11, 12, 13])
+    delimiters = {'Название': ';', 'Теги': ', '}
+
+    expected = DataFrameUtils.explode_split(df, delimiters, drop_blank=drop_blank)
+    result = PolarsEngine.explode_split(df, delimiters, drop_blank=drop_blank)
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("keys", [('Опытный узел',), ('Бюро', 'Опытный узел')])
+def test_node_stats_matches_pandas(keys):
+    group = pd.DataFrame({
+        'Бюро': ['Б2', 'Б1', 'Б2', 'Б1', 'Б1', 'Б1', None],
+        'Опытный узел': ['Б', 'А', 'А', 'Б', 'В', 'А', 'А'],
+        '№ трактора': ['Т1', 'Т1', 102, 'Т1', None, 102, 'Т5'],
+        'Наработка, м/ч': [10, 20, 30, 50, 70, 35, 5],
+        '_часы контроля': [np.nan, 100, 200, 300, 400, 100, np.nan],
+    })
+
+    expected = MergeDrawer._node_stats(group, keys=keys)
+    result = PolarsEngine.node_stats(group, keys=keys)
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_bureau_counts_matches_pandas():
+    bureaus = pd.Series(['Б', 'А', 'А', None, 'Б', 'А'])
+    nodes = pd.Series([1, 2, 2, 3, np.nan, np.nan])
+    tractors = pd.Series(['Т1', 'Т1', 102, 'Т2', None, 'Т1'])
+
+    expected = pd.DataFrame({'Бюро': bureaus, 'Опытный узел': nodes, '№ трактора': tractors}).groupby('Бюро').agg({
+        'Опытный узел': 'nunique',
+        '№ трактора': 'nunique',
+    }).reset_index()
+    result = PolarsEngine.bureau_counts(bureaus, nodes, tractors)
+
+    pd.testing.assert_frame_equal(result, expected)
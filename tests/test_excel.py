@@ -25,3 +25,91 @@ def test_format_excel_report_smoke(tmp_path):
     out = tmp_path / "report.xlsx"
     md._format_excel_report(group_col_name='Бюро', output_file=str(out))
     assert out.exists() and out.stat().st_size > 0
+
+
+def test_excel_dates_keep_display_formats(tmp_path):
+    import openpyxl
+    from app.utils import ExcelUtils
+
+    df = pd.DataFrame({
+        'Дата и время обращения': pd.to_datetime(['2022-08-03 10:44:18', None]),
+        'Граничная дата гарантии': pd.to_datetime(['2023-11-30', None]),
+    })
+
+    out = tmp_path / "dates.xlsx"
+    with pd.ExcelWriter(out, engine='xlsxwriter', **ExcelUtils.DATE_FORMATS) as writer:
+        ExcelUtils.excel_dates(df).to_excel(writer, index=False)
+
+    sheet = openpyxl.load_workbook(out).active
+    assert sheet['A2'].number_format == 'DD.MM.YYYY HH:MM:SS'
+    assert sheet['B2'].number_format == 'DD.MM.YYYY'
+    assert sheet['B3'].value is None
+    # Исходный DataFrame не меняется
+    assert df['Граничная дата гарантии'].dtype == 'datetime64[ns]'
+
+
+def _cells(path):
+    """Значения, форматы и объединённые ячейки всех листов книги."""
+    import openpyxl
+
+    sheets = {}
+    for sheet in openpyxl.load_workbook(path).worksheets:
+        cells = {
+            cell.coordinate: (
+                cell.value, cell.number_format, cell.fill.fgColor.rgb if cell.fill.fill_type else None,
+                cell.font.b, cell.alignment.wrap_text, cell.alignment.vertical, cell.border.left.style,
+            )
+            for row in sheet.iter_rows() for cell in row
+            if cell.value is not None or cell.has_style
+        }
+        sheets[sheet.title] = cells, sorted(map(str, sheet.merged_cells.ranges))
+    return sheets
+
+
+def test_row_writer_matches_to_excel(tmp_path):
+    from app.utils import ExcelUtils, RowWriter
+
+    df = pd.DataFrame({
+        'Число': [1, 2, None],
+        'Дробь': [0.5, float('inf'), float('nan')],
+        'Текст': ['а', None, 'в'],
+        'Флаг': [True, False, True],
+        'Дата': pd.to_datetime(['2023-11-30', None, '2024-01-01']),
+        'Время': pd.to_datetime(['2022-08-03 10:44:18', None, '2022-08-04 00:00:01']),
+        'Смешанные': [1, 'Т2', None],
+    })
+
+    expected = tmp_path / "to_excel.xlsx"
+    with ExcelUtils.report_writer(expected, constant_memory=False) as writer:
+        ExcelUtils.excel_dates(df).to_excel(writer, sheet_name='Лист', index=False, startrow=2)
+
+    result = tmp_path / "rows.xlsx"
+    with ExcelUtils.report_writer(result, constant_memory=True) as writer:
+        next_row = RowWriter(writer).write_frame('Лист', df, startrow=2)
+
+    assert next_row == 2 + 1 + len(df)
+    assert _cells(result) == _cells(expected)
+
+
+def test_constant_memory_report_matches_default(tmp_path):
+    from .test_engines import _frames
+
+    bitrix_df, web_df = _frames()
+    config = MergeDrawer(web_df=web_df, bitrix_df=bitrix_df).config
+    sheets = {}
+    for constant_memory in (False, True):
+        drawer = MergeDrawer(
+            web_df=web_df,
+            bitrix_df=bitrix_df,
+            config=dict(config, xlsx_constant_memory=constant_memory),
+            upload_folder=str(tmp_path),
+        )
+        link = drawer.draw_report().download_link
+        sheets[constant_memory] = _cells(tmp_path / link)
+
+    assert sheets[True] == sheets[False]
+    # В листах бюро есть шапка на объединённых ячейках и раскрашенная главная таблица
+    bureau_cells, merged = sheets[True]['Бюро А']
+    assert 'A1:E1' in merged and 'A2:E2' in merged
+    assert bureau_cells['A1'][0] == 'Программа ПЭ:'
+    assert bureau_cells['C8'][2] is not None
@@ -1,5 +1,12 @@
+import os
+import time
+import numpy as np
 import pandas as pd
-from app.drawer import MergeDrawer
+import pytest
+from unittest.mock import patch
+from app.drawer import MergeDrawer, ChunkedMergeDrawer
+from app.snapshots import MergeSnapshotStore
+from app.utils import DataFrameUtils, Utils
 
 def test_merge_content_does_not_fill_from_neighbor_tasks(monkeypatch):
     config = {
@@ -35,3 +42,323 @@ def test_merge_content_does_not_fill_from_neighbor_tasks(monkeypatch):
     assert pd.isna(unmatched_row['Опытный узел'])
     assert pd.isna(unmatched_row['№ трактора'])
     assert unmatched_row['Теги'] == 'Бюро Б'
+
+
+def _swap_rowwise(bitrix_df):
+    """Прежняя построчная реализация обмена «Название»/«Описание» и удаления префикса «ПЭ: »."""
+    bitrix_df = bitrix_df.copy()
+    bitrix_df[['Название', 'Описание']] = bitrix_df.apply(
+        lambda row: (row['Описание'], row['Название'])
+        if str(row['Описание']).startswith('ПЭ: ')
+        else (row['Название'], row['Описание']),
+        axis=1,
+        result_type='expand'
+    )
+    bitrix_df['Название'] = bitrix_df['Название'].apply(
+        lambda x: x[4:] if str(x).startswith('ПЭ: ') else x
+    )
+    return bitrix_df
+
+
+def test_normalize_bitrix_names_matches_rowwise():
+    bitrix_df = pd.DataFrame({
+        'Название': ['ПЭ: A', 'B', None, 5, 'C', 'D'],
+        'Описание': ['ПЭ: Длинная программа', None, 'ПЭ: E', 'описание', 7, 'ПЭ: ПЭ: F'],
+        'Теги': ['Бюро А', None, 'Бюро Б', 'Бюро В', None, 'Бюро Г'],
+    })
+
+    result = MergeDrawer._normalize_bitrix_names(bitrix_df)
+
+    pd.testing.assert_frame_equal(result, _swap_rowwise(bitrix_df))
+    assert result['Название'].tolist()[:3] == ['Длинная программа', 'B', 'E']
+    # Исходный DataFrame не изменяется
+    assert bitrix_df['Название'].iloc[0] == 'ПЭ: A'
+
+
+def test_normalize_bitrix_names_without_strings():
+    bitrix_df = pd.DataFrame({'Название': ['A', 'B'], 'Описание': [np.nan, np.nan]})
+
+    pd.testing.assert_frame_equal(
+        MergeDrawer._normalize_bitrix_names(bitrix_df),
+        _swap_rowwise(bitrix_df),
+    )
+
+
+def test_normalize_bitrix_names_large_export_is_vectorised():
+    size = 20000
+    bitrix_df = pd.DataFrame({
+        'Название': [f'Задача {i}' if i % 3 else f'ПЭ: Задача {i}' for i in range(size)],
+        'Описание': [f'ПЭ: Программа {i}' if i % 2 else None for i in range(size)],
+        'Теги': ['Бюро трансмиссий, Бюро гидравлики'] * size,
+    })
+
+    expected = _swap_rowwise(bitrix_df)
+
+    # Названия обрабатываются по колонкам, без построчного apply
+    with patch.object(pd.DataFrame, 'apply', side_effect=AssertionError('построчный apply')), \
+            patch.object(pd.Series, 'apply', side_effect=AssertionError('построчный apply')):
+        result = MergeDrawer._normalize_bitrix_names(bitrix_df)
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_merge_content_records_memory_per_step(monkeypatch):
+    monkeypatch.setattr('app.utils.PROFILE_MEMORY', True)
+    config = {
+        'bitrix_columns': ['Название', 'Описание', 'Примечание', 'Теги'],
+        'web_columns': ['Опытный узел', '№ трактора', 'ПЭ: Комментарий'],
+    }
+    bitrix_df = pd.DataFrame({
+        'Название': ['A; B'] * 1000,
+        'Описание': [None] * 1000,
+        'Примечание': ['100 м/ч'] * 1000,
+        'Теги': ['Бюро А, Бюро Б'] * 1000,
+    })
+    web_df = pd.DataFrame({'Опытный узел': ['A; C'], '№ трактора': ['Т1'], 'ПЭ: Комментарий': [None]})
+
+    merged = MergeDrawer(web_df=web_df, bitrix_df=bitrix_df, config=config)._merge()
+
+    assert len(merged.result_df) == 4000
+    assert list(merged.memory_steps) == ['Битрикс: названия', 'Битрикс: разбивка', 'Веб: разбивка', 'Объединение']
+    assert all(size > 0 for size in merged.memory_steps.values())
+
+
+def _incremental_frames():
+    bitrix_df = pd.DataFrame({
+        'Название': ['A', 'B; C', 'D', 'E'],
+        'Описание': [None, None, None, None],
+        'Примечание': ['100 м/ч', '200 м/ч', '300 м/ч', '400 м/ч'],
+        'Теги': ['Бюро А', 'Бюро А, Бюро Б', 'Бюро В', 'Бюро В'],
+    })
+    web_df = pd.DataFrame({
+        'Модель трактора': ['M1', 'M1', 'M2', 'M2'],
+        '№ трактора': ['Т1', None, 'Т2', 'Т3'],
+        'Граничная дата гарантии': ['2025-01-01'] * 4,
+        'Опытный узел': ['A; B', 'C', 'D', 'A'],
+        'Наработка, м/ч': [10, 10, 20, 30],
+        'ПЭ: дата время': ['2024-01-01'] * 4,
+        'ПЭ: Комментарий': [None, 'есть', None, None],
+        'ПЭ: наработка м/ч': [1, 2, 3, 4],
+    })
+    return bitrix_df, web_df
+
+
+def _draw(tmp_path, bitrix_df, web_df, store, config=None):
+    md = MergeDrawer(
+        web_df=web_df.copy(),
+        bitrix_df=bitrix_df.copy(),
+        config=config,
+        snapshot_store=store,
+        upload_folder=str(tmp_path),
+    )
+    return md._write_report(md._merge(), str(tmp_path / 'report.xlsx'))
+
+
+def test_incremental_merge_matches_full_rebuild(tmp_path):
+    bitrix_df, web_df = _incremental_frames()
+    store = MergeSnapshotStore()
+    _draw(tmp_path, bitrix_df, web_df, store)
+
+    # Удалённая, изменённая и новая строки Битрикс, изменённая строка веб-системы
+    changed_bitrix = pd.concat([
+        bitrix_df.drop(index=0),
+        pd.DataFrame({'Название': ['A'], 'Описание': [None], 'Примечание': ['500 м/ч'], 'Теги': ['Бюро Г']}),
+    ]).reset_index(drop=True)
+    changed_bitrix.loc[0, 'Примечание'] = '250 м/ч'
+    changed_web = web_df.copy()
+    changed_web.loc[2, 'ПЭ: Комментарий'] = 'новый'
+
+    incremental = _draw(tmp_path, changed_bitrix, changed_web, store)
+    full = _draw(tmp_path, changed_bitrix, changed_web, None)
+
+    pd.testing.assert_frame_equal(incremental.result_df, full.result_df)
+    np.testing.assert_array_equal(incremental.result_key_codes, full.result_key_codes)
+    # Из прошлого результата берётся только 'E': у 'B' и 'C' изменилось примечание,
+    # у 'D' — строка веб-системы, 'A' из 'Бюро Г' новая
+    assert incremental.incremental_stats == {'reused_rows': 1, 'merged_rows': 6, 'rendered_bureaus': 4}
+
+
+def test_incremental_merge_rerenders_only_changed_bureaus(tmp_path, monkeypatch):
+    bitrix_df, web_df = _incremental_frames()
+    store = MergeSnapshotStore()
+    prepared = []
+    original = MergeDrawer._prepare_bureau_sheet
+
+    def counting_prepare(self, group, *args):
+        prepared.append(group['Бюро'].iloc[0])
+        return original(self, group, *args)
+
+    monkeypatch.setattr(MergeDrawer, '_prepare_bureau_sheet', counting_prepare)
+    _draw(tmp_path, bitrix_df, web_df, store)
+    assert sorted(prepared) == ['Бюро А', 'Бюро Б', 'Бюро В']
+
+    prepared.clear()
+    changed_bitrix = bitrix_df.copy()
+    changed_bitrix.loc[3, 'Примечание'] = '450 м/ч'
+    md = _draw(tmp_path, changed_bitrix, web_df, store)
+
+    assert prepared == ['Бюро В']
+    assert md.incremental_stats['rendered_bureaus'] == 1
+    assert md.incremental_stats['reused_rows'] == 6
+
+
+def test_incremental_merge_full_rebuild_on_config_change(tmp_path):
+    bitrix_df, web_df = _incremental_frames()
+    store = MergeSnapshotStore()
+    _draw(tmp_path, bitrix_df, web_df, store)
+
+    config = dict(Utils.load_config('app/report_config.json'), column_dtypes={})
+    md = _draw(tmp_path, bitrix_df, web_df, store, config=config)
+
+    assert md.previous_snapshot is None
+    assert md.incremental_stats['reused_rows'] == 0
+
+
+def test_snapshot_store_keeps_snapshot_per_source(tmp_path):
+    """
+    Чередующиеся объединения разных источников не вытесняют снимки друг друга,
+    лишние снимки удаляются по давности использования и по истечении времени жизни.
+    """
+    bitrix_df, web_df = _incremental_frames()
+    other_bitrix = bitrix_df.assign(Примечание=['150 м/ч', '250 м/ч', '350 м/ч', '450 м/ч'])
+    store = MergeSnapshotStore(max_entries=2)
+    first = _draw(tmp_path, bitrix_df, web_df, store)
+    other = _draw(tmp_path, other_bitrix, web_df, store)
+    assert other.previous_snapshot is None
+
+    md = _draw(tmp_path, bitrix_df, web_df, store)
+    assert md.previous_snapshot is first.snapshot
+    assert md.incremental_stats['merged_rows'] == 0
+    md = _draw(tmp_path, other_bitrix, web_df, store)
+    assert md.previous_snapshot is other.snapshot
+    assert len(store._timers) == 2
+
+    # Снимок при другом конфиге не подходит, третий источник вытесняет давний снимок
+    config = dict(Utils.load_config('app/report_config.json'), column_dtypes={})
+    third = _draw(tmp_path, bitrix_df, web_df, store, config=config)
+    assert third.previous_snapshot is None
+    assert list(store._timers) == [md.snapshot, third.snapshot]
+
+    store = MergeSnapshotStore(ttl=0.05)
+    md = _draw(tmp_path, bitrix_df, web_df, store)
+    config_key = md.snapshot.config_key
+    assert store.get(config_key, md.snapshot.bitrix_hashes) is md.snapshot
+    store._timers[md.snapshot].join()
+    assert store.get(config_key, md.snapshot.bitrix_hashes) is None
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 3, 100])
+def test_chunked_merge_matches_in_memory_report(tmp_path, monkeypatch, chunk_rows):
+    bitrix_df, web_df = _incremental_frames()
+    monkeypatch.setattr('app.drawer.Utils.create_save_file', lambda upl_folder: (str(tmp_path / name), name))
+
+    name = 'full.xlsx'
+    MergeDrawer(web_df=web_df.copy(), bitrix_df=bitrix_df.copy()).draw_report()
+    name = 'chunked.xlsx'
+    chunks = (web_df.iloc[start:start + chunk_rows] for start in range(0, len(web_df), chunk_rows))
+    md = ChunkedMergeDrawer(web_chunks=chunks, bitrix_df=bitrix_df.copy(), spill_folder=str(tmp_path))
+    md.draw_report()
+
+    full = pd.read_excel(tmp_path / 'full.xlsx', sheet_name=None)
+    chunked = pd.read_excel(tmp_path / 'chunked.xlsx', sheet_name=None)
+    assert list(chunked) == list(full)
+    for sheet_name in full:
+        pd.testing.assert_frame_equal(chunked[sheet_name], full[sheet_name])
+    # Временные файлы удалены
+    assert sorted(os.listdir(tmp_path)) == ['chunked.xlsx', 'full.xlsx']
+
+
+def test_conflict_sheet_suggests_similar_web_nodes(tmp_path, monkeypatch):
+    bitrix_df, web_df = _incremental_frames()
+    # Составная задача из двух бюро даёт две строки с одинаковым индексом
+    bitrix_df.loc[1, 'Название'] = 'Муфта сцепления'
+    web_df.loc[3, 'Опытный узел'] = 'Муфта  сцепленя'
+    monkeypatch.setattr('app.drawer.Utils.create_save_file', lambda upl_folder: (str(tmp_path / 'out.xlsx'), 'out.xlsx'))
+
+    MergeDrawer(web_df=web_df, bitrix_df=bitrix_df).draw_report()
+
+    conflicts = pd.read_excel(tmp_path / 'out.xlsx', sheet_name='Конфликты')
+    assert list(conflicts.columns[-3:]) == MergeDrawer.SUGGESTION_COLUMNS
+    rows = conflicts[conflicts['Задача'] == 'Муфта сцепления']
+    assert rows['Бюро'].tolist() == ['Бюро А', 'Бюро Б']
+    assert rows['Похожий узел в служебном отчете'].tolist() == ['Муфта  сцепленя'] * 2
+    assert rows['Сходство'].between(0.5, 1, inclusive='left').all()
+    assert conflicts.loc[conflicts['Источник'] == 'СЛУЖЕБНЫЙ', 'Сходство'].isna().all()
+
+
+def _export_frames(size=20000, tasks=1000):
+    """Выгрузки размером с реальные: составные задачи и узлы, строки обращений под трактором."""
+    rng = np.random.default_rng(0)
+    bureaus = ['Бюро гидравлики', 'Бюро трансмиссий', 'Бюро кабин и облицовки']
+    bitrix_df = pd.DataFrame({
+        'Название': [f'Программа ПЭ узла {i}; Узел {i} доп.' if i % 5 == 0 else f'Программа ПЭ узла {i}' for i in range(tasks)],
+        'Примечание': [f'{(i % 9 + 1) * 100} м/ч' for i in range(tasks)],
+        'Описание': [f'ПЭ: Длинное название программы {i}' if i % 7 == 0 else None for i in range(tasks)],
+        'Теги': [', '.join(bureaus[:i % 3 + 1]) for i in range(tasks)],
+    })
+    record = np.arange(size) % 4 == 0
+    web_df = pd.DataFrame({
+        'Модель трактора': np.where(record, rng.choice(['БЕЛАРУС-1523', 'БЕЛАРУС-3522'], size), None),
+        '№ трактора': np.where(record, [f'Т{n:05d}' for n in rng.integers(0, 5000, size)], None),
+        'Граничная дата гарантии': ['01.01.2026'] * size,
+        'Опытный узел': [f'Программа ПЭ узла {node}' for node in rng.integers(0, tasks, size)],
+        'Наработка, м/ч': rng.integers(0, 3000, size),
+        'ПЭ: дата время': [f'{day % 28 + 1:02d}.05.2025 10:00' for day in range(size)],
+        'ПЭ: Комментарий': np.where(np.arange(size) % 3 == 0, 'Замечаний нет, узел работает штатно', None),
+        'ПЭ: наработка м/ч': rng.integers(0, 3000, size),
+    })
+    return bitrix_df, web_df
+
+
+def test_arrow_strings_benchmark(monkeypatch):
+    bitrix_df, web_df = _export_frames()
+    config = MergeDrawer(web_df=web_df, bitrix_df=bitrix_df).config
+    results = {}
+    for arrow_strings in (False, True):
+        # Как при загрузке: типы из конфига и, в режиме Arrow, строковые колонки в string[pyarrow]
+        monkeypatch.setattr('app.utils.ARROW_STRINGS', arrow_strings)
+        md = MergeDrawer(
+            web_df=DataFrameUtils.apply_column_dtypes(web_df, config['column_dtypes']),
+            bitrix_df=DataFrameUtils.apply_column_dtypes(bitrix_df, config['column_dtypes']),
+            config=config,
+        )
+        start = time.perf_counter()
+        result = md._merge_content()
+        results[arrow_strings] = (result, time.perf_counter() - start, result.memory_usage(deep=True).sum())
+
+    (object_result, object_time, object_memory), (arrow_result, arrow_time, arrow_memory) = results.values()
+    print(
+        f"object: {object_time:.3f} с, {object_memory / 2**20:.1f} МБ; "
+        f"string[pyarrow]: {arrow_time:.3f} с, {arrow_memory / 2**20:.1f} МБ"
+    )
+
+    assert arrow_result['ПЭ: Комментарий'].dtype == DataFrameUtils.ARROW_STRING_DTYPE
+    pd.testing.assert_frame_equal(
+        arrow_result.astype(object).where(arrow_result.notna(), None),
+        object_result.astype(object).where(object_result.notna(), None),
+    )
+    assert arrow_memory < object_memory / 2
+
+
+def test_bureau_node_stats_single_pass():
+    """
+    Статистика шапок всех бюро считается одной группировкой и совпадает со статистикой,
+    посчитанной по строкам каждого бюро.
+    """
+    bitrix_df, web_df = _export_frames(size=20000, tasks=1000)
+    bitrix_df['Теги'] = [f'Бюро {i % 40}' for i in range(len(bitrix_df))]
+    md = MergeDrawer(web_df=web_df, bitrix_df=bitrix_df)
+    merged = md._merge()
+    merged.result_df = md._reformat_result(merged.result_df, md.config['report_column_map'])
+
+    per_bureau = {}
+    for name, group in merged.result_df.groupby('Бюро', observed=True):
+        per_bureau[name] = MergeDrawer._node_stats(group[MergeDrawer._task_mask(group)])
+
+    with patch.object(MergeDrawer, '_node_stats', wraps=MergeDrawer._node_stats) as node_stats:
+        single_pass = md._bureau_node_stats(merged, 'Бюро')
+
+    node_stats.assert_called_once()
+    assert list(single_pass) == list(per_bureau) and len(single_pass) == 40
+    for name, stats_df in per_bureau.items():
+        pd.testing.assert_frame_equal(single_pass[name], stats_df)
@@ -0,0 +1,349 @@
+import datetime
+import io
+import time
+import zipfile
+import pandas as pd
+import pytest
+import xlsxwriter
+from openpyxl import Workbook, load_workbook
+from app.readers import CalamineReader, XlsxStreamReader
+from app.utils import ExcelUtils
+
+
+def read_with_openpyxl(file_path: str) -> pd.DataFrame:
+    """
+    Эталонное чтение листа через openpyxl с разворачиванием объединённых ячеек.
+    """
+    worksheet = load_workbook(filename=file_path, data_only=True).worksheets[0]
+    merged_values = {}
+    for merged_range in worksheet.merged_cells.ranges:
+        min_col, min_row, max_col, max_row = merged_range.bounds
+        top_left_value = worksheet.cell(row=min_row, column=min_col).value
+        for row_index in range(min_row, max_row + 1):
+            for column_index in range(min_col, max_col + 1):
+                merged_values[(row_index, column_index)] = top_left_value
+
+    rows = [
+        tuple(merged_values.get((cell.row, cell.column), cell.value) for cell in row)
+        for row in worksheet.iter_rows()
+    ]
+    if not rows:
+        return pd.DataFrame()
+    header, *data_rows = rows
+    return pd.DataFrame(data_rows, columns=header)
+
+
+@pytest.fixture
+def mixed_file_path(tmpdir):
+    """Фикстура, создающая книгу с разными типами значений и объединёнными ячейками."""
+    file_path = str(tmpdir.join("mixed.xlsx"))
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.append(["Модель трактора", "№ трактора", "Опытный узел", "ПЭ: дата время", "Флаг"])
+    worksheet.append(["Т-1", 101, "Узел 1", datetime.datetime(2024, 3, 1, 10, 30), True])
+    worksheet.append([None, 102, "Узел 2", datetime.datetime(2024, 3, 2, 11, 0), False])
+    worksheet.append(["Т-2", 103.5, None, None, None])
+    worksheet.merge_cells("A2:A3")
+    worksheet.merge_cells("C4:E5")
+    workbook.save(file_path)
+    return file_path
+
+
+class TestXlsxStreamReader:
+    """
+    Тесты потокового читателя xlsx `XlsxStreamReader`.
+    """
+
+    def test_read_matches_openpyxl(self, mixed_file_path):
+        """
+        Проверяет, что результат совпадает с чтением через openpyxl.
+        """
+        result = ExcelUtils._read_excel_with_merged_cells(mixed_file_path)
+        pd.testing.assert_frame_equal(result, read_with_openpyxl(mixed_file_path))
+
+    def test_read_converts_dates_and_fills_merged_cells(self, mixed_file_path):
+        """
+        Проверяет приведение дат и заполнение объединённых ячеек.
+        """
+        result = ExcelUtils._read_excel_with_merged_cells(mixed_file_path)
+
+        assert result.iloc[1]["Модель трактора"] == "Т-1"
+        assert result.iloc[0]["ПЭ: дата время"] == pd.Timestamp(2024, 3, 1, 10, 30)
+        assert result.iloc[3]["Опытный узел"] is None
+        assert len(result) == 4
+
+    def test_read_from_file_object(self, mixed_file_path):
+        """
+        Проверяет чтение из файлового объекта.
+        """
+        with open(mixed_file_path, "rb") as stream:
+            columns, merged_ranges = XlsxStreamReader(stream).read_columns()
+        assert columns[0][0] == "Модель трактора"
+        assert (1, 2, 1, 3) in merged_ranges
+        assert all(len(column) == 5 for column in columns)
+
+    def test_read_empty_sheet(self, tmpdir):
+        """
+        Проверяет, что пустой лист читается в пустой DataFrame.
+        """
+        file_path = str(tmpdir.join("empty.xlsx"))
+        Workbook().save(file_path)
+        assert ExcelUtils._read_excel_with_merged_cells(file_path).empty
+
+    def test_read_only_required_columns(self, mixed_file_path):
+        """
+        Проверяет, что при проекции читаются только нужные колонки, а результат
+        совпадает с полным чтением, ограниченным этими колонками.
+        """
+        required = ["опытный узел", "Модель трактора "]
+        result = ExcelUtils._read_excel_with_merged_cells(mixed_file_path, required)
+        expected = read_with_openpyxl(mixed_file_path)[["Модель трактора", "Опытный узел"]]
+
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_projection_takes_merged_value_from_skipped_column(self, tmpdir):
+        """
+        Проверяет, что значение объединённого диапазона берётся из верхней левой ячейки,
+        даже если её колонка не входит в проекцию.
+        """
+        file_path = str(tmpdir.join("foreign_merge.xlsx"))
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet.append(["Лишнее", "Бюро", "Название"])
+        worksheet.append(["Бюро 1", None, "Задача 1"])
+        worksheet.append([None, None, "Задача 2"])
+        worksheet.merge_cells("A2:B3")
+        workbook.save(file_path)
+
+        columns, _ = XlsxStreamReader(file_path).read_columns(["Бюро", "Название"])
+        assert columns[0] is None
+
+        result = ExcelUtils._read_excel_with_merged_cells(file_path, ["Бюро", "Название"])
+        assert list(result.columns) == ["Бюро", "Название"]
+        assert result["Бюро"].tolist() == ["Бюро 1", "Бюро 1"]
+
+
+class TestCalamineReader:
+    """
+    Тесты читателя `CalamineReader` и выбора движка чтения.
+    """
+
+    @pytest.fixture
+    def plain_file_path(self, tmpdir):
+        """Фикстура, создающая книгу без объединённых ячеек."""
+        pytest.importorskip("python_calamine")
+        file_path = str(tmpdir.join("plain.xlsx"))
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet.append(["Модель трактора", "№ трактора", "Дата", "Наработка, м/ч", "Флаг"])
+        worksheet.append(["Т-1", 101, datetime.date(2024, 3, 1), 12.5, True])
+        worksheet.append([None, 102, datetime.datetime(2024, 3, 2, 11, 0), None, False])
+        worksheet.cell(row=5, column=2, value="Р-1")
+        workbook.save(file_path)
+        return file_path
+
+    def test_read_matches_stream_reader(self, plain_file_path):
+        """
+        Проверяет, что calamine даёт тот же DataFrame, что и потоковый читатель.
+        """
+        pd.testing.assert_frame_equal(
+            ExcelUtils._read_excel_with_merged_cells(plain_file_path, engine="calamine"),
+            ExcelUtils._read_excel_with_merged_cells(plain_file_path, engine="stream"),
+        )
+        pd.testing.assert_frame_equal(
+            ExcelUtils._read_excel_with_merged_cells(plain_file_path, ["дата"], engine="calamine"),
+            read_with_openpyxl(plain_file_path)[["Дата"]],
+        )
+
+    def test_auto_engine_selection(self, plain_file_path, mixed_file_path):
+        """
+        Проверяет, что calamine выбирается только для листа без объединённых ячеек.
+        """
+        assert isinstance(ExcelUtils.select_reader(plain_file_path), CalamineReader)
+        assert isinstance(ExcelUtils.select_reader(mixed_file_path), XlsxStreamReader)
+        assert isinstance(ExcelUtils.select_reader(plain_file_path, "stream"), XlsxStreamReader)
+        with pytest.raises(ValueError):
+            ExcelUtils.select_reader(plain_file_path, "xlrd")
+
+    def test_error_cells_use_stream_reader(self, tmpdir):
+        """
+        Проверяет, что лист с ячейкой-ошибкой читается потоковым читателем.
+        """
+        file_path = str(tmpdir.join("errors.xlsx"))
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet.append(["Значение"])
+        worksheet.append(["#N/A"])
+        workbook.save(file_path)
+
+        assert isinstance(ExcelUtils.select_reader(file_path), XlsxStreamReader)
+        assert ExcelUtils._read_excel_with_merged_cells(file_path).iloc[0, 0] == "#N/A"
+
+    def test_empty_strings_match_stream_reader(self, tmpdir):
+        """
+        Проверяет, что явные пустые строки (общие и в ячейке) читаются в режиме `auto`
+        так же, как потоковым читателем и openpyxl: '' остаётся '', а пустая ячейка — None.
+        """
+        pytest.importorskip("python_calamine")
+        source_path = str(tmpdir.join("source.xlsx"))
+        workbook = xlsxwriter.Workbook(source_path)
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 0, ["Опытный узел", "ПЭ: Комментарий", "№ трактора"])
+        worksheet.write_row(1, 0, ["Узел 1", "@пусто@", 101])
+        worksheet.write_row(2, 0, ["Узел 2", None, "@пусто@"])
+        workbook.close()
+
+        # xlsxwriter не записывает пустые строки: заменяем метку на пустую общую строку
+        file_path = str(tmpdir.join("empty_strings.xlsx"))
+        with zipfile.ZipFile(source_path) as source, zipfile.ZipFile(file_path, "w") as target:
+            for item in source.infolist():
+                data = source.read(item.filename)
+                if item.filename == "xl/sharedStrings.xml":
+                    data = data.replace("<t>@пусто@</t>".encode(), b"<t></t>")
+                target.writestr(item, data)
+
+        assert isinstance(ExcelUtils.select_reader(file_path), XlsxStreamReader)
+        result = ExcelUtils._read_excel_with_merged_cells(file_path, engine="auto")
+        pd.testing.assert_frame_equal(result, ExcelUtils._read_excel_with_merged_cells(file_path, engine="stream"))
+        pd.testing.assert_frame_equal(result, read_with_openpyxl(file_path))
+        assert result["ПЭ: Комментарий"].tolist() == ["", None]
+
+    def test_engines_agree_and_auto_selects_reader(self, tmpdir):
+        """
+        Проверяет, что оба движка читают лист одинаково, а режим `auto` выбирает
+        calamine для простого листа и потоковый читатель для листа с объединёнными ячейками.
+        """
+        pytest.importorskip("python_calamine")
+        file_path = str(tmpdir.join("plain.xlsx"))
+        merged_path = str(tmpdir.join("merged.xlsx"))
+        for path in (file_path, merged_path):
+            workbook = xlsxwriter.Workbook(path)
+            worksheet = workbook.add_worksheet()
+            worksheet.write_row(0, 0, ["Модель трактора", "№ трактора", "Опытный узел", "Наработка, м/ч"])
+            for row_index in range(1, 2001):
+                worksheet.write_row(row_index, 0, [f"Модель {row_index % 7}", f"Т{row_index}", f"Узел {row_index % 50}", row_index / 4])
+            if path == merged_path:
+                worksheet.merge_range(1, 0, 3, 0, "Модель 1")
+            workbook.close()
+
+        pd.testing.assert_frame_equal(
+            ExcelUtils._read_excel_with_merged_cells(file_path, engine="calamine"),
+            ExcelUtils._read_excel_with_merged_cells(file_path, engine="stream"),
+        )
+
+        assert not XlsxStreamReader(file_path).requires_stream_reader()
+        assert isinstance(ExcelUtils.select_reader(file_path, engine="auto"), CalamineReader)
+        assert XlsxStreamReader(merged_path).requires_stream_reader()
+        assert isinstance(ExcelUtils.select_reader(merged_path, engine="auto"), XlsxStreamReader)
+
+
+class TestTableReaders:
+    """
+    Тесты чтения CSV и Parquet через `ExcelUtils.check_excel_structure`.
+    """
+
+    @pytest.fixture
+    def source_df(self):
+        """Фикстура с данными, как в выгрузке Битрикс."""
+        return pd.DataFrame({
+            "Название": ["ПЭ: Двигатель", "Муфта", "Шина"],
+            "Теги": ["Бюро моторных установок, Бюро трансмиссий", None, "Бюро гидравлики"],
+            "Примечание": ["3000 м/ч", "NA", "500 м/ч"],
+            "Количество": [1, 2, 3],
+        })
+
+    def test_csv_cp1251_semicolon(self, tmpdir, source_df):
+        """
+        Проверяет чтение CSV в Windows-1251 с разделителем «;» и выборочные колонки.
+        """
+        file_path = str(tmpdir.join("bitrix.csv"))
+        source_df.to_csv(file_path, sep=";", index=False, encoding="cp1251")
+
+        result = ExcelUtils.check_excel_structure(file_path, ["название", "Теги", "Примечание"])
+
+        assert list(result.columns) == ["Название", "Теги", "Примечание"]
+        assert result["Теги"].tolist()[0] == "Бюро моторных установок, Бюро трансмиссий"
+        assert pd.isna(result["Теги"].iloc[1])
+        assert result["Примечание"].iloc[1] == "NA"
+
+    def test_csv_missing_columns(self, tmpdir, source_df):
+        """
+        Проверяет, что CSV без нужных колонок отклоняется по заголовку.
+        """
+        file_path = str(tmpdir.join("bitrix.csv"))
+        source_df.to_csv(file_path, index=False)
+
+        with pytest.raises(ValueError) as exc_info:
+            ExcelUtils.check_excel_structure(file_path, ["Название", "Описание"])
+        assert "Не хватает колонок" in str(exc_info.value)
+
+    def test_parquet_reads_selected_columns(self, tmpdir, source_df):
+        """
+        Проверяет, что из Parquet читаются только требуемые колонки.
+        """
+        pytest.importorskip("pyarrow")
+        file_path = str(tmpdir.join("bitrix.parquet"))
+        source_df.to_parquet(file_path, index=False)
+
+        result = ExcelUtils.check_excel_structure(file_path, ["Количество", "Название"])
+
+        pd.testing.assert_frame_equal(result, source_df[["Название", "Количество"]])
+
+    @pytest.mark.parametrize("extension", ["csv", "parquet"])
+    def test_iter_input_chunks(self, tmpdir, source_df, extension):
+        """
+        Проверяет чтение CSV и Parquet частями: части в сумме совпадают с чтением целиком.
+        """
+        if extension == "parquet":
+            pytest.importorskip("pyarrow")
+        file_path = str(tmpdir.join(f"bitrix.{extension}"))
+        if extension == "csv":
+            source_df.to_csv(file_path, sep=";", index=False)
+        else:
+            source_df.to_parquet(file_path, index=False)
+        columns = ["Название", "Количество"]
+
+        chunks = list(ExcelUtils.iter_input_chunks(file_path, columns, chunk_rows=2))
+
+        assert [len(chunk) for chunk in chunks] == [2, 1]
+        pd.testing.assert_frame_equal(
+            pd.concat(chunks, ignore_index=True),
+            ExcelUtils.check_excel_structure(file_path, columns),
+        )
+
+    def test_iter_input_chunks_missing_columns(self, tmpdir, source_df):
+        """
+        Проверяет, что при чтении частями недостающие колонки приводят к ошибке.
+        """
+        file_path = str(tmpdir.join("bitrix.csv"))
+        source_df.to_csv(file_path, index=False)
+
+        with pytest.raises(ValueError, match="Не хватает колонок"):
+            list(ExcelUtils.iter_input_chunks(file_path, ["Название", "Бюро"], chunk_rows=2))
+
+    def test_iter_input_chunks_rejects_xlsx(self, tmpdir, source_df):
+        """
+        Проверяет, что xlsx частями не читается.
+        """
+        file_path = str(tmpdir.join("bitrix.xlsx"))
+        source_df.to_excel(file_path, index=False)
+
+        with pytest.raises(ValueError, match="только для CSV и Parquet"):
+            list(ExcelUtils.iter_input_chunks(file_path, ["Название"], chunk_rows=2))
+
+    def test_read_from_memory_stream(self, tmpdir, source_df):
+        """
+        Проверяет чтение CSV и Parquet из потока в памяти: формат определяется по имени файла.
+        """
+        pytest.importorskip("pyarrow")
+        for file_name, write in (
+            ("bitrix.csv", lambda buffer: source_df.to_csv(buffer, sep=";", index=False, encoding="cp1251")),
+            ("bitrix.parquet", lambda buffer: source_df.to_parquet(buffer, index=False)),
+        ):
+            stream = io.BytesIO()
+            write(stream)
+            stream.name = file_name
+
+            result = ExcelUtils.check_excel_structure(stream, ["Название", "Количество"])
+
+            pd.testing.assert_frame_equal(result, source_df[["Название", "Количество"]])
@@ -1,8 +1,9 @@
+import random
 import pandas as pd
 from typing import Dict, List, Any
 import pytest
-from unittest.mock import Mock
-from app.utils import DataFrameUtils
+from unittest.mock import Mock, patch
+from app.utils import DataFrameUtils, JoinKeyIndex, TrigramIndex
 
 
 class TestDataFrameUtils:
@@ -65,3 +66,339 @@ class TestDataFrameUtils:
         assert (result["col2"] == ["a", "b", "c"]).all()
         assert (result["col3"] == [10.5, 20.5, 30.5]).all()
 
+
+
+class TestApplyColumnDtypes:
+    """
+    Тесты для метода `apply_column_dtypes` класса `DataFrameUtils`.
+    """
+
+    @pytest.fixture
+    def raw_df(self):
+        """Фикстура, создающая DataFrame из object-колонок, как после чтения xlsx."""
+        return pd.DataFrame({
+            "Модель трактора": ["К-742", "К-742", None, "К-525"],
+            "Наработка, м/ч": [100.0, "200", None, "нет данных"],
+            "ПЭ: дата время": ["03.08.2022 10:44:18", "01.02.2023 08:00:00", None, "ошибка"],
+            "Теги": [None, None, None, None],
+            "Описание": ["а", None, "б", "в"],
+        }, dtype=object)
+
+    def test_applies_declared_dtypes(self, raw_df):
+        """
+        Проверяет приведение к category, numeric, datetime и string.
+        """
+        result = DataFrameUtils.apply_column_dtypes(raw_df, {
+            " модель трактора": "category",
+            "Наработка, м/ч": "numeric",
+            "ПЭ: дата время": "datetime",
+            "Описание": "string",
+        })
+
+        assert isinstance(result["Модель трактора"].dtype, pd.CategoricalDtype)
+        assert list(result["Модель трактора"].cat.categories) == ["К-525", "К-742"]
+        assert result["Наработка, м/ч"].tolist()[:2] == [100.0, 200.0]
+        assert result["Наработка, м/ч"].isna().tolist() == [False, False, True, True]
+        assert result["ПЭ: дата время"].iloc[0] == pd.Timestamp(2022, 8, 3, 10, 44, 18)
+        assert result["ПЭ: дата время"].isna().tolist() == [False, False, True, True]
+        assert result["Описание"].dtype == "string"
+        # Исходный DataFrame не меняется
+        assert raw_df["Наработка, м/ч"].dtype == object
+
+    def test_keeps_empty_column_as_object(self, raw_df):
+        """
+        Проверяет, что колонка без значений не переводится в category и `.str` на ней работает.
+        """
+        result = DataFrameUtils.apply_column_dtypes(raw_df, {"Теги": "category", "Нет колонки": "category"})
+
+        assert result["Теги"].dtype == object
+        assert result["Теги"].str.split(", ").isna().all()
+
+    def test_unknown_dtype(self, raw_df):
+        """
+        Проверяет, что неизвестный тип приводит к ValueError.
+        """
+        with pytest.raises(ValueError):
+            DataFrameUtils.apply_column_dtypes(raw_df, {"Теги": "int"})
+
+    def test_fixed_datetime_format_and_number_format(self):
+        """
+        Проверяет разбор дат по формату из конфига и чисел с пробелами между разрядами и десятичной запятой.
+        """
+        df = pd.DataFrame({
+            "ПЭ: дата время": ["03.08.2022 10:44:18", "2022-08-04 07:25:30", None, "ошибка"],
+            "Наработка, м/ч": [1595.0, "1 664,5", "1\u00a0750", "нет данных"],
+        }, dtype=object)
+
+        result = DataFrameUtils.apply_column_dtypes(df, {
+            "ПЭ: дата время": "datetime:%d.%m.%Y %H:%M:%S",
+            "Наработка, м/ч": "numeric",
+        })
+
+        # Значение в другом формате разбирается общим разборщиком, а не теряется
+        assert result["ПЭ: дата время"].tolist()[:2] == [
+            pd.Timestamp(2022, 8, 3, 10, 44, 18), pd.Timestamp(2022, 4, 8, 7, 25, 30),
+        ]
+        assert result["ПЭ: дата время"].isna().tolist() == [False, False, True, True]
+        assert result["Наработка, м/ч"].tolist()[:3] == [1595.0, 1664.5, 1750.0]
+        assert pd.isna(result["Наработка, м/ч"].iloc[3])
+        with pytest.raises(ValueError):
+            DataFrameUtils.apply_column_dtypes(df, {"ПЭ: дата время": "date:%d.%m.%Y"})
+
+    def test_parse_numbers_with_pattern(self):
+        """
+        Проверяет, что число берётся из группы шаблона, а у категорий — из различных значений.
+        """
+        notes = pd.Series(["3000 м/ч", "250 м/ч", None, "без срока", "3000 м/ч", 500.0], dtype=object)
+        expected = notes.astype(str).str.extract(r"(\d+)")[0].astype(float)
+
+        for series in (notes, notes.astype("category")):
+            result = DataFrameUtils.parse_numbers(series, r"(\d+)")
+            pd.testing.assert_series_equal(result, expected, check_names=False)
+
+    def test_arrow_strings(self, raw_df):
+        """
+        Проверяет, что в режиме Arrow-строк колонки из одних строк переводятся в `string[pyarrow]`,
+        а колонки со значениями разных типов и пустые колонки остаются object.
+        """
+        result = DataFrameUtils.apply_column_dtypes(raw_df, {"Модель трактора": "category"}, arrow_strings=True)
+
+        assert isinstance(result["Модель трактора"].dtype, pd.CategoricalDtype)
+        assert result["ПЭ: дата время"].dtype == DataFrameUtils.ARROW_STRING_DTYPE
+        assert result["Описание"].dtype == DataFrameUtils.ARROW_STRING_DTYPE
+        assert result["Наработка, м/ч"].dtype == object
+        assert result["Теги"].dtype == object
+        assert result["Описание"].isna().tolist() == [False, True, False, False]
+
+
+class TestUnionUniqueRows:
+    """
+    Тесты для метода `union_unique_rows` класса `DataFrameUtils`.
+    """
+
+    def test_drops_rows_repeated_across_exports(self):
+        """
+        Проверяет, что повторяющиеся строки из разных выгрузок попадают в результат один раз.
+        """
+        first = pd.DataFrame({"№ трактора": ["Т1", "Т2"], "Наработка, м/ч": [10, 20]})
+        second = pd.DataFrame({"Наработка, м/ч": [20, 30], "№ трактора": ["Т2", "Т3"]})
+
+        result = DataFrameUtils.union_unique_rows([first, second])
+
+        assert result["№ трактора"].tolist() == ["Т1", "Т2", "Т3"]
+        assert list(result.columns) == ["№ трактора", "Наработка, м/ч"]
+
+    def test_keeps_continuation_rows_with_their_record(self):
+        """
+        Проверяет, что запись со строками-продолжениями отбрасывается только целиком.
+        """
+        first = pd.DataFrame({
+            "№ трактора": ["Т1", None, "Т2", None],
+            "ПЭ: Комментарий": ["а", "б", "в", "г"],
+        })
+        second = pd.DataFrame({
+            "№ трактора": ["Т2", None, "Т1", None, None],
+            "ПЭ: Комментарий": ["в", "г", "а", "б", "д"],
+        })
+
+        result = DataFrameUtils.union_unique_rows([first, second], block_column="№ трактора")
+
+        assert result["ПЭ: Комментарий"].tolist() == ["а", "б", "в", "г", "а", "б", "д"]
+
+    def test_rejects_different_columns(self):
+        """
+        Проверяет, что выгрузки с разными колонками не объединяются.
+        """
+        with pytest.raises(ValueError):
+            DataFrameUtils.union_unique_rows([
+                pd.DataFrame({"№ трактора": ["Т1"]}),
+                pd.DataFrame({"Модель трактора": ["К-742"]}),
+            ])
+
+
+class TestExplodeSplit:
+    """
+    Тесты для метода `explode_split` класса `DataFrameUtils`.
+    """
+
+    @pytest.fixture
+    def bitrix_df(self):
+        """Фикстура с задачами Битрикс, где бюро и названия перечислены через разделители."""
+        df = pd.DataFrame({
+            "Название": ["А; Б", " ; ", None, "В ;Г", "Д", 5],
+            "Теги": ["Бюро 1, Бюро 2", "Бюро 1", "Бюро 3", None, "", "Бюро 4"],
+            "Примечание": ["100 м/ч", "200 м/ч", None, "300 м/ч", "400 м/ч", "500 м/ч"],
+        }, index=[10, 11, 12, 13, 14, 15])
+        return df.astype({"Примечание": "category"})
+
+    def test_matches_sequential_explode(self, bitrix_df):
+        """
+        Проверяет, что результат совпадает с последовательными split/explode и удалением пустых названий.
+        """
+        expected = bitrix_df.assign(Теги=bitrix_df["Теги"].str.split(", ")).explode("Теги")
+        expected["Название"] = expected["Название"].fillna("")
+        expected = expected.assign(Название=expected["Название"].str.split(r"\s*;\s*")).explode("Название")
+        expected = expected[expected["Название"].notna() & (expected["Название"].str.strip() != "")].copy()
+        expected["Название"] = expected["Название"].str.strip()
+
+        result = DataFrameUtils.explode_split(
+            bitrix_df,
+            {"Теги": ", ", "Название": r"\s*;\s*"},
+            drop_blank=["Название"],
+        )
+
+        pd.testing.assert_frame_equal(result, expected)
+        assert result["Название"].tolist() == ["А", "Б", "А", "Б", "В", "Г", "Д"]
+        assert result.index.tolist() == [10, 10, 10, 10, 13, 13, 14]
+
+    def test_keeps_missing_values_as_rows(self):
+        """
+        Проверяет, что пропуск без `drop_blank` остаётся одной строкой, как в `explode`.
+        """
+        df = pd.DataFrame({"Опытный узел": ["А; Б", None], "№ трактора": ["Т1", None]})
+
+        result = DataFrameUtils.explode_split(df, {"Опытный узел": "; "})
+
+        pd.testing.assert_frame_equal(
+            result,
+            df.assign(**{"Опытный узел": df["Опытный узел"].str.split("; ")}).explode("Опытный узел"),
+        )
+
+    def test_keeps_arrow_strings(self, bitrix_df):
+        """
+        Проверяет, что колонки `string[pyarrow]` (и категории из таких строк) после разбивки
+        остаются в Arrow, а значения совпадают с разбивкой object-колонок.
+        """
+        delimiters = {"Теги": ", ", "Название": r"\s*;\s*"}
+        arrow_df = bitrix_df.astype({"Теги": DataFrameUtils.ARROW_STRING_DTYPE}).assign(
+            Название=bitrix_df["Название"].astype(str).astype(DataFrameUtils.ARROW_STRING_DTYPE).astype("category")
+        )
+        expected = DataFrameUtils.explode_split(bitrix_df.astype({"Название": str}), delimiters, drop_blank=["Название"])
+
+        result = DataFrameUtils.explode_split(arrow_df, delimiters, drop_blank=["Название"])
+
+        assert result["Теги"].dtype == DataFrameUtils.ARROW_STRING_DTYPE
+        assert result["Название"].dtype == DataFrameUtils.ARROW_STRING_DTYPE
+        pd.testing.assert_frame_equal(
+            result.astype(object).where(result.notna(), None),
+            expected.astype(object).where(expected.notna(), None),
+        )
+
+
+class TestJoinKeyIndex:
+    """
+    Тесты индекса ключей объединения `JoinKeyIndex`.
+    """
+
+    @pytest.fixture
+    def key_index(self):
+        """Фикстура с названиями задач Битрикс и опытными узлами веб-системы."""
+        bitrix_names = pd.Series(["Муфта", "Шина", "Двигатель", "Шина", "nan"])
+        web_nodes = pd.Series([" Муфта", None, "Шина ", "Рама", ""], dtype="category")
+        return JoinKeyIndex(bitrix_names, web_nodes)
+
+    def test_codes_match_normalized_keys(self, key_index):
+        """
+        Проверяет, что ключи, различающиеся только пробелами по краям, получают один код,
+        а пропуски, пустые строки и «nan» ключами не считаются.
+        """
+        assert key_index.left_codes[0] == key_index.right_codes[0]
+        assert key_index.left_codes[1] == key_index.left_codes[3] == key_index.right_codes[2]
+        assert key_index.left_codes[4] == -1
+        assert key_index.right_codes[1] == key_index.right_codes[4] == -1
+
+        left, right = key_index.join_codes()
+        assert not set(left[left < 0]) & set(right[right < 0])
+
+    def test_anti_joins_match_string_sets(self, key_index):
+        """
+        Проверяет поиск записей без пары с другой стороны.
+        """
+        assert key_index.left_only().tolist() == [False, False, True, False, False]
+        assert key_index.right_only().tolist() == [False, False, False, True, False]
+
+    def test_encode_new_values(self, key_index):
+        """
+        Проверяет кодирование новых значений словарём индекса.
+        """
+        codes = key_index.encode(pd.Series(["Шина", " Муфта ", "Рама", "", None]))
+
+        assert codes.tolist() == [key_index.left_codes[1], key_index.left_codes[0], key_index.right_codes[3], -1, -1]
+        assert key_index.encode(pd.Series(["Колесо"])).tolist() == [-2]
+
+    def test_count_distinct(self, key_index):
+        """
+        Проверяет подсчёт различных ключей и коды найденных пар.
+        """
+        assert JoinKeyIndex.count_distinct(key_index.left_codes) == 3
+
+        matched = key_index.matched_codes(key_index.left_codes)
+        assert (matched >= 0).tolist() == [True, True, False, True, False]
+
+
+def _search_all_pairs(values, query, limit=TrigramIndex.LIMIT, min_similarity=TrigramIndex.MIN_SIMILARITY):
+    """Эталон: сравнение запроса с каждой строкой."""
+    query_grams = TrigramIndex._trigrams(query)
+    scored = []
+    for position, value in enumerate(values):
+        grams = TrigramIndex._trigrams(value)
+        similarity = 2 * len(query_grams & grams) / (len(query_grams) + len(grams))
+        if similarity >= min_similarity:
+            scored.append((-round(similarity, 2), position, value))
+    return [(value, -similarity) for similarity, _, value in sorted(scored)[:limit]]
+
+
+class TestTrigramIndex:
+    """
+    Тесты индекса триграмм `TrigramIndex` для похожих названий на листе конфликтов.
+    """
+
+    def test_finds_typos_and_spacing(self):
+        """
+        Проверяет, что находятся названия с опечаткой и лишними пробелами, а непохожие — нет.
+        """
+        index = TrigramIndex(["Муфта сцепления", "Шина 710/70R38", "Двигатель  ЯМЗ"])
+
+        assert index.search("Муфта сцеплення")[0][0] == "Муфта сцепления"
+        assert index.search("двигатель ЯМЗ") == [("Двигатель  ЯМЗ", 1.0)]
+        assert index.search("Рама") == []
+
+    def test_matches_all_pairs_comparison(self):
+        """
+        Проверяет, что поиск по индексу совпадает со сравнением со всеми строками.
+        """
+        rng = random.Random(0)
+        alphabet = "абвгдежзик 0123"
+        values = ["".join(rng.choices(alphabet, k=rng.randint(5, 20))) for _ in range(300)]
+        index = TrigramIndex(values)
+
+        for value in values[:50]:
+            query = value[:-1] + rng.choice(alphabet)
+            assert index.search(query) == _search_all_pairs(values, query)
+
+    def test_scores_few_candidates(self):
+        """
+        Проверяет, что поиск оценивает только строки с общими триграммами,
+        а не сравнивает запрос с каждой строкой индекса.
+        """
+        rng = random.Random(1)
+        words = ["".join(rng.choices("абвгдежзиклмнопрст", k=6)) for _ in range(1000)]
+        values = [f"{rng.choice(words)} {rng.choice(words)} {i}" for i in range(1000)]
+        queries = [value.replace(" ", "  ", 1) for value in values[:100]]
+        index = TrigramIndex(values)
+
+        scored = []
+        original = TrigramIndex._candidates
+
+        def counting_candidates(self, codes):
+            candidates, shared = original(self, codes)
+            scored.append(len(candidates))
+            return candidates, shared
+
+        with patch.object(TrigramIndex, "_candidates", counting_candidates):
+            result = [index.search(query) for query in queries]
+
+        assert result == [_search_all_pairs(values, query) for query in queries]
+        assert len(scored) == len(queries)
+        assert max(scored) < len(values) // 5
+        assert sum(scored) < len(values) * len(queries) // 5
@@ -1,3 +1,5 @@
+import io
+import json
 from app.routes import *
 from flask import url_for
 from .confest import client, app, mock_result_file
@@ -28,4 +30,49 @@ def test_download(client, mock_result_file):
     assert os.path.exists(mock_result_file)
 
     response = client.get('/download&link=нет_такого_файла.xlsx')
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+
+def _ndjson(rows):
+    return io.BytesIO("\n".join(json.dumps(row, ensure_ascii=False) for row in rows).encode("utf-8"))
+
+
+def test_merge_ndjson(app, client, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    web_rows = [
+        {
+            "Модель трактора": "К-742", "№ трактора": "Т1", "Граничная дата гарантии": "30.11.2025",
+            "Опытный узел": "Муфта; Шина", "Наработка, м/ч": 120.5, "ПЭ: дата время": "03.08.2024 10:44:18",
+            "ПЭ: Комментарий": None, "ПЭ: наработка м/ч": 100, "Лишнее": 1,
+        },
+    ]
+    bitrix_rows = [
+        {"Название": "Муфта", "Примечание": "3000 м/ч", "Описание": None, "Теги": "Бюро трансмиссий"},
+        {"название ": "ПЭ: Шина", "Примечание": "500 м/ч", "Описание": "", "Теги": "Бюро гидравлики"},
+    ]
+
+    response = client.post('/api/merge-ndjson', data={
+        'web_file': (_ndjson(web_rows), 'web.ndjson'),
+        'bitrix_file': (_ndjson(bitrix_rows), 'bitrix.ndjson'),
+    })
+
+    body = response.get_json()
+    assert body.get('message') == 'Отчет создан', body
+    assert (tmp_path / body['download_link']).exists()
+
+
+def test_merge_ndjson_reports_bad_row(app, client, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    bitrix_rows = [
+        {"Название": "Муфта", "Примечание": "3000 м/ч", "Описание": None, "Теги": "Бюро трансмиссий"},
+        {"Название": "Шина"},
+    ]
+
+    response = client.post('/api/merge-ndjson', data={
+        'web_file': (_ndjson([]), 'web.ndjson'),
+        'bitrix_file': (_ndjson(bitrix_rows), 'bitrix.ndjson'),
+    })
+
+    body = response.get_json()
+    assert body['code'] == 400
+    assert 'Битрикс' in body['message'] and 'Строка 2' in body['message']
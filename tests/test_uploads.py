@@ -0,0 +1,204 @@
+import hashlib
+import io
+import os
+import pandas as pd
+import pytest
+from app.uploads import UploadSpool
+from .confest import client, app
+
+
+@pytest.fixture
+def upload_folder(app, tmp_path, monkeypatch):
+    """Фикстура, направляющая загрузки во временную папку."""
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+def _xlsx(data):
+    buffer = io.BytesIO()
+    pd.DataFrame(data).to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def test_spool_hashes_and_keeps_file(tmp_path):
+    """
+    Проверяет, что файл пишется в папку загрузок, хеш считается на лету,
+    а сохранение выполняется переименованием.
+    """
+    spool = UploadSpool(str(tmp_path), 'файл.csv')
+    spool.write(b'a;b\n')
+    spool.write(b'1;2\n')
+    spool.seek(0)
+
+    assert spool.read() == b'a;b\n1;2\n'
+    assert spool.content_hash == hashlib.sha256(b'a;b\n1;2\n').hexdigest()
+
+    target = str(tmp_path / 'сохранён.csv')
+    spool.keep(target)
+    spool.close()
+    assert os.listdir(tmp_path) == ['сохранён.csv']
+
+
+def test_spool_removed_if_not_kept(tmp_path):
+    """
+    Проверяет, что несохранённый файл удаляется при закрытии.
+    """
+    spool = UploadSpool(str(tmp_path), 'файл.xlsx')
+    spool.write(b'PK\x03\x04')
+    spool.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_spool_rolls_over_to_disk(tmp_path):
+    """
+    Проверяет, что небольшой файл хранится в памяти, а при превышении порога переносится на диск.
+    """
+    spool = UploadSpool(str(tmp_path), 'файл.csv', memory_size=8)
+    spool.write(b'a;b\n')
+    assert spool.in_memory
+    assert os.listdir(tmp_path) == []
+
+    spool.write(b'1;2\n3;4\n')
+    assert not spool.in_memory
+    spool.seek(0)
+    assert spool.read() == b'a;b\n1;2\n3;4\n'
+    spool.close()
+    assert os.listdir(tmp_path) == []
+
+
+def _merge_data():
+    web = _xlsx({
+        "Модель трактора": ["К-742"], "№ трактора": ["Т1"], "Граничная дата гарантии": ["30.11.2025"],
+        "Опытный узел": ["Муфта"], "Наработка, м/ч": [120.5], "ПЭ: дата время": ["03.08.2024 10:44:18"],
+        "ПЭ: Комментарий": ["-"], "ПЭ: наработка м/ч": [100],
+    })
+    bitrix = _xlsx({
+        "Название": ["Муфта"], "Примечание": ["3000 м/ч"], "Описание": [None], "Теги": ["Бюро трансмиссий"],
+    })
+    return {
+        'web_file': (io.BytesIO(web), 'web.xlsx'),
+        'bitrix_file': (io.BytesIO(bitrix), 'bitrix.xlsx'),
+    }
+
+
+def test_merge_upload_is_saved_without_copy(client, upload_folder, monkeypatch):
+    """
+    Проверяет полный запрос: загруженные файлы остаются в папке под итоговыми именами.
+    """
+    monkeypatch.setattr('app.uploads.ZERO_DISK_MAX_SIZE', 0)
+
+    response = client.post('/merge-files', data=_merge_data())
+
+    assert response.get_json()['message'] == 'Отчет создан'
+    names = os.listdir(upload_folder)
+    assert not any(name.endswith('.upload') for name in names)
+    assert any(name.endswith('_web.xlsx') for name in names)
+    assert any(name.endswith('_bitrix.xlsx') for name in names)
+
+
+def test_small_merge_upload_never_touches_disk(client, upload_folder):
+    """
+    Проверяет, что небольшие файлы разбираются из памяти: в папке загрузок остаётся только отчёт.
+    """
+    response = client.post('/merge-files', data=_merge_data())
+
+    assert response.get_json()['message'] == 'Отчет создан'
+    names = os.listdir(upload_folder)
+    assert len(names) == 1
+    assert names[0].startswith('результат_')
+
+
+def test_chunked_merge_upload(client, upload_folder, monkeypatch):
+    """
+    Проверяет объединение по частям: выгрузка CSV читается частями, временные файлы удаляются.
+    """
+    monkeypatch.setattr('app.controllers.MERGE_CHUNK_ROWS', 1)
+    data = _merge_data()
+    web = pd.read_excel(data['web_file'][0])
+    web = pd.concat([web, web.assign(**{"№ трактора": "Т2"})], ignore_index=True)
+    data['web_file'] = (io.BytesIO(web.to_csv(index=False).encode()), 'web.csv')
+
+    response = client.post('/merge-files', data=data)
+
+    assert response.get_json()['message'] == 'Отчет создан'
+    names = os.listdir(upload_folder)
+    assert len(names) == 1
+    stats = pd.read_excel(upload_folder / names[0], sheet_name='Статистика')
+    assert stats['Число тракторов'].iloc[0] == 2
+
+
+def test_chunked_merge_reads_xlsx_whole(client, upload_folder, monkeypatch):
+    """
+    Проверяет, что выгрузка xlsx при `MERGE_CHUNK_ROWS` объединяется обычным способом.
+    """
+    monkeypatch.setattr('app.controllers.MERGE_CHUNK_ROWS', 1)
+    monkeypatch.setattr(
+        'app.controllers.MergeController._merge_chunked',
+        lambda *args, **kwargs: pytest.fail('xlsx не читается частями'),
+    )
+
+    response = client.post('/merge-files', data=_merge_data())
+
+    assert response.get_json()['message'] == 'Отчет создан'
+
+
+def test_chunked_merge_wraps_read_errors(client, upload_folder, monkeypatch):
+    """
+    Проверяет, что ошибки предварительной проверки при объединении по частям
+    сообщаются так же, как при обычном объединении.
+    """
+    monkeypatch.setattr('app.controllers.MERGE_CHUNK_ROWS', 1)
+    data = _merge_data()
+    data['web_file'] = (io.BytesIO('Другая колонка\n1\n'.encode()), 'web.csv')
+
+    response = client.post('/merge-files', data=data)
+
+    assert response.get_json()['message'].startswith('Ошибка при чтении файла: Не хватает колонок')
+
+
+def test_format_upload_keeps_source_values(client, upload_folder):
+    """
+    Проверяет, что форматирование не приводит типы колонок из `column_dtypes`:
+    даты и тексты с числами записываются так же, как в исходном файле.
+    """
+    source = _xlsx({
+        "Модель трактора": ["К-742"], "№ трактора": ["Т1"], "Граничная дата гарантии": ["30.11.2025"],
+        "Продолжительность контроля, м/ч": ["3000 м/ч"], "Наработка, м/ч": ["120,5"],
+        "Опытный узел": ["Муфта"], "ПЭ: дата время": ["03.08.2024 10:44:18"], "ПЭ: Комментарий": ["-"],
+        "ПЭ: наработка м/ч": [100], "Разработчик программы ПЭ": ["Иванов"],
+    })
+
+    response = client.post('/format-file', data={'format_file': (io.BytesIO(source), 'format.xlsx')})
+
+    assert response.get_json()['message'] == 'Отчет создан'
+    name, = os.listdir(upload_folder)
+    result = pd.read_excel(upload_folder / name, dtype=object)
+    assert result.loc[0, 'Граничная дата гарантии'] == '30.11.2025'
+    assert result.loc[0, 'Дата и время обращения'] == '03.08.2024 10:44:18'
+    assert result.loc[0, 'Наработка, м/ч'] == '120,5'
+
+
+def test_upload_rejected_by_size(client, upload_folder, monkeypatch):
+    """
+    Проверяет, что слишком большой файл отклоняется, а частично записанный файл удаляется.
+    """
+    monkeypatch.setattr('app.uploads.UPLOAD_MAX_SIZE', 1024)
+
+    response = client.post('/format-file', data={
+        'format_file': (io.BytesIO(b'PK\x03\x04' + b'0' * 4096), 'format.xlsx'),
+    })
+
+    assert 'больше допустимого размера' in response.get_json()['message']
+    assert os.listdir(upload_folder) == []
+
+
+def test_upload_rejected_by_signature(client, upload_folder):
+    """
+    Проверяет, что файл с расширением .xlsx, но не zip-архив, отклоняется по первым байтам.
+    """
+    response = client.post('/format-file', data={
+        'format_file': (io.BytesIO('Это не Excel файл'.encode()), 'format.xlsx'),
+    })
+
+    assert 'не соответствует его расширению' in response.get_json()['message']
+    assert os.listdir(upload_folder) == []
@@ -5,6 +5,7 @@ import pytest
 from unittest.mock import Mock, patch
 from app.utils import Utils, ExcelUtils
 import pandas as pd
+from .test_readers import read_with_openpyxl
 
 
 class TestUtils:
@@ -57,6 +58,17 @@ class TestUtils:
             for file in mock_files:
                 file.save.assert_called_once()
 
+    def test_save_uploaded_files_keeps_files_with_same_name(self, mock_upload_folder):
+        """
+        Проверяет, что файлы с одинаковыми именами не перезаписывают друг друга.
+        """
+        files = [Mock(filename='выгрузка.xlsx'), Mock(filename='выгрузка.xlsx')]
+
+        result = Utils.save_uploaded_files(files, mock_upload_folder)
+
+        assert len(set(result)) == 2
+        assert all(path.endswith('выгрузка.xlsx') for path in result)
+
     def test_save_uploaded_files_handles_empty_list_of_files(self, mock_upload_folder):
         """
         Проверяет, что метод `save_uploaded_files` корректно обрабатывает пустой список файлов.
@@ -219,3 +231,127 @@ class TestExcelUtils:
 
         assert result.iloc[0]["Бюро"] == "Бюро 1"
         assert result.iloc[1]["Бюро"] == "Бюро 1"
+
+    def test_fill_merged_ranges_matches_openpyxl_on_thousands_of_ranges(self, tmpdir):
+        """
+        Проверяет, что блочное заполнение тысяч объединённых диапазонов
+        (включая горизонтальный диапазон в заголовке)
+        даёт тот же результат, что и поячеечное разворачивание через openpyxl.
+        """
+        import xlsxwriter
+
+        file_path = str(tmpdir.join("many_merged.xlsx"))
+        workbook = xlsxwriter.Workbook(file_path)
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 2, ["Опытный узел", "Наработка, м/ч"])
+        worksheet.merge_range(0, 0, 0, 1, "Трактор")
+
+        run_length = 3
+        for tractor in range(2000):
+            first_row = 1 + tractor * run_length
+            last_row = first_row + run_length - 1
+            worksheet.merge_range(first_row, 0, last_row, 0, f"Модель {tractor % 7}")
+            worksheet.merge_range(first_row, 1, last_row, 1, tractor)
+            for offset in range(run_length):
+                worksheet.write_row(first_row + offset, 2, [f"Узел {offset}", tractor * 10 + offset])
+        workbook.close()
+
+        result = ExcelUtils._read_excel_with_merged_cells(file_path)
+
+        pd.testing.assert_frame_equal(result, read_with_openpyxl(file_path))
+        assert result.iloc[-1, 1] == 1999
+        assert result.iloc[-1, 0] == "Модель 4"
+        assert list(result.columns[:2]) == ["Трактор", "Трактор"]
+
+    def test_fill_merged_ranges_without_ranges_keeps_columns(self):
+        """
+        Проверяет, что при отсутствии объединённых диапазонов колонки не меняются.
+        """
+        import numpy as np
+
+        columns = [np.array(["Бюро", None, "Бюро 2"], dtype=object)]
+        ExcelUtils.fill_merged_ranges(columns, [])
+        assert columns[0].tolist() == ["Бюро", None, "Бюро 2"]
+
+
+    def test_preflight_rejects_missing_columns_without_full_read(self, invalid_file_path):
+        """
+        Проверяет, что файл без нужных колонок отклоняется по заголовку, без полного чтения листа.
+        """
+        columns = ["Имя", "Возраст", "Город"]
+        with patch.object(ExcelUtils, '_read_excel_with_merged_cells') as full_read:
+            with pytest.raises(ValueError) as exc_info:
+                ExcelUtils.check_excel_structure(invalid_file_path, columns)
+
+        full_read.assert_not_called()
+        assert "Не хватает колонок" in str(exc_info.value)
+
+    def test_preflight_rejects_oversize_sheet(self, valid_file_path, monkeypatch):
+        """
+        Проверяет, что лист больше допустимого размера отклоняется по тегу `<dimension>`.
+        """
+        monkeypatch.setattr('app.utils.XLSX_MAX_ROWS', 2)
+        with pytest.raises(ValueError) as exc_info:
+            ExcelUtils.preflight_excel_structure(valid_file_path, ["Имя"])
+        assert "Лист слишком большой" in str(exc_info.value)
+
+    def test_preflight_rejects_suspicious_compression_ratio(self, valid_file_path, monkeypatch):
+        """
+        Проверяет, что архив с подозрительно высокой степенью сжатия отклоняется.
+        """
+        monkeypatch.setattr('app.utils.XLSX_RATIO_CHECK_MIN_SIZE', 0)
+        monkeypatch.setattr('app.utils.XLSX_MAX_COMPRESSION_RATIO', 1.0)
+        with pytest.raises(ValueError) as exc_info:
+            ExcelUtils.preflight_excel_structure(valid_file_path, ["Имя"])
+        assert "степень сжатия" in str(exc_info.value)
+
+    def test_check_excel_structure_returns_only_required_columns(self, valid_file_path):
+        """
+        Проверяет, что из файла читаются только требуемые колонки.
+        """
+        result = ExcelUtils.check_excel_structure(valid_file_path, ["Имя", "Город"])
+        assert list(result.columns) == ["Имя", "Город"]
+
+    def test_check_excel_structures_in_process_pool(self, valid_file_path, invalid_file_path, monkeypatch):
+        """
+        Проверяет параллельную проверку файлов: результаты идут в порядке задач,
+        а первой поднимается ошибка файла, стоящего в списке раньше.
+        """
+        monkeypatch.setattr('app.utils.PARSE_WORKERS', 2)
+        jobs = [
+            dict(file_path=valid_file_path, columns=["Имя", "Возраст"]),
+            dict(file_path=invalid_file_path, columns=["Город"]),
+        ]
+        valid_df, invalid_df = ExcelUtils.check_excel_structures(jobs)
+        pd.testing.assert_frame_equal(valid_df, ExcelUtils.check_excel_structure(**jobs[0]))
+        assert list(invalid_df.columns) == ["Город"]
+
+        with pytest.raises(ValueError) as exc_info:
+            ExcelUtils.check_excel_structures([
+                dict(file_path=invalid_file_path, columns=["Возраст"]),
+                dict(file_path=str(valid_file_path) + ".missing", columns=["Имя"]),
+            ])
+        assert "Не хватает колонок" in str(exc_info.value)
+
+    def test_parse_pool_created_once_per_process(self, monkeypatch):
+        """
+        Проверяет, что пул разбора создаётся один раз на процесс даже при одновременных
+        вызовах из потоков, не использует fork и не берётся из родительского процесса.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        monkeypatch.setattr('app.utils._parse_pool', None)
+        with ThreadPoolExecutor(max_workers=8) as threads:
+            pools = set(threads.map(lambda _: ExcelUtils._get_parse_pool(), range(16)))
+        pool, = pools
+        try:
+            assert pool._mp_context.get_start_method() in ('forkserver', 'spawn')
+
+            # Пул, унаследованный от другого процесса, заменяется новым
+            monkeypatch.setattr('app.utils._parse_pool_pid', -1)
+            inherited_pool = pool
+            pool = ExcelUtils._get_parse_pool()
+            assert pool is not inherited_pool
+            inherited_pool.shutdown()
+        finally:
+            pool.shutdown()